@@ -0,0 +1,229 @@
+"""
+Match pipeline benchmark over synthetic books.
+
+Builds temporary libraries of procedurally rendered pages, then measures
+ImageMatcher.match_image latency on perturbed camera-like views of random pages,
+along with the cost of each stage, memory use, top-1 accuracy and how often views
+of books missing from the library are wrongly accepted.
+
+Usage:
+    python -m benchmarks.bench_match --sizes 10,100,1000,5000 --queries 50 --output bench_match.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple, Any
+import numpy as np
+from PIL import Image
+from src.image_mapping import ImageMapping, ImageMappingDB
+from src.image_utils import ImageUtils
+from src.matcher import ImageMatcher
+from src.book_index import BookIndex
+from benchmarks.synthetic_book import render_page, perturb_page
+
+# Seed offset for books that are never added to a library, used to count false accepts
+UNKNOWN_BOOK_SEED: int = 1_000_000
+# (book index, page number) -> (hash, ORB descriptors), shared across library sizes
+FeatureCache = Dict[Tuple[int, int], Tuple[str, np.ndarray]]
+
+
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    """Run fn with its console output suppressed and return (result, elapsed ms)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - start) * 1000
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    values = np.asarray(samples)
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p90": round(float(np.percentile(values, 90)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def page_features(book: int, page: int, seed: int, cache: FeatureCache) -> Tuple[str, np.ndarray]:
+    key = (book, page)
+    if key not in cache:
+        image = render_page(seed + book, page)
+        cache[key] = (str(ImageUtils.hash_image(Image.fromarray(image))), ImageUtils.extract_orb_features(image))
+    return cache[key]
+
+
+def build_library(db: ImageMappingDB, total_pages: int, pages_per_book: int, seed: int,
+                  cache: FeatureCache) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """
+    Populate the database with synthetic books.
+
+    Returns:
+        Dict[Tuple[int, int], Tuple[int, int]]: (book index, page) -> (book_id, mapping id)
+    """
+    layout: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    book = 0
+    while len(layout) < total_pages:
+        page_count = min(pages_per_book, total_pages - len(layout))
+        mappings = []
+        for page in range(page_count):
+            image_hash, descriptors = page_features(book, page, seed, cache)
+            mappings.append(ImageMapping(image_path=f"synthetic/{book}/{page}.jpg",
+                                         audio_path=f"synthetic/{book}/{page}.wav",
+                                         image_hash=image_hash, orb_features=descriptors))
+        book_id, mapping_ids = db.add_mappings(mappings, title=f"Synthetic book {book}")
+        for page, mapping_id in enumerate(mapping_ids):
+            layout[(book, page)] = (book_id, mapping_id)
+        book += 1
+    return layout
+
+
+def run_size(total_pages: int, args: argparse.Namespace, cache: FeatureCache) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as work_dir:
+        db = ImageMappingDB(os.path.join(work_dir, "bench.db"))
+        layout, build_ms = timed(lambda: build_library(db, total_pages, args.pages_per_book, args.seed, cache))
+        # One book identification index shared by every matcher, as in a narration session
+        book_index = BookIndex(db)
+        _, book_index_ms = timed(book_index.load)
+
+        rng = np.random.default_rng(args.seed + total_pages)
+        keys = list(layout)
+        queries = [keys[i] for i in rng.integers(0, len(keys), args.queries)]
+
+        stages: Dict[str, List[float]] = {name: [] for name in (
+            "phash", "orb_extract", "hash_scan_library", "hash_scan_book", "book_context_load",
+            "orb_match_book", "match_image_cold", "match_image_warm", "match_image_sequential")}
+        correct = {"cold": 0, "warm": 0, "sequential": 0}
+        false_accepts = {"cold": 0, "warm": 0}
+
+        tracemalloc.start()
+        for book, page in queries:
+            book_id, expected_id = layout[(book, page)]
+            frame = perturb_page(render_page(args.seed + book, page), rng, args.strength)
+            image = Image.fromarray(frame)
+
+            image_hash, ms = timed(lambda: ImageUtils.hash_image(image))
+            stages["phash"].append(ms)
+            descriptors, ms = timed(lambda: ImageUtils.extract_orb_features(frame))
+            stages["orb_extract"].append(ms)
+            _, ms = timed(lambda: db.get_mappings_by_hash(image_hash))
+            stages["hash_scan_library"].append(ms)
+
+            # Cold start: no book loaded, falls back to the library-wide search
+            cold_matcher = ImageMatcher(db, book_index)
+            match, ms = timed(lambda: cold_matcher.match_image(image, image_hash))
+            stages["match_image_cold"].append(ms)
+            correct["cold"] += int(match is not None and match.id == expected_id)
+
+            # Warm: the query's book is already the current context
+            warm_matcher = ImageMatcher(db, book_index)
+            _, ms = timed(lambda: warm_matcher._set_current_book_context(book_id))
+            stages["book_context_load"].append(ms)
+            candidates, ms = timed(lambda: warm_matcher._match_hash(image_hash))
+            stages["hash_scan_book"].append(ms)
+            if candidates:
+                _, ms = timed(lambda: warm_matcher._match_orb(candidates, descriptors))
+                stages["orb_match_book"].append(ms)
+            # A hash miss drops the book context; restore it for the end-to-end measurement
+            if warm_matcher.current_book_id != book_id:
+                warm_matcher._set_current_book_context(book_id)
+            match, ms = timed(lambda: warm_matcher.match_image(image, image_hash))
+            stages["match_image_warm"].append(ms)
+            correct["warm"] += int(match is not None and match.id == expected_id)
+
+        # Unknown pages: views of books that are not in the library must not be accepted
+        for i in range(args.queries):
+            frame = perturb_page(render_page(args.seed + UNKNOWN_BOOK_SEED + i, int(rng.integers(0, 30))), rng,
+                                 args.strength)
+            image = Image.fromarray(frame)
+            image_hash = ImageUtils.hash_image(image)
+            cold_matcher = ImageMatcher(db, book_index)
+            match, _ = timed(lambda: cold_matcher.match_image(image, image_hash))
+            false_accepts["cold"] += int(match is not None)
+            warm_matcher = ImageMatcher(db, book_index)
+            timed(lambda: warm_matcher._set_current_book_context(layout[keys[int(rng.integers(0, len(keys)))]][0]))
+            match, _ = timed(lambda: warm_matcher.match_image(image, image_hash))
+            false_accepts["warm"] += int(match is not None)
+
+        # Sequential reading: turn through one book front to back with the matcher tracking the page
+        reading_book = int(rng.integers(0, len({book for book, _ in keys})))
+        reading_pages = sorted(page for book, page in keys if book == reading_book)
+        reader_matcher = ImageMatcher(db, book_index)
+        for page in reading_pages:
+            frame = perturb_page(render_page(args.seed + reading_book, page), rng, args.strength)
+            image = Image.fromarray(frame)
+            image_hash = ImageUtils.hash_image(image)
+            match, ms = timed(lambda: reader_matcher.match_image(image, image_hash))
+            stages["match_image_sequential"].append(ms)
+            correct["sequential"] += int(match is not None and match.id == layout[(reading_book, page)][1])
+
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.close()
+
+    return {
+        "pages": total_pages,
+        "books": len({book for book, _ in keys}),
+        "queries": args.queries,
+        "build_ms": round(build_ms, 1),
+        "book_index_build_ms": round(book_index_ms, 1),
+        "latency_ms": {name: percentiles(samples) for name, samples in stages.items()},
+        "top1_accuracy": {mode: round(count / (len(reading_pages) if mode == "sequential" else args.queries), 4)
+                          for mode, count in correct.items()},
+        "false_accept_rate": {mode: round(count / args.queries, 4) for mode, count in false_accepts.items()},
+        "sequential_guess_hits": reader_matcher.sequential_hits,
+        "sequential_guess_misses": reader_matcher.sequential_misses,
+        "memory": {
+            "query_peak_traced_mb": round(peak_bytes / 2**20, 2),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Spark Reader match pipeline on synthetic books")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma separated library sizes in pages")
+    parser.add_argument("--queries", type=int, default=50, help="Match queries per library size")
+    parser.add_argument("--pages-per-book", type=int, default=30)
+    parser.add_argument("--strength", type=float, default=1.0, help="Perturbation strength for query frames")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_match.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    cache: FeatureCache = {}
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"Benchmarking {size} pages...")
+        result = run_size(size, args, cache)
+        latency = result["latency_ms"]
+        print(f"  match cold p50 {latency['match_image_cold']['p50']} ms, "
+              f"warm p50 {latency['match_image_warm']['p50']} ms, "
+              f"sequential p50 {latency['match_image_sequential']['p50']} ms, "
+              f"top-1 cold {result['top1_accuracy']['cold']}, warm {result['top1_accuracy']['warm']}, "
+              f"sequential {result['top1_accuracy']['sequential']}, "
+              f"false accepts cold {result['false_accept_rate']['cold']}, warm {result['false_accept_rate']['warm']}")
+        results.append(result)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Single process versus multi-process narration benchmark.
+
+Replays the same synthetic reading session (a frame sequence of one book read front
+to back, paced in real time) through Narrator and MultiProcessNarrator, and reports
+the latency from a stable page to its audio starting, pages narrated, CPU time per
+process and utilization per core.
+
+Usage:
+    python -m benchmarks.bench_processes --books 20 --pages-per-book 15 --read-pages 12 --output bench_processes.json
+"""
+import os
+
+# No sound card needed; must be set before pygame is imported here or in spawned processes
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import multiprocessing
+import platform
+import tempfile
+import time
+import wave
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from src.book_index import BookIndex
+from src.frame_replay import FrameSequenceWriter
+from src.image_mapping import ImageMapping, ImageMappingDB
+from src.multiprocess_narrator import MultiProcessNarrator
+from src.narrator import Narrator
+from benchmarks.bench_match import FeatureCache, page_features, percentiles
+from benchmarks.synthetic_book import render_page, perturb_page
+
+FPS: float = 10.0
+
+
+def write_silence(path: str, seconds: float = 1.0) -> None:
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(bytes(int(16000 * seconds) * 4))
+
+
+def build_library(work_dir: str, args: argparse.Namespace) -> str:
+    """Store the synthetic books with a silent clip per page and index them; returns the db path."""
+    db_path: str = os.path.join(work_dir, "bench.db")
+    db = ImageMappingDB(db_path)
+    cache: FeatureCache = {}
+    for book in range(args.books):
+        mappings: List[ImageMapping] = []
+        for page in range(args.pages_per_book):
+            image_hash, descriptors = page_features(book, page, args.seed, cache)
+            audio_path: str = os.path.join(work_dir, f"book{book}_page{page}.wav")
+            write_silence(audio_path)
+            mappings.append(ImageMapping(image_path="", audio_path=audio_path, image_hash=image_hash,
+                                         orb_features=descriptors))
+        db.add_mappings(mappings, title=f"Synthetic book {book}")
+    BookIndex(db).load()
+    db.close()
+    return db_path
+
+
+def record_session(work_dir: str, args: argparse.Namespace) -> Tuple[str, float]:
+    """Frames of book 0 read front to back: each page held steady, then a short blurred turn."""
+    session_dir: str = os.path.join(work_dir, "session")
+    writer = FrameSequenceWriter(session_dir)
+    rng = np.random.default_rng(args.seed)
+    timestamp: float = 0.0
+    for page in range(args.read_pages):
+        view: np.ndarray = perturb_page(render_page(args.seed, page), rng, 0.5)
+        for _ in range(int(args.hold * FPS)):
+            noise = rng.normal(0, 2, view.shape)
+            writer.write(np.clip(view + noise, 0, 255).astype(np.uint8), timestamp)
+            timestamp += 1 / FPS
+        for step in range(int(0.5 * FPS)):
+            writer.write(perturb_page(view, rng, 3.0), timestamp)
+            timestamp += 1 / FPS
+    writer.close()
+    return session_dir, timestamp
+
+
+def read_cpu_times() -> np.ndarray:
+    """Per core (busy, total) jiffies from /proc/stat."""
+    rows: List[Tuple[int, int]] = []
+    with open("/proc/stat") as f:
+        for line in f:
+            if line.startswith("cpu") and line[3].isdigit():
+                values = [int(v) for v in line.split()[1:]]
+                idle = values[3] + values[4]
+                rows.append((sum(values) - idle, sum(values)))
+    return np.array(rows, dtype=np.float64)
+
+
+def process_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class TimedNarrator(Narrator):
+    """Narrator that records how long each stable page took to start playing."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies_ms: List[float] = []
+        self.played: List[str] = []
+        self.submitted_at: Dict[int, float] = {}
+
+    def _handle_stable_context(self, image_mapping: ImageMapping) -> None:
+        self.submitted_at[id(image_mapping)] = time.monotonic()
+        super()._handle_stable_context(image_mapping)
+
+    def _handle_match(self, image_mapping: ImageMapping, match: Optional[ImageMapping]) -> None:
+        previous: Optional[str] = self.current_audio
+        super()._handle_match(image_mapping, match)
+        submitted_at: float = self.submitted_at.pop(id(image_mapping))
+        if self.current_audio != previous:
+            self.latencies_ms.append((time.monotonic() - submitted_at) * 1000)
+            self.played.append(self.current_audio)
+
+
+def run_mode(mode: str, db_path: str, session_dir: str, duration: float) -> Dict[str, Any]:
+    context_options: Dict[str, Any] = {"replay_source": session_dir, "replay_realtime": True,
+                                       "polling_profile": "latency"}
+    if mode == "single":
+        narrator = TimedNarrator(db_path, context_options=context_options)
+    else:
+        events = multiprocessing.get_context("spawn").Queue()
+        narrator = MultiProcessNarrator(db_path, context_options=context_options, events=events)
+
+    narrator.narrate()
+    if mode == "multi":
+        # Single process narrate() returns once the library is loaded; wait for the same point here
+        narrator.wait_ready(60)
+    pids: Dict[str, int] = ({"narrator": os.getpid()} if mode == "single" else narrator.supervisor.get_pids())
+    process_before: Dict[str, float] = {name: process_cpu_seconds(pid) for name, pid in pids.items()}
+    cpu_before: np.ndarray = read_cpu_times()
+    wall_start: float = time.monotonic()
+    time.sleep(duration)
+    cpu_after: np.ndarray = read_cpu_times()
+    wall: float = time.monotonic() - wall_start
+    process_cpu: Dict[str, float] = {name: process_cpu_seconds(pid) - process_before[name] for name, pid in pids.items()}
+
+    if mode == "single":
+        latencies, played = narrator.latencies_ms, narrator.played
+    else:
+        latencies, played = [], []
+        while not events.empty():
+            _, audio_path, submitted_at, played_at = events.get()
+            latencies.append((played_at - submitted_at) * 1000)
+            played.append(audio_path)
+    narrator.stop()
+
+    busy, total = (cpu_after - cpu_before).T
+    return {
+        "mode": mode,
+        "wall_s": round(wall, 2),
+        "pages_narrated": len(played),
+        "page_order_correct": played == sorted(played, key=lambda p: int(p.rsplit("page", 1)[1].split(".")[0])),
+        "stable_to_audio_ms": percentiles(latencies),
+        "process_cpu_s": {name: round(seconds, 2) for name, seconds in process_cpu.items()},
+        "core_utilization": [round(float(b / t), 3) if t else 0.0 for b, t in zip(busy, total)],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare single and multi-process narration")
+    parser.add_argument("--books", type=int, default=20)
+    parser.add_argument("--pages-per-book", type=int, default=15)
+    parser.add_argument("--read-pages", type=int, default=12, help="Pages of book 0 read in the session")
+    parser.add_argument("--hold", type=float, default=2.0, help="Seconds each page stays in view")
+    parser.add_argument("--modes", default="single,multi")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_processes.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        print("Building library...")
+        db_path: str = build_library(work_dir, args)
+        session_dir, duration = record_session(work_dir, args)
+        for mode in args.modes.split(","):
+            print(f"Running {mode} process mode for {duration:.0f} s...")
+            result = run_mode(mode, db_path, session_dir, duration + 2.0)
+            print(f"  {result['pages_narrated']} pages, stable to audio p50 "
+                  f"{result['stable_to_audio_ms'].get('p50')} ms, cores {result['core_utilization']}")
+            results.append(result)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
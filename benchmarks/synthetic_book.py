@@ -0,0 +1,79 @@
+"""
+Procedurally rendered book pages for offline benchmarks.
+
+Pages are generated deterministically from a seed and page number, so a corpus of
+any size always contains the same pages as smaller corpora built with the same seed.
+"""
+from typing import Tuple
+import cv2
+import numpy as np
+
+PAGE_SIZE: Tuple[int, int] = (640, 480)
+WORDS = ["the", "little", "bear", "went", "to", "sleep", "under", "moon", "and", "stars",
+         "said", "goodnight", "fox", "ran", "over", "hill", "duck", "swam", "pond", "home"]
+
+
+def render_page(book_seed: int, page_number: int, size: Tuple[int, int] = PAGE_SIZE) -> np.ndarray:
+    """
+    Render an illustrated page with shapes and a few lines of text.
+
+    Args:
+        book_seed (int): Seed identifying the book
+        page_number (int): Page within the book
+        size (Tuple[int, int]): Page (width, height)
+
+    Returns:
+        np.ndarray: RGB page image
+    """
+    rng = np.random.default_rng([book_seed, page_number])
+    width, height = size
+    page = np.full((height, width, 3), rng.integers(200, 255, 3), dtype=np.uint8)
+
+    # Illustration: filled shapes in the top two thirds
+    for _ in range(int(rng.integers(12, 25))):
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height * 2 // 3)))
+        if rng.random() < 0.5:
+            cv2.circle(page, center, int(rng.integers(8, height // 5)), color, -1)
+        else:
+            corner = (center[0] + int(rng.integers(10, width // 4)), center[1] + int(rng.integers(10, height // 4)))
+            cv2.rectangle(page, center, corner, color, int(rng.choice([-1, 2, 4])))
+    for _ in range(int(rng.integers(4, 10))):
+        points = rng.integers(0, [width, height * 2 // 3], size=(4, 2)).astype(np.int32)
+        cv2.polylines(page, [points], False, tuple(int(c) for c in rng.integers(0, 255, 3)), 3)
+
+    # Text block in the bottom third
+    for line in range(3):
+        text = " ".join(rng.choice(WORDS, size=int(rng.integers(3, 6))))
+        origin = (int(width * 0.08), int(height * (0.74 + line * 0.08)))
+        cv2.putText(page, text, origin, cv2.FONT_HERSHEY_SIMPLEX, height / 700, (20, 20, 20), 2, cv2.LINE_AA)
+    return page
+
+
+def perturb_page(page: np.ndarray, rng: np.random.Generator, strength: float = 1.0) -> np.ndarray:
+    """
+    Simulate a camera view of a page: perspective skew, defocus blur, lighting and noise.
+
+    Args:
+        page (np.ndarray): RGB page image
+        rng (np.random.Generator): Random source
+        strength (float): Scales every perturbation; 0 returns the page unchanged
+
+    Returns:
+        np.ndarray: Perturbed RGB image of the same size
+    """
+    height, width = page.shape[:2]
+    jitter = 0.04 * strength * np.array([width, height])
+    source = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    target = (source + rng.uniform(-1, 1, size=(4, 2)) * jitter).astype(np.float32)
+    warped = cv2.warpPerspective(page, cv2.getPerspectiveTransform(source, target), (width, height),
+                                 borderMode=cv2.BORDER_REPLICATE)
+
+    kernel = 2 * int(rng.integers(0, 1 + int(2 * strength))) + 1
+    if kernel > 1:
+        warped = cv2.GaussianBlur(warped, (kernel, kernel), 0)
+
+    gain = 1 + rng.uniform(-0.25, 0.25) * strength
+    offset = rng.uniform(-20, 20) * strength
+    noise = rng.normal(0, 3 * strength, warped.shape)
+    return np.clip(warped.astype(np.float32) * gain + offset + noise, 0, 255).astype(np.uint8)
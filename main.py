@@ -1,23 +1,109 @@
-from src.narrator import Narrator
-from src.recorder import Recorder
+import argparse
+import time
+
+# Launch time for --startup-timing; heavy modules (cv2, pygame, imagehash, ...) are imported only when first needed
+STARTED_AT: float = time.perf_counter()
+
+from src.camera_service import CameraService
+from src.tracing import configure_tracing, span, tracer
+
+STARTUP_STAGES = ["imports", "camera_warmup", "camera_wait", "db_open", "book_index_load", "audio_start",
+                  "stable_page", "match_job", "audio_play"]
+
+
+def create_narrator(args, camera_service):
+    with span("imports"):
+        if args.multiprocess:
+            from src.multiprocess_narrator import MultiProcessNarrator
+            # The detection process opens its own camera, or the replay
+            return MultiProcessNarrator(context_options={"replay_source": args.replay} if args.replay else None)
+        from src.narrator import Narrator
+    return Narrator(camera_service=camera_service)
+
+
+def create_recorder(camera_service):
+    with span("imports"):
+        from src.recorder import Recorder
+    return Recorder(camera_service=camera_service)
+
+
+def report_startup(narrator, timeout):
+    """Start narrating, wait for the first page to be narrated and print where the time went."""
+    narrator.narrate()
+    ready_at = time.perf_counter()
+    while "audio_play" not in tracer.summary() and time.perf_counter() - ready_at < timeout:
+        time.sleep(0.05)
+    narrated = tracer.summary().get("audio_play")
+    print("\nStartup timing (ms since launch):")
+    print(tracer.format_timeline(STARTUP_STAGES, STARTED_AT))
+    print(f"Ready to narrate after {(ready_at - STARTED_AT) * 1000:.0f} ms")
+    if narrated is None:
+        print(f"No page was narrated within {timeout:.0f} s")
+    narrator.stop()
+
 
 if __name__ == "__main__":
-    narrator = Narrator()
-    recorder = Recorder()
-    option = None
-    
-    while option != '3':
-        print('''
+    parser = argparse.ArgumentParser(description="Spark Reader")
+    parser.add_argument("--trace-log-interval", type=float, help="Print stage latency percentiles every N seconds")
+    parser.add_argument("--trace-port", type=int, help="Serve stage latency histograms as JSON on this local port")
+    parser.add_argument("--profile-stage", action="append", default=[],
+                        help="Run a traced stage (e.g. orb_match) under cProfile; may be repeated")
+    parser.add_argument("--multiprocess", action="store_true",
+                        help="Run detection, matching and audio in separate processes when narrating")
+    parser.add_argument("--replay", help="Use a recorded frame sequence or video instead of the camera")
+    parser.add_argument("--startup-timing", action="store_true",
+                        help="Start narrating right away, report the time to the first narrated page and exit")
+    parser.add_argument("--startup-timeout", type=float, default=30.0,
+                        help="Seconds --startup-timing waits for a page to be narrated")
+    args = parser.parse_args()
+    if args.startup_timing and args.multiprocess:
+        parser.error("--startup-timing measures the single process narrator")
+    configure_tracing(args.trace_log_interval, args.trace_port, args.profile_stage)
+
+    # The multi-process narrator opens the camera in its own process
+    camera_service = None
+    if not args.multiprocess:
+        camera_service = CameraService(replay_source=args.replay)
+        # Warm the camera up while the menu is shown and the modules load
+        camera_service.start()
+
+    narrator = None
+    recorder = None
+    narrating = False
+    try:
+        if args.startup_timing:
+            report_startup(create_narrator(args, camera_service), args.startup_timeout)
+        else:
+            option = None
+            while option != '3':
+                print('''
           ################## Spark Reader ##################
           1. Record a book
           2. Narrate a book
           3. Exit program
           ''')
-        option = input("\nPlease select an option: ")
-        
-        if option == '1':
-            recorder.record_book()
-        elif option == '2':
-            narrator.narrate()
-        elif option != '3':
-            print("Please select a valid option 1, 2, or 3")
+                option = input("\nPlease select an option: ")
+
+                if option == '1':
+                    if narrating:
+                        # Hand the camera over to the recorder
+                        narrator.stop()
+                        narrating = False
+                    recorder = recorder or create_recorder(camera_service)
+                    recorder.record_book()
+                elif option == '2' and not narrating:
+                    narrator = narrator or create_narrator(args, camera_service)
+                    narrator.narrate()
+                    narrating = True
+                elif option == '2':
+                    print("Already narrating")
+                elif option != '3':
+                    print("Please select a valid option 1, 2, or 3")
+    finally:
+        if narrating:
+            narrator.stop()
+        if camera_service is not None:
+            camera_service.close()
+
+    print(tracer.format_summary())
+    tracer.stop()
@@ -1,22 +1,19 @@
 import pygame
 import os
 import uuid
-import sounddevice as sd
-import scipy.io.wavfile as wav
-from pydub import AudioSegment
 import threading
+import struct
 import numpy as np
-import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional
-
-# Global variables to control recording
-is_recording: bool = False
-audio_queue: queue.Queue = queue.Queue()
+from src.tracing import span
 
 # Audio configuration matching your working ALSA settings
 SAMPLE_RATE: int = 16000
 CHANNELS: int = 2
 DTYPE: str = 'int16'  # Matches S16_LE format
+WAV_HEADER_SIZE: int = 44
 
 def play_audio(audio_file: str) -> None:
     """
@@ -29,107 +26,358 @@ def play_audio(audio_file: str) -> None:
     pygame.mixer.music.load(audio_file)
     pygame.mixer.music.play()
 
-def record_audio_thread() -> None:
-    """Background thread function for recording audio"""
-    global is_recording, audio_queue
-    
-    try:
-        # Configure sounddevice to use the same settings as your working arecord command
-        with sd.InputStream(
-            samplerate=SAMPLE_RATE,
-            channels=CHANNELS,
-            dtype=DTYPE
-        ) as stream:
-            while is_recording:
-                audio_chunk, overflowed = stream.read(1024)
-                if not overflowed:
-                    audio_queue.put(audio_chunk)
-                elif overflowed:
-                    print("Warning: Audio buffer overflowed")
-    except sd.PortAudioError as e:
-        print(f"Error accessing audio device: {e}")
-        is_recording = False
-
-def record_audio() -> Optional[str]:
+class AudioPlayer:
     """
-    Start recording audio from the ReSpeaker microphone.
+    Persistent low latency playback engine.
+    The mixer is initialized once with a small buffer, decoded clips are kept in
+    a size-bounded LRU cache, and upcoming clips can be preloaded in the
+    background so playback starts without disk I/O.
     
-    Returns:
-        Optional[str]: Path to the recorded file, or None if recording setup fails
+    Args:
+        cache_bytes (int): Upper bound on decoded audio kept in memory
+        buffer_size (int): Mixer buffer in samples; smaller starts faster
+        crossfade_ms (int): Fade between clips in milliseconds, 0 interrupts instantly
     """
-    global is_recording, audio_queue
-    
-    # Clear any existing audio in the queue
-    while not audio_queue.empty():
-        audio_queue.get()
-    
-    is_recording = True
-    file_name: str = f"{uuid.uuid4()}.wav"
-    # Ensure audio directory exists
-    os.makedirs("audio", exist_ok=True)
-    file_path: str = os.path.join("audio", file_name)
-    
-    
-    print("Recording... Use stop_audio_recording() to stop.")
-    
-    recording_thread: threading.Thread = threading.Thread(target=record_audio_thread)
-    recording_thread.start()
-    
-    return file_path
+    def __init__(self, cache_bytes: int = 64 * 1024 * 1024, buffer_size: int = 512, crossfade_ms: int = 0):
+        self.cache_bytes: int = cache_bytes
+        self.buffer_size: int = buffer_size
+        self.crossfade_ms: int = crossfade_ms
+        self.cache: "OrderedDict[str, Tuple[pygame.mixer.Sound, int]]" = OrderedDict()
+        self.cached_bytes: int = 0
+        self.lock = threading.Lock()
+        self.channels: List[pygame.mixer.Channel] = []
+        self.active_channel: int = 0
+        self._preloader: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        """Initialize the mixer once; later calls are no-ops."""
+        if self.channels:
+            return
+        pygame.mixer.pre_init(frequency=SAMPLE_RATE, size=-16, channels=CHANNELS, buffer=self.buffer_size)
+        pygame.mixer.init()
+        # Two channels so a new clip can fade in while the previous one fades out
+        self.channels = [pygame.mixer.Channel(0), pygame.mixer.Channel(1)]
+        self._preloader = ThreadPoolExecutor(max_workers=1)
+
+    def load(self, audio_file: str) -> pygame.mixer.Sound:
+        """
+        Get a decoded clip, reading it from disk only on a cache miss.
+        
+        Args:
+            audio_file (str): Path to the audio file
+        
+        Returns:
+            pygame.mixer.Sound: Decoded clip ready to play
+        """
+        with self.lock:
+            cached = self.cache.get(audio_file)
+            if cached is not None:
+                self.cache.move_to_end(audio_file)
+                return cached[0]
 
-def stop_audio_recording() -> Optional[str]:
+        sound: pygame.mixer.Sound = pygame.mixer.Sound(audio_file)
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        size: int = int(sound.get_length() * frequency) * channels * (abs(sample_format) // 8)
+
+        with self.lock:
+            if audio_file not in self.cache:
+                self.cache[audio_file] = (sound, size)
+                self.cached_bytes += size
+            # Evict least recently used clips, always keeping the one just loaded
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                _, (_, evicted_size) = self.cache.popitem(last=False)
+                self.cached_bytes -= evicted_size
+        return sound
+
+    def preload(self, audio_files: List[str]) -> None:
+        """Decode clips into the cache on a background thread."""
+        if self._preloader is None:
+            return
+        for audio_file in audio_files:
+            if audio_file and audio_file not in self.cache:
+                self._preloader.submit(self._preload_one, audio_file)
+
+    def _preload_one(self, audio_file: str) -> None:
+        try:
+            self.load(audio_file)
+        except Exception as e:
+            print(f"Warning: Could not preload {audio_file}: {e}")
+
+    def play(self, audio_file: str, crossfade_ms: Optional[int] = None) -> None:
+        """
+        Play a clip, interrupting or crossfading whatever is currently playing.
+        
+        Args:
+            audio_file (str): Path to the audio file to play
+            crossfade_ms (Optional[int]): Override the default crossfade for this clip
+        """
+        self.start()
+        with span("audio_load"):
+            sound: pygame.mixer.Sound = self.load(audio_file)
+        fade_ms: int = self.crossfade_ms if crossfade_ms is None else crossfade_ms
+
+        with span("audio_play"):
+            previous: pygame.mixer.Channel = self.channels[self.active_channel]
+            self.active_channel = (self.active_channel + 1) % len(self.channels)
+            if fade_ms > 0:
+                previous.fadeout(fade_ms)
+                self.channels[self.active_channel].play(sound, fade_ms=fade_ms)
+            else:
+                previous.stop()
+                self.channels[self.active_channel].play(sound)
+
+    def is_playing(self) -> bool:
+        return any(channel.get_busy() for channel in self.channels)
+
+    def stop(self) -> None:
+        """Stop playback immediately."""
+        for channel in self.channels:
+            channel.stop()
+
+    def close(self) -> None:
+        """Stop playback, drop cached clips and release the mixer."""
+        if self._preloader is not None:
+            self._preloader.shutdown(wait=True)
+            self._preloader = None
+        if self.channels:
+            self.stop()
+            self.channels = []
+            pygame.mixer.quit()
+        with self.lock:
+            self.cache.clear()
+            self.cached_bytes = 0
+
+def _wav_header(num_frames: int, sample_rate: int, channels: int, sample_width: int) -> bytes:
+    """Build a 44 byte PCM WAV header for the given number of frames."""
+    data_size: int = num_frames * channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b'data', data_size
+    )
+
+class WavStreamWriter:
     """
-    Stop recording and save the audio file.
+    Writes PCM audio to a WAV file incrementally.
+    The header is rewritten and the file synced every header_interval seconds of
+    audio, so a crash loses at most that much of the recording.
     
-    Returns:
-        Optional[str]: Path to the saved audio file, or None if no audio was recorded
+    Args:
+        file_path (str): Destination WAV file
+        sample_rate (int): Samples per second
+        channels (int): Number of interleaved channels
+        sample_width (int): Bytes per sample
+        header_interval (float): Seconds of audio between header updates
     """
-    global is_recording, audio_queue
-    is_recording = False
-    
-    recorded_chunks: List[np.ndarray] = []
-    while not audio_queue.empty():
-        recorded_chunks.append(audio_queue.get())
-    
-    if not recorded_chunks:
-        print("No audio data was recorded")
-        return None
+    def __init__(self, file_path: str, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS,
+                 sample_width: int = 2, header_interval: float = 2.0):
+        self.file_path: str = file_path
+        self.sample_rate: int = sample_rate
+        self.channels: int = channels
+        self.sample_width: int = sample_width
+        self.frames_written: int = 0
+        self._frames_at_last_sync: int = 0
+        self._sync_every: int = int(header_interval * sample_rate)
+        self._file = open(file_path, 'wb')
+        self._file.write(_wav_header(0, sample_rate, channels, sample_width))
+
+    def write(self, chunk: np.ndarray) -> None:
+        """Append a (frames, channels) chunk of samples."""
+        self._file.write(chunk.tobytes())
+        # Flush so readers cutting clips from the growing file see every counted frame
+        self._file.flush()
+        self.frames_written += len(chunk)
+        if self.frames_written - self._frames_at_last_sync >= self._sync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """Rewrite the header for the frames written so far and flush to disk."""
+        self._file.seek(0)
+        self._file.write(_wav_header(self.frames_written, self.sample_rate, self.channels, self.sample_width))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._frames_at_last_sync = self.frames_written
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+class AudioRecorder:
+    """
+    Records audio from the ReSpeaker microphone straight to a WAV file.
+    Chunks are written as they arrive, so memory use does not grow with the
+    length of the session.
     
-    try:
-        recording: np.ndarray = np.concatenate(recorded_chunks, axis=0)
+    Args:
+        output_dir (str): Directory for recorded files
+        sample_rate (int): Samples per second
+        channels (int): Number of input channels
+        dtype (str): Sample format
+        block_size (int): Frames read from the input stream per chunk
+    """
+    def __init__(self, output_dir: str = "audio", sample_rate: int = SAMPLE_RATE,
+                 channels: int = CHANNELS, dtype: str = DTYPE, block_size: int = 1024):
+        self.output_dir: str = output_dir
+        self.sample_rate: int = sample_rate
+        self.channels: int = channels
+        self.dtype: str = dtype
+        self.block_size: int = block_size
+        self.is_recording: bool = False
+        self.file_path: Optional[str] = None
+        self.writer: Optional[WavStreamWriter] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Optional[str]:
+        """
+        Start recording audio in the background.
         
-        file_name: str = f"{uuid.uuid4()}.wav"
-        file_path: str = os.path.join("audio", file_name)
+        Returns:
+            Optional[str]: Path the recording is written to, or None if already recording
+        """
+        if self.is_recording:
+            return None
+
+        # Ensure audio directory exists
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.file_path = os.path.join(self.output_dir, f"{uuid.uuid4()}.wav")
+        self.writer = WavStreamWriter(self.file_path, self.sample_rate, self.channels,
+                                      np.dtype(self.dtype).itemsize)
+        self.is_recording = True
+
+        print("Recording... Use stop() to stop.")
+        self._thread = threading.Thread(target=self._record)
+        self._thread.start()
+        return self.file_path
+
+    def _record(self) -> None:
+        """Background thread function for recording audio"""
+        # Only recording needs PortAudio; imported here so narration starts without it
+        import sounddevice as sd
+        try:
+            # Configure sounddevice to use the same settings as your working arecord command
+            with sd.InputStream(
+                samplerate=self.sample_rate,
+                channels=self.channels,
+                dtype=self.dtype
+            ) as stream:
+                while self.is_recording:
+                    audio_chunk, overflowed = stream.read(self.block_size)
+                    if overflowed:
+                        print("Warning: Audio buffer overflowed")
+                    self.writer.write(audio_chunk)
+        except sd.PortAudioError as e:
+            print(f"Error accessing audio device: {e}")
+            self.is_recording = False
+
+    @property
+    def frames_written(self) -> int:
+        return self.writer.frames_written if self.writer else 0
+
+    def stop(self) -> Optional[str]:
+        """
+        Stop recording and finalize the audio file.
         
-        # Save with the same sample rate used during recording
-        wav.write(file_path, SAMPLE_RATE, recording)
-        print(f"Recording saved as {file_path}")
-        return file_path
-    except Exception as e:
-        print(f"Error saving recording: {e}")
-        return None
-
-def split_audio(audio_file: str, timestamps: List[Tuple[float, float]]) -> List[str]:
+        Returns:
+            Optional[str]: Path to the saved audio file, or None if no audio was recorded
+        """
+        self.is_recording = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.writer is None:
+            return None
+
+        try:
+            self.writer.close()
+        except Exception as e:
+            print(f"Error saving recording: {e}")
+            return None
+        finally:
+            frames_written: int = self.writer.frames_written
+            self.writer = None
+
+        if frames_written == 0:
+            print("No audio data was recorded")
+            os.remove(self.file_path)
+            return None
+        print(f"Recording saved as {self.file_path}")
+        return self.file_path
+
+def read_wav_layout(audio_file: str, growing: bool = False) -> Tuple[int, int, int, int, int]:
     """
-    Split an audio file into multiple clips based on timestamps.
+    Locate the PCM data in a WAV file without decoding it.
     
     Args:
-        audio_file (str): Path to the audio file to split
-        timestamps (List[Tuple[float, float]]): List of (start, end) timestamps in seconds
+        audio_file (str): Path to the WAV file
+        growing (bool): The file is still being recorded, so everything after the
+            data chunk header is audio regardless of the declared size
     
     Returns:
-        List[str]: List of paths to the generated audio clips
+        Tuple[int, int, int, int, int]: (data offset, data size in bytes, sample rate,
+            channels, sample width in bytes)
     """
-    audio: AudioSegment = AudioSegment.from_wav(audio_file)
-    audio_clips: List[str] = []
+    file_size: int = os.path.getsize(audio_file)
+    with open(audio_file, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{audio_file} is not a WAV file")
 
-    for i in range(len(timestamps)):
-        start_time: float = timestamps[i][0] * 1000
-        end_time: float = timestamps[i+1][0] * 1000 if i+1 < len(timestamps) else len(audio)
-        
-        clip: AudioSegment = audio[start_time:end_time]
-        clip_file: str = f"audio/clip_{i}.wav"
-        clip.export(clip_file, format="wav")
-        audio_clips.append(clip_file)
+        fmt: Optional[Tuple[int, int, int]] = None
+        while True:
+            chunk_header: bytes = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"{audio_file} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'fmt ':
+                _, channels, sample_rate, _, _, bits_per_sample = struct.unpack('<HHIIHH', f.read(16))
+                fmt = (sample_rate, channels, bits_per_sample // 8)
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{audio_file} has no fmt chunk")
+                data_offset: int = f.tell()
+                # A file still being written (or with a zero placeholder size) holds data up to its end;
+                # otherwise trust the declared size, clamped in case it runs past the end of the file
+                if growing or chunk_size == 0:
+                    data_size: int = file_size - data_offset
+                else:
+                    data_size = min(chunk_size, file_size - data_offset)
+                return (data_offset, data_size) + fmt
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+def clip_path(audio_file: str, index: int) -> str:
+    """Path of the page clip cut from a recording, unique to that recording."""
+    return f"{os.path.splitext(audio_file)[0]}_clip_{index:03d}.wav"
+
+def write_clip(audio_file: str, start_time: float, end_time: Optional[float], clip_file: str,
+               growing: bool = False) -> str:
+    """
+    Copy one time range of a WAV file into its own clip without decoding it.
+    
+    Args:
+        audio_file (str): Path to the source recording
+        start_time (float): Clip start in seconds
+        end_time (Optional[float]): Clip end in seconds, or None for the end of the recording
+        clip_file (str): Destination path
+        growing (bool): The source is still being recorded
+    
+    Returns:
+        str: Path to the written clip
+    """
+    data_offset, data_size, sample_rate, channels, sample_width = read_wav_layout(audio_file, growing)
+    frame_size: int = channels * sample_width
+    total_frames: int = data_size // frame_size
+    start_frame: int = min(int(start_time * sample_rate), total_frames)
+    end_frame: int = total_frames if end_time is None else int(end_time * sample_rate)
+    end_frame = max(start_frame, min(end_frame, total_frames))
 
-    return audio_clips
+    with open(audio_file, 'rb') as source, open(clip_file, 'wb') as clip:
+        clip.write(_wav_header(end_frame - start_frame, sample_rate, channels, sample_width))
+        source.seek(data_offset + start_frame * frame_size)
+        clip.write(source.read((end_frame - start_frame) * frame_size))
+    return clip_file
@@ -0,0 +1,214 @@
+import threading
+from typing import Iterable, List, Optional, Tuple
+import cv2
+import numpy as np
+from src.image_mapping import ImageMapping, ImageMappingDB
+from src.orb_index import decode_orb_features
+
+VOCABULARY_SIZE: int = 512
+
+
+def build_vocabulary(descriptors: np.ndarray, size: int = VOCABULARY_SIZE, iterations: int = 8,
+                     seed: int = 0) -> np.ndarray:
+    """
+    Cluster binary ORB descriptors into visual words with k-majority.
+    Like k-means, but descriptors are assigned by Hamming distance and each word
+    is the per-bit majority vote of its members, so words stay binary descriptors.
+
+    Args:
+        descriptors (np.ndarray): (N, 32) uint8 training descriptors
+        size (int): Number of visual words
+        iterations (int): Assignment/update rounds
+        seed (int): Seed for the initial words
+
+    Returns:
+        np.ndarray: (size, 32) uint8 vocabulary
+    """
+    rng = np.random.default_rng(seed)
+    size = min(size, len(descriptors))
+    words: np.ndarray = descriptors[rng.choice(len(descriptors), size, replace=False)].copy()
+    bits: np.ndarray = np.unpackbits(descriptors, axis=1)
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+    for _ in range(iterations):
+        labels: np.ndarray = np.array([m.trainIdx for m in matcher.match(descriptors, words)])
+        order: np.ndarray = np.argsort(labels, kind="stable")
+        word_ids, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+        bit_sums: np.ndarray = np.add.reduceat(bits[order].astype(np.int32), starts, axis=0)
+        # Words that lost all their members keep their previous value
+        words[word_ids] = np.packbits(bit_sums * 2 > counts[:, None], axis=1)
+    return words
+
+
+class BookIndex:
+    """
+    Bag-of-visual-words index used to identify which book a frame shows.
+
+    Every stored page is reduced to a TF-IDF weighted histogram over a small binary
+    vocabulary (about 1 KB per page). A query frame is quantized once and scored
+    against all page signatures with a single matrix product; a book scores as its
+    best page. Only the top books then need their pages loaded for ORB matching.
+    Vocabulary and page word counts live in the database, and pages stored since
+    the last load are indexed on demand.
+
+    Args:
+        db (ImageMappingDB): Database holding the pages, vocabulary and word counts
+        vocabulary_size (int): Visual words in a newly built vocabulary
+    """
+    def __init__(self, db: ImageMappingDB, vocabulary_size: int = VOCABULARY_SIZE):
+        self.db: ImageMappingDB = db
+        self.vocabulary_size: int = vocabulary_size
+        self.vocabulary: Optional[np.ndarray] = None
+        self.mapping_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self.page_books: np.ndarray = np.empty(0, dtype=np.int64)
+        self.word_counts: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self.idf: np.ndarray = np.empty(0, dtype=np.float32)
+        self.signatures: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self.book_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._book_slots: np.ndarray = np.empty(0, dtype=np.int64)
+        self.matcher: cv2.BFMatcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        self.lock = threading.RLock()
+        self.is_loaded: bool = False
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    def load(self) -> None:
+        """Read the vocabulary and page word counts, indexing any pages that are missing."""
+        with self.lock:
+            self.vocabulary = self.db.get_visual_vocabulary()
+            if self.vocabulary is None:
+                self.vocabulary = self._train_vocabulary(self.db.get_unindexed_mappings())
+                if self.vocabulary is None:
+                    # Nothing recorded yet; the first added book trains the vocabulary
+                    self.is_loaded = True
+                    return
+                self.db.save_visual_vocabulary(self.vocabulary)
+
+            rows: List[Tuple[int, int, np.ndarray]] = self.db.get_page_word_counts()
+            missing: List[ImageMapping] = self.db.get_unindexed_mappings()
+            if missing:
+                print(f"Indexing {len(missing)} pages for book identification")
+                new_rows: List[Tuple[int, int, np.ndarray]] = self._count_words(missing)
+                self.db.save_page_word_counts([(mapping_id, counts) for mapping_id, _, counts in new_rows])
+                rows.extend(new_rows)
+            self._set_word_counts(rows)
+            self.is_loaded = True
+
+    def add_book(self, mappings: Iterable[ImageMapping]) -> None:
+        """
+        Index newly stored pages straight from memory instead of reading them back.
+
+        Args:
+            mappings (Iterable[ImageMapping]): Stored pages with id, book_id and ORB features set
+        """
+        mappings = list(mappings)
+        with self.lock:
+            if not self.is_loaded:
+                # Loading indexes every stored page, including these ones
+                self.load()
+                return
+            if self.vocabulary is None:
+                self.vocabulary = self._train_vocabulary(mappings)
+                if self.vocabulary is None:
+                    return
+                self.db.save_visual_vocabulary(self.vocabulary)
+            self._append_word_counts(self._count_words(mappings))
+
+    def add_indexed_book(self, mappings: Iterable[ImageMapping], vocabulary: np.ndarray,
+                         word_counts: np.ndarray) -> None:
+        """
+        Index newly stored pages from word counts computed elsewhere, e.g. on the device a
+        book pack was exported from. A library without a vocabulary adopts the given one;
+        with a different vocabulary the counts do not apply and the pages are counted again.
+
+        Args:
+            mappings (Iterable[ImageMapping]): Stored pages with id and book_id set; ORB features
+                are only needed if the vocabularies differ
+            vocabulary (np.ndarray): (words, 32) uint8 vocabulary the counts refer to
+            word_counts (np.ndarray): (pages, words) word counts in the order of mappings
+        """
+        mappings = list(mappings)
+        with self.lock:
+            if not self.is_loaded:
+                self.load()
+                return
+            if self.vocabulary is None:
+                self.vocabulary = np.ascontiguousarray(vocabulary, dtype=np.uint8)
+                self.db.save_visual_vocabulary(self.vocabulary)
+            if not np.array_equal(self.vocabulary, vocabulary):
+                self.add_book(mappings)
+                return
+            # Pages without descriptors have no words and are not indexed
+            self._append_word_counts([(mapping.id, mapping.book_id, counts.astype(np.float32))
+                                      for mapping, counts in zip(mappings, word_counts) if counts.any()])
+
+    def _append_word_counts(self, new_rows: List[Tuple[int, int, np.ndarray]]) -> None:
+        self.db.save_page_word_counts([(mapping_id, counts) for mapping_id, _, counts in new_rows])
+        rows: List[Tuple[int, int, np.ndarray]] = list(zip(self.mapping_ids.tolist(), self.page_books.tolist(),
+                                                           self.word_counts))
+        self._set_word_counts(rows + new_rows)
+
+    def query(self, orb_features: Optional[np.ndarray], top_k: int = 3) -> List[int]:
+        """
+        Rank books by visual similarity to a query frame.
+
+        Args:
+            orb_features (Optional[np.ndarray]): Query ORB descriptors
+            top_k (int): Number of books to return
+
+        Returns:
+            List[int]: Up to top_k book ids, most similar first
+        """
+        with self.lock:
+            if not self.is_loaded:
+                self.load()
+            if orb_features is None or len(orb_features) == 0 or not len(self.book_ids):
+                return []
+            page_scores: np.ndarray = self.signatures @ self._weight(self._histogram(orb_features))
+            book_scores: np.ndarray = np.full(len(self.book_ids), -1.0, dtype=np.float32)
+            np.maximum.at(book_scores, self._book_slots, page_scores)
+            top_k = min(top_k, len(book_scores))
+            best: np.ndarray = np.argpartition(-book_scores, top_k - 1)[:top_k]
+            return self.book_ids[best[np.argsort(-book_scores[best])]].tolist()
+
+    def _train_vocabulary(self, mappings: List[ImageMapping], max_descriptors: int = 50000) -> Optional[np.ndarray]:
+        page_descriptors: List[np.ndarray] = [d for d in (decode_orb_features(m.orb_features) for m in mappings)
+                                              if d is not None and len(d)]
+        if not page_descriptors:
+            return None
+        descriptors: np.ndarray = np.vstack(page_descriptors)
+        if len(descriptors) > max_descriptors:
+            sample: np.ndarray = np.random.default_rng(0).choice(len(descriptors), max_descriptors, replace=False)
+            descriptors = descriptors[sample]
+        print(f"Building visual vocabulary from {len(descriptors)} descriptors")
+        return build_vocabulary(descriptors, self.vocabulary_size)
+
+    def _histogram(self, descriptors: np.ndarray) -> np.ndarray:
+        words: List[int] = [m.trainIdx for m in self.matcher.match(descriptors, self.vocabulary)]
+        return np.bincount(words, minlength=len(self.vocabulary)).astype(np.float32)
+
+    def _count_words(self, mappings: Iterable[ImageMapping]) -> List[Tuple[int, int, np.ndarray]]:
+        rows: List[Tuple[int, int, np.ndarray]] = []
+        for mapping in mappings:
+            descriptors: Optional[np.ndarray] = decode_orb_features(mapping.orb_features)
+            if descriptors is not None and len(descriptors):
+                rows.append((mapping.id, mapping.book_id, self._histogram(descriptors)))
+        return rows
+
+    def _set_word_counts(self, rows: List[Tuple[int, int, np.ndarray]]) -> None:
+        self.mapping_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.page_books = np.array([row[1] for row in rows], dtype=np.int64)
+        self.word_counts = (np.vstack([row[2] for row in rows]).astype(np.float32) if rows
+                            else np.empty((0, len(self.vocabulary)), dtype=np.float32))
+        self.book_ids, self._book_slots = np.unique(self.page_books, return_inverse=True)
+        # Words found on most pages say little about which page or book this is
+        document_frequency: np.ndarray = np.count_nonzero(self.word_counts, axis=0)
+        self.idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.signatures = (np.vstack([self._weight(counts) for counts in self.word_counts]) if rows
+                           else self.word_counts)
+
+    def _weight(self, histogram: np.ndarray) -> np.ndarray:
+        """TF-IDF weight and L2 normalize a word histogram."""
+        weighted: np.ndarray = histogram / max(float(histogram.sum()), 1.0) * self.idf
+        norm: float = float(np.linalg.norm(weighted))
+        return weighted / norm if norm else weighted
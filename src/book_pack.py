@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import struct
+import time
+import uuid
+import zlib
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+import numpy as np
+from src.book_index import BookIndex
+from src.descriptor_store import ORB_DESCRIPTOR_SIZE
+from src.hash_index import hash_to_db
+from src.image_mapping import ImageMapping, ImageMappingDB
+
+PACK_EXTENSION: str = ".srpack"
+MAGIC: bytes = b"SRBP"
+FORMAT_VERSION: int = 1
+# magic, format version, pages, audio clips, vocabulary words, CRC-32 of everything
+# after the header, descriptor rows, metadata bytes, audio bytes; 48 bytes so the
+# sections after it stay 8 byte aligned
+HEADER: struct.Struct = struct.Struct("<4sIIIIIQQQ")
+# One record per page in reading order; audio_index is -1 for pages without a clip
+PAGE_DTYPE: np.dtype = np.dtype([("image_hash", "<i8"), ("audio_index", "<i8")])
+COPY_CHUNK_BYTES: int = 1 << 20
+
+
+class BookPackError(ValueError):
+    """Raised for a file that is not a valid book pack."""
+
+
+def _padding(size: int) -> int:
+    """Bytes needed to align the next section to 8 bytes."""
+    return -size % 8
+
+
+class _PackWriter:
+    """Sequential pack output keeping a running CRC of the body."""
+    def __init__(self, stream: BinaryIO):
+        self.stream: BinaryIO = stream
+        self.crc: int = 0
+
+    def write(self, data: bytes) -> None:
+        self.crc = zlib.crc32(data, self.crc)
+        self.stream.write(data)
+
+    def write_section(self, data: bytes) -> None:
+        self.write(data)
+        self.write(bytes(_padding(len(data))))
+
+
+class _PackReader:
+    """Sequential pack input checking the CRC as the body is read."""
+    def __init__(self, stream: BinaryIO):
+        self.stream: BinaryIO = stream
+        self.crc: int = 0
+
+    def read(self, size: int) -> bytes:
+        data: bytes = self.stream.read(size)
+        if len(data) != size:
+            raise BookPackError("Book pack is truncated")
+        self.crc = zlib.crc32(data, self.crc)
+        return data
+
+    def read_section(self, size: int) -> bytes:
+        data: bytes = self.read(size)
+        self.read(_padding(size))
+        return data
+
+
+def export_book(db: ImageMappingDB, book_id: int, path: str) -> int:
+    """
+    Write one book as a self-contained pack.
+
+    Sections follow the header in this order, each aligned to 8 bytes so they can be
+    memory-mapped as arrays: JSON metadata (title, clip file names), the page table
+    (hash and clip per page), descriptor row offsets per page, clip byte offsets,
+    the visual vocabulary and per-page word counts when the book is indexed, all
+    descriptors, and finally the audio clips back to back.
+
+    Args:
+        db (ImageMappingDB): Library holding the book
+        book_id (int): Book to export
+        path (str): Output pack file, replaced atomically
+
+    Returns:
+        int: Number of pages written
+    """
+    mappings, book_descriptors = db.get_book_descriptors(book_id)
+    if not mappings:
+        raise ValueError(f"Book {book_id} has no pages")
+
+    # Pages sharing a clip share one copy of it
+    audio_indexes = {}
+    pages: np.ndarray = np.zeros(len(mappings), dtype=PAGE_DTYPE)
+    for i, mapping in enumerate(mappings):
+        pages[i]["image_hash"] = hash_to_db(mapping.image_hash)
+        pages[i]["audio_index"] = (-1 if mapping.audio_path is None
+                                   else audio_indexes.setdefault(mapping.audio_path, len(audio_indexes)))
+    audio_paths: List[str] = list(audio_indexes)
+    audio_offsets: np.ndarray = np.concatenate(([0], np.cumsum([os.path.getsize(p) for p in audio_paths]))).astype("<i8")
+
+    vocabulary: Optional[np.ndarray] = db.get_visual_vocabulary()
+    counts_by_id = {mapping_id: counts for mapping_id, _, counts in db.get_page_word_counts(book_id)}
+    word_counts: Optional[np.ndarray] = None
+    if vocabulary is not None and all(mapping.id in counts_by_id for mapping in mappings):
+        word_counts = np.vstack([counts_by_id[mapping.id] for mapping in mappings]).astype("<u2")
+    else:
+        # Pages without counts would have to be counted on import anyway
+        vocabulary = None
+
+    metadata: bytes = json.dumps({
+        "title": db.get_book_title(book_id),
+        "audio_names": [os.path.basename(p) for p in audio_paths],
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }).encode("utf-8")
+
+    temp_path: str = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(bytes(HEADER.size))
+            writer = _PackWriter(f)
+            writer.write_section(metadata)
+            writer.write_section(pages.tobytes())
+            writer.write_section(np.asarray(book_descriptors.row_offsets, dtype="<i8").tobytes())
+            writer.write_section(audio_offsets.tobytes())
+            if vocabulary is not None:
+                writer.write_section(np.ascontiguousarray(vocabulary, dtype=np.uint8).tobytes())
+                writer.write_section(word_counts.tobytes())
+            writer.write_section(book_descriptors.descriptors.tobytes())
+            for audio_path in audio_paths:
+                with open(audio_path, "rb") as audio:
+                    while chunk := audio.read(COPY_CHUNK_BYTES):
+                        writer.write(chunk)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(mappings), len(audio_paths),
+                                0 if vocabulary is None else len(vocabulary), writer.crc,
+                                len(book_descriptors.descriptors), len(metadata), int(audio_offsets[-1])))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(mappings)
+
+
+def import_book(db: ImageMappingDB, path: str, audio_dir: str = "audio",
+                book_index: Optional[BookIndex] = None) -> Tuple[int, int]:
+    """
+    Add a book from a pack in one sequential pass over the file.
+
+    Clips are streamed into audio_dir and the pages are inserted in one transaction
+    under a newly assigned book id, after the checksum of the whole pack has been
+    verified. On any failure the database is left untouched and the clips written
+    so far are removed.
+
+    Args:
+        db (ImageMappingDB): Library to add the book to
+        path (str): Pack file
+        audio_dir (str): Directory the clips are written to
+        book_index (Optional[BookIndex]): Index to add the book's pages to; pass one
+            index when importing many packs so it is loaded only once
+
+    Returns:
+        Tuple[int, int]: The new book id and its page count
+    """
+    if book_index is None:
+        book_index = BookIndex(db)
+    # Loaded before the pages are stored, so they are indexed from the pack's word counts
+    # rather than picked up and counted again by load()
+    if not book_index.is_loaded:
+        book_index.load()
+
+    written: List[str] = []
+    try:
+        with open(path, "rb") as f:
+            header: bytes = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise BookPackError(f"Not a book pack: {path}")
+            (magic, version, page_count, audio_count, vocabulary_words, checksum,
+             descriptor_rows, metadata_bytes, audio_bytes) = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise BookPackError(f"Not a book pack: {path}")
+            if version != FORMAT_VERSION:
+                raise BookPackError(f"Unsupported book pack version {version}: {path}")
+
+            reader = _PackReader(f)
+            try:
+                metadata: dict = json.loads(reader.read_section(metadata_bytes).decode("utf-8"))
+            except ValueError as e:
+                # Corrupt metadata fails to parse before the checksum can be checked
+                raise BookPackError(f"Book pack is corrupt: {path}") from e
+            pages: np.ndarray = np.frombuffer(reader.read_section(page_count * PAGE_DTYPE.itemsize), dtype=PAGE_DTYPE)
+            row_offsets: np.ndarray = np.frombuffer(reader.read_section((page_count + 1) * 8), dtype="<i8")
+            audio_offsets: np.ndarray = np.frombuffer(reader.read_section((audio_count + 1) * 8), dtype="<i8")
+            vocabulary: Optional[np.ndarray] = None
+            word_counts: Optional[np.ndarray] = None
+            if vocabulary_words:
+                vocabulary = np.frombuffer(reader.read_section(vocabulary_words * ORB_DESCRIPTOR_SIZE),
+                                           dtype=np.uint8).reshape(vocabulary_words, ORB_DESCRIPTOR_SIZE)
+                word_counts = np.frombuffer(reader.read_section(page_count * vocabulary_words * 2),
+                                            dtype="<u2").reshape(page_count, vocabulary_words)
+            descriptors: np.ndarray = np.frombuffer(reader.read_section(descriptor_rows * ORB_DESCRIPTOR_SIZE),
+                                                    dtype=np.uint8).reshape(descriptor_rows, ORB_DESCRIPTOR_SIZE)
+
+            # The checksum is only known once the clips are read, so check their layout before writing any
+            if (len(metadata.get("audio_names", [])) != audio_count or audio_offsets[-1] != audio_bytes
+                    or np.any(np.diff(audio_offsets) < 0)):
+                raise BookPackError(f"Book pack is corrupt: {path}")
+            os.makedirs(audio_dir, exist_ok=True)
+            prefix: str = uuid.uuid4().hex
+            for i, name in enumerate(metadata["audio_names"]):
+                audio_path: str = os.path.join(audio_dir, f"{prefix}_{i:03d}{os.path.splitext(name)[1]}")
+                remaining: int = int(audio_offsets[i + 1] - audio_offsets[i])
+                written.append(audio_path)
+                with open(audio_path, "wb") as audio:
+                    while remaining:
+                        chunk: bytes = reader.read(min(remaining, COPY_CHUNK_BYTES))
+                        audio.write(chunk)
+                        remaining -= len(chunk)
+            if reader.crc != checksum:
+                raise BookPackError(f"Book pack is corrupt: {path}")
+
+        mappings: List[ImageMapping] = [
+            ImageMapping(audio_path=written[page["audio_index"]] if page["audio_index"] >= 0 else None,
+                         image_hash=int(page["image_hash"]) & 0xFFFFFFFFFFFFFFFF,
+                         orb_features=descriptors[row_offsets[i]:row_offsets[i + 1]]
+                         if row_offsets[i + 1] > row_offsets[i] else None)
+            for i, page in enumerate(pages)]
+        book_id, _ = db.add_mappings(mappings, title=metadata.get("title"))
+    except BaseException:
+        for audio_path in written:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+        raise
+
+    if vocabulary is not None:
+        book_index.add_indexed_book(mappings, vocabulary, word_counts)
+    else:
+        book_index.add_book(mappings)
+    return book_id, len(mappings)
+
+
+def import_books(db: ImageMappingDB, paths: Iterable[str], audio_dir: str = "audio") -> List[int]:
+    """Import several packs sharing one book index; returns the new book ids in order."""
+    book_index = BookIndex(db)
+    book_ids: List[int] = []
+    for path in paths:
+        book_id, page_count = import_book(db, path, audio_dir, book_index)
+        print(f"Imported {path} as book {book_id} ({page_count} pages)")
+        book_ids.append(book_id)
+    return book_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and import books as portable pack files")
+    parser.add_argument("--db", default="data/image_mappings.db", help="Image mapping database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write one pack per book")
+    export_parser.add_argument("book_ids", nargs="*", type=int, help="Books to export (default: all)")
+    export_parser.add_argument("--output-dir", default="packs")
+    import_parser = commands.add_parser("import", help="Add books from packs")
+    import_parser.add_argument("packs", nargs="+")
+    import_parser.add_argument("--audio-dir", default="audio", help="Where imported clips are written")
+    args = parser.parse_args()
+
+    image_mapping_db = ImageMappingDB(args.db)
+    start: float = time.perf_counter()
+    try:
+        if args.command == "export":
+            os.makedirs(args.output_dir, exist_ok=True)
+            for export_id in args.book_ids or image_mapping_db.get_book_ids():
+                pack_path: str = os.path.join(args.output_dir, f"book_{export_id}{PACK_EXTENSION}")
+                print(f"Exported book {export_id} ({export_book(image_mapping_db, export_id, pack_path)} pages) "
+                      f"to {pack_path}")
+        else:
+            import_books(image_mapping_db, args.packs, args.audio_dir)
+    finally:
+        image_mapping_db.close()
+    print(f"Done in {time.perf_counter() - start:.1f} s")
@@ -1,10 +1,13 @@
-from threading import Lock
+from threading import Lock, Condition, Thread
 import cv2
+import numpy as np
 from PIL import Image
 import time
-from typing import Optional, Union, Tuple
+from typing import Optional, Union, Tuple, Callable
 import platform
 import sys
+from src.frame_replay import FrameSequenceReader, FrameSequenceWriter, ReplayFinished
+from src.tracing import span
 
 # Check if running on Raspberry Pi
 IS_RASPBERRY_PI = sys.platform == 'linux'
@@ -22,35 +25,87 @@ class CameraManager:
     Manages camera operations with on-demand frame capture.
     Keeps camera initialized but only captures when requested.
     Automatically uses PiCamera2 on Raspberry Pi and falls back to OpenCV on other platforms.
+
+    Two streams are exposed: a small grayscale preview for cheap change detection
+    (get_preview_frame) and the full resolution frame, captured only on demand (get_frame).
+    On PiCamera2 the preview comes from the hardware lores stream.
+
+    With continuous capture enabled, a background thread grabs preview frames into a
+    preallocated ring of buffers and get_preview_frame returns the newest one immediately.
+
+    For deterministic testing the camera can be replaced by a recorded frame sequence
+    (replay_source), and a live session can be recorded into that format (record_to).
+    Replayed and recorded previews are downscaled from the full frame, as with OpenCV.
     
     Args:
         camera_id (int): Camera device ID (default: 0)
         resolution (tuple[int, int], optional): Desired camera resolution (width, height)
+        preview_resolution (tuple[int, int], optional): Preview stream resolution (width, height)
+        continuous (bool): Capture preview frames continuously on a background thread
+        ring_size (int): Number of preview buffers kept by the background thread
+        on_motion (Callable[[float], None], optional): Called by the grabber thread with the
+            mean absolute difference between consecutive downsampled preview frames
+        replay_source (str, optional): Frame sequence directory or video file to replay instead of a camera
+        replay_realtime (bool): Pace replay by the recorded timestamps rather than as fast as possible
+        record_to (str, optional): Directory to record every polled frame into for later replay
     """
-    def __init__(self, camera_id: int = 0, resolution: Tuple[int, int] = (1920, 1080)):
+    def __init__(self, camera_id: int = 0, resolution: Tuple[int, int] = (1920, 1080),
+                 preview_resolution: Tuple[int, int] = (320, 240),
+                 continuous: bool = False, ring_size: int = 3,
+                 on_motion: Optional[Callable[[float], None]] = None,
+                 replay_source: Optional[str] = None, replay_realtime: bool = True,
+                 record_to: Optional[str] = None):
         self.camera_id = camera_id
         self.resolution = resolution
-        self.capture: Union[cv2.VideoCapture, Picamera2, None] = None
+        self.preview_resolution = preview_resolution
+        self.capture: Union[cv2.VideoCapture, Picamera2, FrameSequenceReader, None] = None
         self.lock = Lock()
         self.is_running = False
-        self.using_picamera = IS_RASPBERRY_PI
+        self.replay_source: Optional[str] = replay_source
+        self.replay_realtime: bool = replay_realtime
+        self.using_replay: bool = replay_source is not None
+        self.using_picamera = IS_RASPBERRY_PI and not self.using_replay
+        self.record_to: Optional[str] = record_to
+        self.frame_writer: Optional[FrameSequenceWriter] = None
+
+        # Latest-frame ring buffer filled by the grabber thread
+        self.continuous = continuous
+        self.ring: np.ndarray = np.zeros((ring_size, preview_resolution[1], preview_resolution[0]), dtype=np.uint8)
+        self.ring_timestamps: np.ndarray = np.zeros(ring_size, dtype=np.float64)
+        self.ring_condition = Condition()
+        self.latest_index: int = -1
+        self.frames_captured: int = 0
+        self.frames_dropped: int = 0
+        self._last_read_count: int = 0
+        self._grabber_thread: Optional[Thread] = None
+        self.on_motion: Optional[Callable[[float], None]] = on_motion
+        self._motion_reference: Optional[np.ndarray] = None
         
     def start(self) -> None:
         """Initialize and configure the camera."""
         with self.lock:
-            if self.using_picamera:
+            if self.using_replay:
+                self.capture = FrameSequenceReader(self.replay_source, realtime=self.replay_realtime)
+            elif self.using_picamera:
                 self._start_picamera()
             else:
                 self._start_opencv()
+            if self.record_to is not None:
+                self.frame_writer = FrameSequenceWriter(self.record_to)
             
             self.is_running = True
+
+        if self.continuous:
+            self._grabber_thread = Thread(target=self._grab_frames, daemon=True)
+            self._grabber_thread.start()
             
     def _start_picamera(self) -> None:
         """Initialize and configure PiCamera2."""
         self.capture = Picamera2()
-        # Configure camera with main preview configuration
-        config = self.capture.create_still_configuration(
-            main={"size": self.resolution, "format": "RGB888"}
+        # Full resolution main stream for matching, YUV lores stream for change detection
+        config = self.capture.create_preview_configuration(
+            main={"size": self.resolution, "format": "RGB888"},
+            lores={"size": self.preview_resolution, "format": "YUV420"}
         )
         self.capture.configure(config)
         self.capture.start()
@@ -80,29 +135,170 @@ class CameraManager:
         Raises:
             RuntimeError: If camera is not initialized or frame capture fails
         """
-        with self.lock:
+        with self.lock, span("capture_full"):
             if not self.is_running or self.capture is None:
                 raise RuntimeError("Camera not initialized or stopped")
-            
-            if self.using_picamera:
-                # PiCamera2 captures directly in RGB format
-                frame = self.capture.capture_array()
+            if self.using_replay:
+                # The full frame behind the most recently served preview
+                frame = self.capture.current()
+                if frame is None:
+                    self._finish_replay()
                 return Image.fromarray(frame)
-            else:
-                # OpenCV capture
-                ret, frame = self.capture.read()
-                if not ret:
-                    raise RuntimeError("Failed to capture frame")
-                # Convert from BGR to RGB
-                return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            return Image.fromarray(self._capture_full_array())
+
+    def get_preview_frame(self) -> Image.Image:
+        """
+        Return a low resolution grayscale frame for change detection.
+        Captures synchronously, or returns the newest buffered frame in continuous mode.
+        
+        Returns:
+            Image.Image: Preview frame as a PIL Image in L (grayscale) mode
+            
+        Raises:
+            RuntimeError: If camera is not initialized or frame capture fails
+        """
+        if self.continuous:
+            return Image.fromarray(self.get_preview_array(copy=True)[0])
+
+        with self.lock, span("capture_preview"):
+            if not self.is_running or self.capture is None:
+                raise RuntimeError("Camera not initialized or stopped")
+            return Image.fromarray(self._capture_preview_array())
+
+    def get_preview_array(self, copy: bool = False, timeout: float = 2.0) -> Tuple[np.ndarray, float]:
+        """
+        Return the newest buffered preview frame from the continuous grabber.
+        
+        Args:
+            copy (bool): Return a copy instead of a view into the ring buffer. Views
+                stay valid until the grabber wraps around the ring.
+            timeout (float): Seconds to wait for the first frame
+        
+        Returns:
+            Tuple[np.ndarray, float]: Grayscale frame and its capture timestamp
+            
+        Raises:
+            RuntimeError: If continuous capture is not running or no frame arrives in time
+        """
+        with self.ring_condition:
+            if not self.ring_condition.wait_for(lambda: self.latest_index >= 0 or not self.is_running, timeout):
+                raise RuntimeError("Timed out waiting for a camera frame")
+            if not self.is_running:
+                raise RuntimeError("Camera not initialized or stopped")
+            frame: np.ndarray = self.ring[self.latest_index]
+            self._last_read_count = self.frames_captured
+            return (frame.copy() if copy else frame), float(self.ring_timestamps[self.latest_index])
+
+    def get_frame_stats(self) -> dict:
+        """Capture counters for the continuous grabber."""
+        with self.ring_condition:
+            return {
+                "frames_captured": self.frames_captured,
+                "frames_dropped": self.frames_dropped,
+                "latest_timestamp": float(self.ring_timestamps[self.latest_index]) if self.latest_index >= 0 else None,
+            }
+
+    def _capture_full_array(self) -> np.ndarray:
+        """Capture one full resolution RGB frame from a live camera. Caller must hold self.lock."""
+        if self.using_picamera:
+            # PiCamera2 captures directly in RGB format
+            return self.capture.capture_array()
+        ret, frame = self.capture.read()
+        if not ret:
+            raise RuntimeError("Failed to capture frame")
+        # Convert from BGR to RGB
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def _capture_preview_array(self) -> np.ndarray:
+        """Capture one grayscale preview frame. Caller must hold self.lock."""
+        width, height = self.preview_resolution
+        if self.using_picamera and self.frame_writer is None:
+            # The Y plane of the YUV420 lores stream is already a grayscale image
+            yuv = self.capture.capture_array("lores")
+            return yuv[:height, :width]
+
+        if self.using_replay:
+            frame = self.capture.advance()
+            if frame is None:
+                self._finish_replay()
+            color_conversion = cv2.COLOR_RGB2GRAY
+        elif self.frame_writer is not None:
+            # Recording needs the full frame, so derive the preview from it
+            frame = self._capture_full_array()
+            self.frame_writer.write(frame, time.monotonic())
+            color_conversion = cv2.COLOR_RGB2GRAY
+        else:
+            ret, frame = self.capture.read()
+            if not ret:
+                raise RuntimeError("Failed to capture frame")
+            color_conversion = cv2.COLOR_BGR2GRAY
+        with span("convert"):
+            gray = cv2.cvtColor(frame, color_conversion)
+            return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+    def _finish_replay(self) -> None:
+        """Mark the camera stopped once the replayed sequence runs out. Caller must hold self.lock."""
+        self.is_running = False
+        with self.ring_condition:
+            self.ring_condition.notify_all()
+        raise ReplayFinished("Replay finished")
+
+    def _grab_frames(self) -> None:
+        """Background producer that keeps the ring buffer filled with the newest frames."""
+        while self.is_running:
+            try:
+                with self.lock:
+                    if not self.is_running or self.capture is None:
+                        break
+                    frame: np.ndarray = self._capture_preview_array()
+                    timestamp: float = time.monotonic()
+            except Exception as e:
+                print(f"Warning: Frame grab failed: {e}")
+                time.sleep(0.1)
+                continue
+
+            with self.ring_condition:
+                next_index: int = (self.latest_index + 1) % len(self.ring)
+                np.copyto(self.ring[next_index], frame)
+                self.ring_timestamps[next_index] = timestamp
+                # The previous newest frame is replaced without ever being read
+                if self.latest_index >= 0 and self._last_read_count < self.frames_captured:
+                    self.frames_dropped += 1
+                self.latest_index = next_index
+                self.frames_captured += 1
+                self.ring_condition.notify_all()
+
+            if self.on_motion is not None:
+                self.on_motion(self._motion_score(frame))
+
+    def _motion_score(self, frame: np.ndarray) -> float:
+        """Cheap motion signal: mean absolute difference of a 1/8 scale thumbnail."""
+        thumbnail: np.ndarray = frame[::8, ::8].astype(np.int16)
+        reference: Optional[np.ndarray] = self._motion_reference
+        self._motion_reference = thumbnail
+        if reference is None or reference.shape != thumbnail.shape:
+            return 0.0
+        return float(np.abs(thumbnail - reference).mean())
             
     def stop(self) -> None:
         """Stop and release camera resources."""
+        self.is_running = False
+        with self.ring_condition:
+            self.ring_condition.notify_all()
+        if self._grabber_thread is not None:
+            self._grabber_thread.join()
+            self._grabber_thread = None
+
         with self.lock:
-            self.is_running = False
+            self.latest_index = -1
+            if self.frame_writer is not None:
+                self.frame_writer.close()
+                self.frame_writer = None
             if self.capture is not None:
                 try:
-                    if self.using_picamera:
+                    if self.using_replay:
+                        self.capture.close()
+                    elif self.using_picamera:
                         self.capture.stop()
                         self.capture.close()  # Add explicit close for PiCamera2
                     else:
@@ -0,0 +1,108 @@
+import threading
+from typing import Callable, Optional, TYPE_CHECKING
+from src.tracing import span
+
+if TYPE_CHECKING:
+    from src.camera_manager import CameraManager
+
+
+class CameraService:
+    """
+    One long-lived camera shared by the recorder and the narrator.
+
+    start() opens and warms up the camera on a background thread and returns at once,
+    so warm-up overlaps with imports, database and cache loading. Controllers acquire
+    the running camera instead of opening their own and release it when they stop;
+    the camera stays warm until close(), so switching modes costs nothing.
+    The camera backend (picamera2 on a Pi) is only imported on that background thread.
+
+    Args:
+        camera_id (int): Camera device ID
+        continuous_capture (bool): Capture preview frames continuously on a background thread
+        replay_source (Optional[str]): Frame sequence directory or video file to use instead of a camera
+        replay_realtime (bool): Pace replay by the recorded timestamps
+    """
+    def __init__(self, camera_id: int = 0, continuous_capture: bool = False,
+                 replay_source: Optional[str] = None, replay_realtime: bool = True):
+        self.camera_id: int = camera_id
+        self.continuous_capture: bool = continuous_capture
+        self.replay_source: Optional[str] = replay_source
+        self.replay_realtime: bool = replay_realtime
+        self.camera_manager: Optional["CameraManager"] = None
+        self.on_motion: Optional[Callable[[float], None]] = None
+        self.lock = threading.Lock()
+        self._ready = threading.Event()
+        self._start_error: Optional[Exception] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Begin opening the camera in the background, if not already started."""
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._ready.clear()
+            self._start_error = None
+            self._thread = threading.Thread(target=self._start_camera, daemon=True)
+            self._thread.start()
+
+    def _start_camera(self) -> None:
+        try:
+            with span("camera_warmup"):
+                from src.camera_manager import CameraManager
+                camera_manager = CameraManager(self.camera_id, continuous=self.continuous_capture,
+                                               on_motion=self._notify_motion, replay_source=self.replay_source,
+                                               replay_realtime=self.replay_realtime)
+                camera_manager.start()
+            self.camera_manager = camera_manager
+        except Exception as e:
+            self._start_error = e
+        finally:
+            self._ready.set()
+
+    def acquire(self, on_motion: Optional[Callable[[float], None]] = None,
+                timeout: Optional[float] = None) -> "CameraManager":
+        """
+        Wait for the camera to be ready and take it over.
+
+        Args:
+            on_motion (Optional[Callable[[float], None]]): Receives motion scores from continuous capture
+            timeout (Optional[float]): Seconds to wait for warm-up
+
+        Returns:
+            CameraManager: The running camera
+
+        Raises:
+            RuntimeError: If the camera failed to start or did not start in time
+        """
+        self.start()
+        with span("camera_wait"):
+            if not self._ready.wait(timeout):
+                raise RuntimeError("Camera did not start in time")
+        with self.lock:
+            if self._start_error is not None or not self.camera_manager.is_running:
+                error: Optional[Exception] = self._start_error
+                # Let the next acquire try again, e.g. after the camera is reconnected
+                self._thread = None
+                self.camera_manager = None
+                raise RuntimeError(f"Camera failed to start: {error}") from error
+            self.on_motion = on_motion
+            return self.camera_manager
+
+    def release(self) -> None:
+        """Hand the camera back; it keeps running for the next user."""
+        self.on_motion = None
+
+    def _notify_motion(self, score: float) -> None:
+        on_motion: Optional[Callable[[float], None]] = self.on_motion
+        if on_motion is not None:
+            on_motion(score)
+
+    def close(self) -> None:
+        """Stop the camera."""
+        if self._thread is not None:
+            self._thread.join()
+        with self.lock:
+            if self.camera_manager is not None:
+                self.camera_manager.stop()
+                self.camera_manager = None
+            self._thread = None
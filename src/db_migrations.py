@@ -0,0 +1,146 @@
+import sqlite3
+from typing import Callable, List, Tuple
+from src.hash_index import hash_to_db
+
+# Connection settings applied to every connection. WAL lets the detection and
+# narration threads read while the recorder writes.
+CONNECTION_PRAGMAS: List[str] = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -8192',  # 8 MiB page cache
+    'PRAGMA mmap_size = 67108864',  # 64 MiB
+]
+
+
+def _migration_1_legacy_table(conn: sqlite3.Connection) -> None:
+    """Original single-table schema; a no-op for databases created before versioning."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS image_mappings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            image_path TEXT,
+            audio_path TEXT,
+            image_hash TEXT,
+            orb_features BLOB
+        )
+    ''')
+
+
+def _migration_2_normalized_schema(conn: sqlite3.Connection) -> None:
+    """Add books, integer hashes, page order and a separate descriptor table."""
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            created_at REAL DEFAULT (strftime('%s', 'now'))
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE image_mappings_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+            page_number INTEGER NOT NULL,
+            image_path TEXT,
+            audio_path TEXT,
+            image_hash INTEGER
+        )
+    ''')
+    conn.execute('INSERT INTO books (id) SELECT DISTINCT book_id FROM image_mappings WHERE book_id IS NOT NULL')
+    rows: List[Tuple] = conn.execute('''
+        SELECT id, book_id, image_path, audio_path, image_hash
+        FROM image_mappings WHERE book_id IS NOT NULL ORDER BY book_id, id
+    ''').fetchall()
+    page_numbers: dict = {}
+    converted: List[Tuple] = []
+    for mapping_id, book_id, image_path, audio_path, image_hash in rows:
+        page_numbers[book_id] = page_numbers.get(book_id, 0) + 1
+        converted.append((mapping_id, book_id, page_numbers[book_id], image_path, audio_path,
+                          hash_to_db(image_hash) if image_hash else None))
+    conn.executemany('''
+        INSERT INTO image_mappings_v2 (id, book_id, page_number, image_path, audio_path, image_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', converted)
+
+    # Swap tables before creating image_features so its foreign key targets the new table
+    conn.execute('ALTER TABLE image_mappings RENAME TO image_mappings_legacy')
+    conn.execute('ALTER TABLE image_mappings_v2 RENAME TO image_mappings')
+    conn.execute('CREATE INDEX idx_image_mappings_book_page ON image_mappings (book_id, page_number)')
+    conn.execute('''
+        CREATE TABLE image_features (
+            mapping_id INTEGER PRIMARY KEY REFERENCES image_mappings(id) ON DELETE CASCADE,
+            orb_features BLOB
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO image_features (mapping_id, orb_features)
+        SELECT id, orb_features FROM image_mappings_legacy
+        WHERE book_id IS NOT NULL AND orb_features IS NOT NULL
+    ''')
+    conn.execute('DROP TABLE image_mappings_legacy')
+
+
+def _migration_3_book_identification(conn: sqlite3.Connection) -> None:
+    """Add the visual vocabulary and per-page visual word counts used to identify books."""
+    conn.execute('''
+        CREATE TABLE visual_vocabulary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            words BLOB NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE page_word_counts (
+            mapping_id INTEGER PRIMARY KEY REFERENCES image_mappings(id) ON DELETE CASCADE,
+            word_counts BLOB NOT NULL
+        )
+    ''')
+
+
+# (version, migration) pairs applied in order; append new migrations to the end
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migration_1_legacy_table),
+    (2, _migration_2_normalized_schema),
+    (3, _migration_3_book_identification),
+]
+
+SCHEMA_VERSION: int = MIGRATIONS[-1][0]
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """Apply the standard pragmas to a new connection."""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Upgrade a database in place to SCHEMA_VERSION.
+    Each migration runs in its own transaction together with the user_version bump,
+    so an interrupted upgrade resumes from the last completed step.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection
+
+    Returns:
+        int: Schema version after migrating
+    """
+    version: int = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target_version, migration in MIGRATIONS:
+        if target_version <= version:
+            continue
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Re-check under the write lock in case another connection migrated first
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= target_version:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {target_version}')
+            conn.commit()
+            print(f"Database migrated to schema version {target_version}")
+        except Exception:
+            conn.rollback()
+            raise
+        version = target_version
+    return version
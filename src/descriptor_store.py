@@ -0,0 +1,122 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Iterable, List, Optional, Sequence
+import numpy as np
+
+ORB_DESCRIPTOR_SIZE: int = 32
+MAGIC: bytes = b"SRDS"
+FORMAT_VERSION: int = 1
+# magic, format version, page count, descriptor row count
+HEADER: struct.Struct = struct.Struct("<4sIQQ")
+
+
+class BookDescriptors:
+    """
+    Read-only view of one book's descriptor file.
+    Arrays are views straight into the memory map, so opening a book copies nothing
+    and its pages are only paged in when matching touches them.
+
+    Attributes:
+        mapping_ids (np.ndarray): Page mapping ids in page order
+        row_offsets (np.ndarray): Page i owns descriptor rows row_offsets[i]:row_offsets[i + 1]
+        descriptors (np.ndarray): (rows, 32) uint8 descriptors of every page, concatenated
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        with open(path, "rb") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, pages, rows = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a descriptor file: {path}")
+        offset: int = HEADER.size
+        self.mapping_ids: np.ndarray = np.frombuffer(self._mmap, dtype="<i8", count=pages, offset=offset)
+        offset += pages * 8
+        self.row_offsets: np.ndarray = np.frombuffer(self._mmap, dtype="<i8", count=pages + 1, offset=offset)
+        offset += (pages + 1) * 8
+        self.descriptors: np.ndarray = np.frombuffer(self._mmap, dtype=np.uint8, count=rows * ORB_DESCRIPTOR_SIZE,
+                                                     offset=offset).reshape(rows, ORB_DESCRIPTOR_SIZE)
+
+    def __len__(self) -> int:
+        return len(self.mapping_ids)
+
+    def page_descriptors(self, position: int) -> np.ndarray:
+        return self.descriptors[self.row_offsets[position]:self.row_offsets[position + 1]]
+
+
+class DescriptorStore:
+    """
+    Per-book descriptor files: a header, the page mapping ids, a row offset table
+    and all of the book's ORB descriptors as one contiguous array.
+    Files are written atomically and rebuilt whenever the book's pages change.
+
+    Args:
+        directory (str): Where book files are kept
+    """
+    def __init__(self, directory: str):
+        self.directory: str = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def book_path(self, book_id: int) -> str:
+        return os.path.join(self.directory, f"book_{book_id}.orb")
+
+    def write_book(self, book_id: int, mapping_ids: Sequence[int],
+                   page_descriptors: Iterable[Optional[np.ndarray]]) -> str:
+        """
+        Write a book's descriptor file, replacing any previous one.
+
+        Args:
+            book_id (int): Book id
+            mapping_ids (Sequence[int]): Page mapping ids in page order
+            page_descriptors (Iterable[Optional[np.ndarray]]): Descriptors of each page, None for pages without any
+
+        Returns:
+            str: Path of the written file
+        """
+        pages: List[np.ndarray] = [np.empty((0, ORB_DESCRIPTOR_SIZE), dtype=np.uint8) if d is None
+                                   else np.asarray(d, dtype=np.uint8).reshape(-1, ORB_DESCRIPTOR_SIZE)
+                                   for d in page_descriptors]
+        offsets: np.ndarray = np.concatenate(([0], np.cumsum([len(d) for d in pages]))).astype("<i8")
+        path: str = self.book_path(book_id)
+        temp_path: str = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(pages), int(offsets[-1])))
+            f.write(np.asarray(mapping_ids, dtype="<i8").tobytes())
+            f.write(offsets.tobytes())
+            for descriptors in pages:
+                f.write(np.ascontiguousarray(descriptors).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        return path
+
+    def open_book(self, book_id: int, mapping_ids: Optional[Sequence[int]] = None) -> Optional[BookDescriptors]:
+        """
+        Map a book's descriptor file.
+
+        Args:
+            book_id (int): Book id
+            mapping_ids (Optional[Sequence[int]]): Expected page ids in page order; a file
+                for a different set of pages is treated as stale
+
+        Returns:
+            Optional[BookDescriptors]: The mapped book, or None if missing or stale
+        """
+        path: str = self.book_path(book_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            book: BookDescriptors = BookDescriptors(path)
+        except (ValueError, struct.error) as e:
+            print(f"Warning: Ignoring unreadable descriptor file {path}: {e}")
+            return None
+        if mapping_ids is not None and not np.array_equal(book.mapping_ids, np.asarray(mapping_ids, dtype=np.int64)):
+            return None
+        return book
+
+    def delete_book(self, book_id: int) -> None:
+        path: str = self.book_path(book_id)
+        if os.path.exists(path):
+            os.remove(path)
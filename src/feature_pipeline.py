@@ -0,0 +1,97 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Callable, List, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+from imagehash import phash
+
+# One ORB detector per worker process, created by the pool initializer
+_worker_orb: Optional[cv2.ORB] = None
+
+
+def _init_worker() -> None:
+    global _worker_orb
+    # Each process already owns a core; keep OpenCV from spawning its own threads
+    cv2.setNumThreads(1)
+    _worker_orb = cv2.ORB_create()
+
+
+def extract_page_features(image_path: str) -> Tuple[str, np.ndarray]:
+    """
+    Compute the perceptual hash and ORB descriptors of a saved page image.
+    The image is read from disk once and used for both.
+
+    Args:
+        image_path (str): Path to the page image
+
+    Returns:
+        Tuple[str, np.ndarray]: Hex phash and ORB descriptors
+    """
+    global _worker_orb
+    if _worker_orb is None:
+        _init_worker()
+    with Image.open(image_path) as img:
+        gray: Image.Image = img.convert("L")
+    image_hash: str = str(phash(gray))
+    _, descriptors = _worker_orb.detectAndCompute(np.asarray(gray), None)
+    return image_hash, descriptors
+
+
+class FeatureExtractionPipeline:
+    """
+    Fans page feature extraction out across a process pool.
+    Pages are submitted as they become available and collected in submission order.
+
+    Args:
+        max_workers (Optional[int]): Worker processes, defaults to the number of cores
+        on_progress (Optional[Callable[[int, int], None]]): Called with (completed, submitted)
+    """
+    def __init__(self, max_workers: Optional[int] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        self.max_workers: int = max_workers or os.cpu_count() or 4
+        self.on_progress: Optional[Callable[[int, int], None]] = on_progress
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.futures: List[Future] = []
+        self.completed: int = 0
+
+    def start(self) -> None:
+        if self.executor is None:
+            # Spawn rather than fork: the pool is started while camera and audio threads are running
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            # Bring the workers up now so the first page does not pay for interpreter startup
+            for _ in range(self.max_workers):
+                self.executor.submit(os.getpid)
+
+    def submit(self, image_path: str) -> Future:
+        """Queue a page image for feature extraction."""
+        self.start()
+        future: Future = self.executor.submit(extract_page_features, image_path)
+        future.add_done_callback(self._report_progress)
+        self.futures.append(future)
+        return future
+
+    def _report_progress(self, _: Future) -> None:
+        self.completed += 1
+        if self.on_progress:
+            self.on_progress(self.completed, len(self.futures))
+
+    def results(self) -> List[Tuple[str, np.ndarray]]:
+        """Wait for every submitted page and return (hash, descriptors) in submission order."""
+        return [future.result() for future in self.futures]
+
+    def close(self, cancel: bool = False) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=cancel)
+            self.executor = None
+        self.futures = []
+        self.completed = 0
+
+    def __enter__(self) -> "FeatureExtractionPipeline":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(cancel=exc_type is not None)
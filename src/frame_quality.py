@@ -0,0 +1,118 @@
+import threading
+from typing import Dict, Optional, Union
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class FrameQualityScore:
+    """
+    Quality measurements of one frame.
+
+    Args:
+        sharpness (float): Variance of the Laplacian; low values mean defocus or motion blur
+        brightness (float): Mean gray level
+        overexposed_fraction (float): Fraction of clipped highlight pixels
+        keypoint_density (float): FAST corners per 10,000 pixels
+        rejected_reason (Optional[str]): Why the frame failed the gate, None if it passed
+    """
+    def __init__(self, sharpness: float, brightness: float, overexposed_fraction: float,
+                 keypoint_density: float, rejected_reason: Optional[str] = None):
+        self.sharpness: float = sharpness
+        self.brightness: float = brightness
+        self.overexposed_fraction: float = overexposed_fraction
+        self.keypoint_density: float = keypoint_density
+        self.rejected_reason: Optional[str] = rejected_reason
+
+    @property
+    def passed(self) -> bool:
+        return self.rejected_reason is None
+
+    def __repr__(self) -> str:
+        return (f"FrameQualityScore(sharpness={self.sharpness:.1f}, brightness={self.brightness:.1f}, "
+                f"overexposed={self.overexposed_fraction:.2f}, keypoints={self.keypoint_density:.2f}, "
+                f"rejected={self.rejected_reason})")
+
+
+class FrameQualityGate:
+    """
+    Cheap check that a settled frame is worth the expensive match stage.
+    Scores a downscaled grayscale frame for blur (Laplacian variance), exposure and
+    texture (FAST corner density), and counts the frames it turned away.
+
+    Args:
+        min_sharpness (float): Minimum Laplacian variance
+        min_brightness (float): Minimum mean gray level
+        max_overexposed_fraction (float): Maximum fraction of pixels at or above 250
+        max_brightness (float): Mean gray level above which a clipped frame counts as washed out;
+            white paper clips most of its pixels too, so clipping alone is not overexposure
+        min_keypoint_density (float): Minimum FAST corners per 10,000 pixels
+        max_side (int): Frames are downscaled so their longest side is at most this
+    """
+    def __init__(self, min_sharpness: float = 60.0, min_brightness: float = 40.0,
+                 max_overexposed_fraction: float = 0.4, max_brightness: float = 240.0,
+                 min_keypoint_density: float = 0.8, max_side: int = 320):
+        self.min_sharpness: float = min_sharpness
+        self.min_brightness: float = min_brightness
+        self.max_overexposed_fraction: float = max_overexposed_fraction
+        self.max_brightness: float = max_brightness
+        self.min_keypoint_density: float = min_keypoint_density
+        self.max_side: int = max_side
+        self.detector: cv2.FastFeatureDetector = cv2.FastFeatureDetector_create(threshold=20)
+        self.lock = threading.Lock()
+        self.frames_checked: int = 0
+        self.frames_rejected: int = 0
+        self.rejections: Dict[str, int] = {}
+
+    def evaluate(self, image: Union[Image.Image, np.ndarray]) -> FrameQualityScore:
+        """
+        Score a frame and update the counters.
+
+        Args:
+            image (Union[Image.Image, np.ndarray]): Frame in any PIL mode, or a grayscale/RGB array
+
+        Returns:
+            FrameQualityScore: Measurements and the rejection reason, if any
+        """
+        gray: np.ndarray = self._downscaled_gray(image)
+        sharpness: float = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        brightness: float = float(gray.mean())
+        overexposed: float = float(np.count_nonzero(gray >= 250)) / gray.size
+        keypoint_density: float = len(self.detector.detect(gray)) * 10000 / gray.size
+
+        reason: Optional[str] = None
+        if brightness < self.min_brightness:
+            reason = "underexposed"
+        elif overexposed > self.max_overexposed_fraction and brightness > self.max_brightness:
+            reason = "overexposed"
+        elif sharpness < self.min_sharpness:
+            reason = "blurry"
+        elif keypoint_density < self.min_keypoint_density:
+            reason = "low_texture"
+
+        with self.lock:
+            self.frames_checked += 1
+            if reason is not None:
+                self.frames_rejected += 1
+                self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        return FrameQualityScore(sharpness, brightness, overexposed, keypoint_density, reason)
+
+    def get_stats(self) -> dict:
+        """Counters of checked and rejected frames; every rejection is a match that was skipped."""
+        with self.lock:
+            return {
+                "frames_checked": self.frames_checked,
+                "frames_rejected": self.frames_rejected,
+                "rejections": dict(self.rejections),
+            }
+
+    def _downscaled_gray(self, image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        if isinstance(image, Image.Image):
+            image = np.asarray(image.convert("L"))
+        elif image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        height, width = image.shape[:2]
+        scale: float = self.max_side / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        return image
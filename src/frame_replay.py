@@ -0,0 +1,225 @@
+import argparse
+import bisect
+import csv
+import os
+import time
+from typing import List, Optional
+import cv2
+import numpy as np
+
+TIMESTAMPS_FILE: str = "timestamps.csv"
+
+
+class ReplayFinished(RuntimeError):
+    """Raised by a replaying camera once the recorded sequence runs out."""
+
+
+class FrameSequenceWriter:
+    """
+    Records camera frames into a replayable frame sequence: a directory of JPEG
+    frames plus a timestamps.csv index with the capture time of each frame.
+
+    Args:
+        directory (str): Output directory, created if missing
+        jpeg_quality (int): JPEG quality for stored frames
+    """
+    def __init__(self, directory: str, jpeg_quality: int = 90):
+        self.directory: str = directory
+        self.jpeg_quality: int = jpeg_quality
+        self.frame_count: int = 0
+        self.start_time: Optional[float] = None
+        os.makedirs(directory, exist_ok=True)
+        self._index = open(os.path.join(directory, TIMESTAMPS_FILE), "w", newline="")
+        self._csv = csv.writer(self._index)
+        self._csv.writerow(["frame", "timestamp"])
+
+    def write(self, frame: np.ndarray, timestamp: float) -> None:
+        """
+        Append an RGB frame.
+
+        Args:
+            frame (np.ndarray): RGB frame
+            timestamp (float): Capture time in seconds (any monotonic clock)
+        """
+        if self.start_time is None:
+            self.start_time = timestamp
+        file_name: str = f"{self.frame_count:06d}.jpg"
+        cv2.imwrite(os.path.join(self.directory, file_name), cv2.cvtColor(frame, cv2.COLOR_RGB2BGR),
+                    [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        self._csv.writerow([file_name, f"{timestamp - self.start_time:.6f}"])
+        self._index.flush()
+        self.frame_count += 1
+
+    def close(self) -> None:
+        if not self._index.closed:
+            self._index.close()
+
+
+class FrameSequenceReader:
+    """
+    Replays a recorded frame sequence (a FrameSequenceWriter directory or a video file).
+
+    In real time mode the frame returned by advance() is the one that was current at
+    the same offset into the original session, so slow consumers skip frames just like
+    they would on a live camera. Otherwise every call returns the next frame.
+
+    Args:
+        source (str): Frame sequence directory or video file
+        realtime (bool): Pace playback by the recorded timestamps
+        loop (bool): Restart from the beginning instead of finishing
+    """
+    def __init__(self, source: str, realtime: bool = True, loop: bool = False):
+        self.source: str = source
+        self.realtime: bool = realtime
+        self.loop: bool = loop
+        self.frame_files: List[str] = []
+        self.timestamps: List[float] = []
+        self.video: Optional[cv2.VideoCapture] = None
+        self.position: int = -1
+        self.current_frame: Optional[np.ndarray] = None
+        self.current_timestamp: float = 0.0
+        self.is_finished: bool = False
+        self._start_time: Optional[float] = None
+
+        if os.path.isdir(source):
+            with open(os.path.join(source, TIMESTAMPS_FILE), newline="") as f:
+                for row in csv.DictReader(f):
+                    self.frame_files.append(os.path.join(source, row["frame"]))
+                    self.timestamps.append(float(row["timestamp"]))
+            if not self.frame_files:
+                raise RuntimeError(f"No frames found in {source}")
+        else:
+            self.video = cv2.VideoCapture(source)
+            if not self.video.isOpened():
+                raise RuntimeError(f"Failed to open replay source {source}")
+
+    def __len__(self) -> int:
+        if self.video is not None:
+            return int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+        return len(self.frame_files)
+
+    def advance(self) -> Optional[np.ndarray]:
+        """
+        Move to the next frame to serve.
+
+        Returns:
+            Optional[np.ndarray]: RGB frame, or None once the sequence is finished
+        """
+        if self.is_finished:
+            return None
+        if self._start_time is None:
+            self._start_time = time.monotonic()
+        elapsed: float = time.monotonic() - self._start_time
+
+        if self.video is not None:
+            frame: Optional[np.ndarray] = self._advance_video(elapsed)
+        else:
+            frame = self._advance_directory(elapsed)
+
+        if frame is None:
+            if self.loop:
+                self.rewind()
+                return self.advance()
+            self.is_finished = True
+            return None
+        self.current_frame = frame
+        return frame
+
+    def current(self) -> Optional[np.ndarray]:
+        """Frame most recently served by advance(), reading the first one if needed."""
+        if self.current_frame is None:
+            return self.advance()
+        return self.current_frame
+
+    def rewind(self) -> None:
+        self.position = -1
+        self._start_time = None
+        self.is_finished = False
+        if self.video is not None:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _advance_directory(self, elapsed: float) -> Optional[np.ndarray]:
+        if self.realtime:
+            # Latest frame recorded at or before the elapsed time, never going backwards
+            target: int = max(self.position, bisect.bisect_right(self.timestamps, elapsed) - 1, 0)
+            if elapsed > self.timestamps[-1] + self._frame_interval():
+                return None
+        else:
+            target = self.position + 1
+        if target >= len(self.frame_files):
+            return None
+        if target == self.position and self.current_frame is not None:
+            return self.current_frame
+        frame: Optional[np.ndarray] = cv2.imread(self.frame_files[target], cv2.IMREAD_COLOR)
+        if frame is None:
+            raise RuntimeError(f"Failed to read replay frame {self.frame_files[target]}")
+        self.position = target
+        self.current_timestamp = self.timestamps[target]
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def _advance_video(self, elapsed: float) -> Optional[np.ndarray]:
+        if self.realtime and self.current_frame is not None and self.current_timestamp > elapsed:
+            # Polled faster than the video plays, keep serving the current frame
+            return self.current_frame
+        frame: Optional[np.ndarray] = None
+        while True:
+            # In real time mode skip ahead until the video clock catches up with the wall clock
+            if frame is not None and (not self.realtime or self.video.get(cv2.CAP_PROP_POS_MSEC) / 1000 > elapsed):
+                break
+            ret, next_frame = self.video.read()
+            if not ret:
+                break
+            frame = next_frame
+            self.position += 1
+            self.current_timestamp = self.video.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if frame is None:
+            return None
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def _frame_interval(self) -> float:
+        if len(self.timestamps) < 2:
+            return 0.0
+        return (self.timestamps[-1] - self.timestamps[0]) / (len(self.timestamps) - 1)
+
+    def close(self) -> None:
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+
+
+def record_session(directory: str, seconds: float, fps: float, camera_id: int = 0) -> int:
+    """
+    Record a live camera session into a replayable frame sequence.
+
+    Args:
+        directory (str): Output directory
+        seconds (float): Session length
+        fps (float): Frames per second to capture
+        camera_id (int): Camera device ID
+
+    Returns:
+        int: Number of frames recorded
+    """
+    from src.camera_manager import CameraManager
+
+    camera = CameraManager(camera_id, record_to=directory)
+    camera.start()
+    try:
+        end_time: float = time.monotonic() + seconds
+        while time.monotonic() < end_time:
+            camera.get_preview_frame()
+            time.sleep(1 / fps)
+        return camera.frame_writer.frame_count
+    finally:
+        camera.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a live camera session for replay")
+    parser.add_argument("directory", help="Output frame sequence directory")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--camera-id", type=int, default=0)
+    args = parser.parse_args()
+    count: int = record_session(args.directory, args.seconds, args.fps, args.camera_id)
+    print(f"Recorded {count} frames to {args.directory}")
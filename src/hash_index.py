@@ -0,0 +1,155 @@
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from imagehash import ImageHash
+import numpy as np
+
+HASH_MASK: int = (1 << 64) - 1
+
+# Set bit count for every byte value, used to popcount packed hashes
+POPCOUNT_TABLE: np.ndarray = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hash_to_int(image_hash: Union[str, int, ImageHash]) -> int:
+    """
+    Convert a perceptual hash to its 64-bit integer key.
+
+    Args:
+        image_hash (Union[str, int, ImageHash]): Hex string, integer or ImageHash
+
+    Returns:
+        int: Unsigned integer representation of the hash bits
+    """
+    if isinstance(image_hash, int):
+        # Integers read back from SQLite are signed
+        return image_hash & HASH_MASK
+    return int(str(image_hash), 16)
+
+
+def hash_to_db(image_hash: Union[str, int, ImageHash]) -> int:
+    """
+    Convert a perceptual hash to a signed 64-bit integer that fits an SQLite INTEGER column.
+
+    Args:
+        image_hash (Union[str, int, ImageHash]): Hex string, integer or ImageHash
+
+    Returns:
+        int: Signed integer with the same 64 bits as the hash
+    """
+    value: int = hash_to_int(image_hash)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two integer hashes."""
+    return bin(a ^ b).count("1")
+
+
+def pack_hashes(image_hashes: Iterable[Union[str, int, ImageHash]]) -> np.ndarray:
+    """
+    Pack perceptual hashes into a contiguous uint64 array.
+
+    Args:
+        image_hashes (Iterable[Union[str, int, ImageHash]]): Hashes to pack
+
+    Returns:
+        np.ndarray: 1-D uint64 array with one entry per hash
+    """
+    return np.array([hash_to_int(image_hash) for image_hash in image_hashes], dtype=np.uint64)
+
+
+def hamming_distances(packed_hashes: np.ndarray, image_hash: Union[str, int, ImageHash]) -> np.ndarray:
+    """
+    Hamming distance from one hash to every packed hash in a single pass.
+
+    Args:
+        packed_hashes (np.ndarray): uint64 array from pack_hashes
+        image_hash (Union[str, int, ImageHash]): Query hash
+
+    Returns:
+        np.ndarray: Distances aligned with packed_hashes
+    """
+    xor: np.ndarray = np.bitwise_xor(packed_hashes, np.uint64(hash_to_int(image_hash)))
+    return POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+class _BKNode:
+    __slots__ = ("hash_value", "ids", "children")
+
+    def __init__(self, hash_value: int, mapping_id: int) -> None:
+        self.hash_value: int = hash_value
+        self.ids: List[int] = [mapping_id]
+        self.children: Dict[int, "_BKNode"] = {}
+
+
+class HashIndex:
+    """
+    BK-tree over 64-bit perceptual hashes keyed by Hamming distance.
+    Returns the ids of all hashes within a distance threshold without
+    comparing against every stored hash.
+    """
+    def __init__(self, entries: Optional[Iterable[Tuple[int, Union[str, int, ImageHash]]]] = None) -> None:
+        self.root: Optional[_BKNode] = None
+        self.size: int = 0
+        self.lock = Lock()
+        if entries is not None:
+            for mapping_id, image_hash in entries:
+                self.add(mapping_id, image_hash)
+
+    def add(self, mapping_id: int, image_hash: Union[str, int, ImageHash]) -> None:
+        """
+        Insert a hash into the index.
+
+        Args:
+            mapping_id (int): Row id the hash belongs to
+            image_hash (Union[str, int, ImageHash]): Perceptual hash of the image
+        """
+        hash_value: int = hash_to_int(image_hash)
+        with self.lock:
+            self.size += 1
+            if self.root is None:
+                self.root = _BKNode(hash_value, mapping_id)
+                return
+
+            node: _BKNode = self.root
+            while True:
+                distance: int = hamming_distance(hash_value, node.hash_value)
+                if distance == 0:
+                    node.ids.append(mapping_id)
+                    return
+                child: Optional[_BKNode] = node.children.get(distance)
+                if child is None:
+                    node.children[distance] = _BKNode(hash_value, mapping_id)
+                    return
+                node = child
+
+    def search(self, image_hash: Union[str, int, ImageHash], threshold: int) -> List[Tuple[int, int]]:
+        """
+        Find all stored hashes within a Hamming distance threshold.
+
+        Args:
+            image_hash (Union[str, int, ImageHash]): Query hash
+            threshold (int): Maximum Hamming distance (inclusive)
+
+        Returns:
+            List[Tuple[int, int]]: (mapping_id, distance) pairs sorted by distance
+        """
+        hash_value: int = hash_to_int(image_hash)
+        results: List[Tuple[int, int]] = []
+        with self.lock:
+            if self.root is None:
+                return results
+            stack: List[_BKNode] = [self.root]
+            while stack:
+                node: _BKNode = stack.pop()
+                distance: int = hamming_distance(hash_value, node.hash_value)
+                if distance <= threshold:
+                    results.extend((mapping_id, distance) for mapping_id in node.ids)
+                # Triangle inequality: only subtrees within [d - t, d + t] can hold matches
+                for child_distance, child in node.children.items():
+                    if distance - threshold <= child_distance <= distance + threshold:
+                        stack.append(child)
+        results.sort(key=lambda x: x[1])
+        return results
+
+    def __len__(self) -> int:
+        return self.size
@@ -2,10 +2,15 @@ import threading
 import time
 from PIL import Image
 from collections import deque
-from typing import Optional, Callable, Deque
-from src.image_mapping import ImageMapping, ImageMappingDB
+from typing import Optional, Callable, Deque, Union
+from src.image_mapping import ImageMapping
 from enum import Enum
 from src.image_utils import ImageUtils
+from src.polling_scheduler import PollingScheduler, PollingProfile
+from src.frame_replay import ReplayFinished
+from src.tracing import span
+from src.frame_quality import FrameQualityGate, FrameQualityScore
+from src.camera_service import CameraService
 from imagehash import ImageHash
 
 class ContextState(Enum):
@@ -18,15 +23,28 @@ class LEDColor(Enum):
     GREEN = 2
 
 class ImageContextController:
-    def __init__(self, refresh_rate: float = 0.3, history_size: int = 4, stable_threshold: int = 10, 
+    def __init__(self, refresh_rate: Optional[float] = None, history_size: int = 4, stable_threshold: int = 10, 
                  page_turn_threshold: int = 20, stabilization_count: int = 5, 
                  on_stable_context: Optional[Callable[[ImageMapping], None]] = None, 
-                 led_indicator: Optional[Callable[[LEDColor], None]] = None):
+                 led_indicator: Optional[Callable[[LEDColor], None]] = None,
+                 continuous_capture: bool = False,
+                 polling_profile: Union[str, PollingProfile] = "balanced",
+                 replay_source: Optional[str] = None, replay_realtime: bool = True,
+                 record_frames_to: Optional[str] = None,
+                 quality_gate: Optional[FrameQualityGate] = None,
+                 camera_service: Optional[CameraService] = None,
+                 max_quality_rejections: int = 2, quality_retry_polls: int = 3):
         self.current_image_mapping: Optional[ImageMapping] = None
         self.last_key_image_hash: Optional[ImageHash] = None
         self.hamming_history: Deque[int] = deque(maxlen=history_size)
         self.hash_history: Deque[ImageHash] = deque(maxlen=history_size)
-        self.refresh_rate: float = refresh_rate
+        self.scheduler: PollingScheduler = PollingScheduler(polling_profile)
+        if refresh_rate is not None:
+            # A fixed refresh rate overrides the profile's active polling interval
+            self.scheduler.profile = PollingProfile(refresh_rate, self.scheduler.profile.idle_interval,
+                                                    self.scheduler.profile.max_idle_interval,
+                                                    self.scheduler.profile.backoff_factor,
+                                                    self.scheduler.profile.motion_threshold)
         self.stable_threshold: int = stable_threshold
         self.page_turn_threshold: int = page_turn_threshold
         self.stabilization_count: int = stabilization_count
@@ -36,38 +54,66 @@ class ImageContextController:
         self.led_indicator: Optional[Callable[[LEDColor], None]] = led_indicator
         self.state: ContextState = ContextState.SEARCHING_STABLE
         self.stable_count: int = 0
-        self.db: Optional[ImageMappingDB] = None
-        self.image_utils = ImageUtils()
-
-    def _set_image_context(self, new_image: Image.Image, new_image_hash: ImageHash) -> ImageMapping:
-        image_path: str = self.image_utils.save_image(new_image, temp=True)
-        image_mapping: ImageMapping = ImageMapping(image_path=image_path, image_hash=new_image_hash)
+        self._camera_thread: Optional[threading.Thread] = None
+        # Optional check that a settled preview frame is sharp and well exposed enough to match
+        self.quality_gate: Optional[FrameQualityGate] = quality_gate
+        # A page rejected this many times in a row is matched anyway, e.g. a sparse page that never passes
+        self.max_quality_rejections: int = max_quality_rejections
+        # Polls before a rejected page that has not moved is scored again; they run at the active interval
+        self.quality_retry_polls: int = quality_retry_polls
+        self.quality_rejections: int = 0
+        self.quality_retry_countdown: Optional[int] = None
+        # Replaying as fast as possible skips the polling delays altogether
+        self.paced: bool = replay_source is None or replay_realtime
+        self.image_utils = ImageUtils(continuous_capture=continuous_capture,
+                                      on_motion=self.scheduler.notify_motion,
+                                      replay_source=replay_source, replay_realtime=replay_realtime,
+                                      record_frames_to=record_frames_to, camera_service=camera_service)
+
+    def _set_image_context(self, new_image: Image.Image, preview_hash: ImageHash) -> ImageMapping:
+        # Stored books are hashed from the full frame, and a preview has a different field of view,
+        # so the mapping carries the full frame's hash; the preview hash is only for change detection
+        with span("phash"):
+            image_hash: ImageHash = ImageUtils.hash_image(new_image)
+        # Keep the frame in memory; consumers extract features from it directly
+        image_mapping: ImageMapping = ImageMapping(image_hash=image_hash, image=new_image)
         self.current_image_mapping = image_mapping
-        self.last_key_image_hash = new_image_hash
+        self.last_key_image_hash = preview_hash
         print(f"New page detected. Image mapping created: {image_mapping.image_hash}")
         return image_mapping
 
     def _detect_context_switch(self) -> None:
         try:
-            new_image: Image.Image = self.image_utils.capture_image()
-            new_image_hash: ImageHash = ImageUtils.hash_image(new_image)
+            # Change detection only needs the cheap preview stream
+            new_image: Image.Image = self.image_utils.capture_preview_image()
+            with span("phash"):
+                new_image_hash: ImageHash = ImageUtils.hash_image(new_image)
 
             if len(self.hash_history) > 0:
                 hamming_distance: int = new_image_hash - self.hash_history[-1]
                 print(f"Hamming distance from last image: {hamming_distance}")
                 self.hamming_history.append(hamming_distance)
+                # Something moved between polls, so drop the idle backoff
+                if hamming_distance >= self.stable_threshold:
+                    self.scheduler.reset()
             else:
                 self.hamming_history.append(0)
 
             self.hash_history.append(new_image_hash)
 
             if self.state == ContextState.SEARCHING_STABLE:
-                self._handle_searching_stable()
+                with span("state_decision"):
+                    self._handle_searching_stable()
             elif self.state == ContextState.STABLE_FOUND:
-                self._handle_stable_found(new_image, new_image_hash)
+                # Covers the settled frame up to the hand-off to the consumer (the narrator queues a match job)
+                with span("stable_page"):
+                    self._handle_stable_found(new_image, new_image_hash)
             elif self.state == ContextState.WAITING_PAGE_TURN:
-                self._handle_waiting_page_turn(new_image, new_image_hash)
+                with span("state_decision"):
+                    self._handle_waiting_page_turn(new_image, new_image_hash)
 
+        except ReplayFinished:
+            print("Replay finished.")
         except Exception as e:
             print(f"Error in context detection: {e}")
             import traceback
@@ -80,9 +126,26 @@ class ImageContextController:
             print("Stable context found. Ready to set key image.")
 
     def _handle_stable_found(self, new_image: Image.Image, new_image_hash: ImageHash) -> None:
+        if self.quality_gate is not None and self.quality_rejections < self.max_quality_rejections:
+            with span("quality_gate"):
+                quality: FrameQualityScore = self.quality_gate.evaluate(new_image)
+            if not quality.passed:
+                # Likely motion blur or a hand in frame. Score this settled page once, then wait
+                # for it to move or for the retry delay rather than rejecting it on every poll.
+                self.quality_rejections += 1
+                print(f"Skipping match on low quality frame ({self.quality_rejections}/{self.max_quality_rejections}): {quality}")
+                self.last_key_image_hash = new_image_hash
+                self.quality_retry_countdown = self.quality_retry_polls
+                self.state = ContextState.WAITING_PAGE_TURN
+                return
+        elif self.quality_gate is not None:
+            print("Page keeps failing the quality check; matching it anyway")
         if (new_image_hash - self.hash_history[-1]) < self.stable_threshold:
-            image_mapping: ImageMapping = self._set_image_context(new_image, new_image_hash)
+            # Grab full resolution detail only now that matching needs it
+            full_image: Image.Image = self.image_utils.capture_image()
+            image_mapping: ImageMapping = self._set_image_context(full_image, new_image_hash)
             self.state = ContextState.WAITING_PAGE_TURN
+            self.quality_rejections = 0
             self._set_led(LEDColor.GREEN)
             if self.on_stable_context:
                 self.on_stable_context(image_mapping)
@@ -98,6 +161,14 @@ class ImageContextController:
                 self.state = ContextState.SEARCHING_STABLE
                 self._set_led(LEDColor.YELLOW)
                 self.stable_count = 0
+                self.quality_rejections = 0
+                self.quality_retry_countdown = None
+            elif self.quality_retry_countdown is not None:
+                # Same page after a quality rejection: score it again once it moves or after a while
+                self.quality_retry_countdown -= 1
+                if hamming_distance >= self.stable_threshold or self.quality_retry_countdown <= 0:
+                    self.quality_retry_countdown = None
+                    self.state = ContextState.SEARCHING_STABLE
 
     def _is_stable_context(self) -> bool:
         if len(self.hamming_history) < self.hamming_history.maxlen:
@@ -108,32 +179,57 @@ class ImageContextController:
         
         return all(rate < self.stable_threshold for rate in rates_of_change)
 
+    def _is_polling_active(self) -> bool:
+        # A page waiting to be scored again is polled quickly rather than at the backed-off idle cadence
+        return self.state != ContextState.WAITING_PAGE_TURN or self.quality_retry_countdown is not None
+
     def _set_led(self, color: LEDColor) -> None:
         if self.led_indicator:
             self.led_indicator(color)
 
+    def prepare_camera(self) -> None:
+        """Start opening the camera in the background so run() does not wait for its warm-up."""
+        if self._camera_thread is None and not self.image_utils.is_camera_running():
+            self._camera_thread = threading.Thread(target=self.image_utils.init_camera, daemon=True)
+            self._camera_thread.start()
+
     def run(self) -> None:
         """Start the context controller and initialize camera."""
-        self.is_running = True
+        if self._camera_thread is not None:
+            self._camera_thread.join()
+            self._camera_thread = None
+        # Retries here, raising the error, if opening the camera in the background failed
         self.image_utils.init_camera()
+        # Start every session from a clean slate; the controller may be run again after stop()
+        self.state = ContextState.SEARCHING_STABLE
+        self.stable_count = 0
+        self.quality_rejections = 0
+        self.quality_retry_countdown = None
+        self.hamming_history.clear()
+        self.hash_history.clear()
+        self.last_key_image_hash = None
+        self.is_running = True
         self._thread = threading.Thread(target=self._run)
         self._thread.start()
 
     def _run(self) -> None:
-        self.db = ImageMappingDB()
         while self.is_running:
             self._detect_context_switch()
-            time.sleep(self.refresh_rate)
-        self.db.close()
+            if not self.image_utils.is_camera_running():
+                print("Camera stopped delivering frames. Ending context detection.")
+                break
+            if self.paced:
+                self.scheduler.wait(active=self._is_polling_active())
 
     def stop(self) -> None:
         """Stop the context controller and release camera resources."""
         self.is_running = False
+        self.scheduler.wake()
         if self._thread is not None:
             self._thread.join()
-        if self.image_utils:
-            self.image_utils.stop_camera()
-            self.image_utils = None  # Clear the reference
-        if self.db:
-            self.db.close()
-            self.db = None
+            self._thread = None
+        if self._camera_thread is not None:
+            self._camera_thread.join()
+            self._camera_thread = None
+        # Releases a shared camera, which stays warm for the next session
+        self.image_utils.stop_camera()
@@ -1,90 +1,296 @@
 import sqlite3
 import os
-from typing import Optional, List, Union
-from imagehash import ImageHash, hex_to_hash
+from typing import Optional, List, Union, Tuple
+from imagehash import ImageHash
 from threading import local
 import numpy as np
+from PIL import Image
+from src.hash_index import HashIndex, hash_to_int, hash_to_db
+from src.db_migrations import configure_connection, migrate
+from src.descriptor_store import BookDescriptors, DescriptorStore
+
+# Mapping metadata columns; descriptors live in image_features and are joined only when needed
+MAPPING_COLUMNS: str = 'm.id, m.book_id, m.image_path, m.audio_path, m.image_hash, m.page_number'
 
 class ThreadLocalDB(local):
     def __init__(self, db_path: str) -> None:
         self.conn: sqlite3.Connection = sqlite3.connect(db_path)
+        configure_connection(self.conn)
 
 class ImageMapping:
+    # Whole books of these are held while narrating; slots keep each one small
+    __slots__ = ('id', 'book_id', 'image_path', 'audio_path', 'image_hash', 'orb_features', 'image', 'page_number')
+
     def __init__(self, 
                  id: Optional[int] = None, 
                  book_id: Optional[int] = None, 
                  image_path: Optional[str] = None, 
                  audio_path: Optional[str] = None, 
-                 image_hash: Optional[Union[str, ImageHash]] = None, 
-                 orb_features: Optional[np.ndarray] = None) -> None:
+                 image_hash: Optional[Union[str, int, ImageHash]] = None, 
+                 orb_features: Optional[np.ndarray] = None,
+                 image: Optional[Image.Image] = None,
+                 page_number: Optional[int] = None) -> None:
         self.id: Optional[int] = id
         self.book_id: Optional[int] = book_id
         self.image_path: Optional[str] = image_path
         self.audio_path: Optional[str] = audio_path
-        self.image_hash: Optional[Union[str, ImageHash]] = image_hash
+        self.image_hash: Optional[Union[str, int, ImageHash]] = image_hash
         self.orb_features: Optional[np.ndarray] = orb_features
+        # In-memory frame for mappings created from the camera; never persisted
+        self.image: Optional[Image.Image] = image
+        self.page_number: Optional[int] = page_number
 
 class ImageMappingDB:
     def __init__(self, db_path: str = 'data/image_mappings.db') -> None:
-        if not os.path.exists('data'):
-            os.makedirs('data')
+        db_dir: str = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
         self.db_path: str = db_path
         self.local: ThreadLocalDB = ThreadLocalDB(db_path)
+        # Descriptors of each book as one file next to the database, rebuilt from image_features when missing
+        self.descriptor_store: DescriptorStore = DescriptorStore(f'{os.path.splitext(db_path)[0]}_descriptors')
         self.create_table()
+        self.hash_index: HashIndex = self._build_hash_index()
 
     @property
     def conn(self) -> sqlite3.Connection:
         return self.local.conn
 
     def create_table(self) -> None:
+        # Creates the schema on a new database and upgrades older ones in place
+        migrate(self.conn)
+
+    def _build_hash_index(self) -> HashIndex:
+        # Only the id and hash columns are read so the ORB BLOBs stay on disk
         cursor: sqlite3.Cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS image_mappings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                book_id INTEGER,
-                image_path TEXT,
-                audio_path TEXT,
-                image_hash TEXT,
-                orb_features BLOB
-            )
-        ''')
+        cursor.execute('SELECT id, image_hash FROM image_mappings WHERE image_hash IS NOT NULL')
+        return HashIndex(cursor.fetchall())
+
+    @staticmethod
+    def _row_to_mapping(row: tuple) -> ImageMapping:
+        mapping_id, book_id, image_path, audio_path, image_hash, page_number = row[:6]
+        return ImageMapping(id=mapping_id, book_id=book_id, image_path=image_path, audio_path=audio_path,
+                            image_hash=hash_to_int(image_hash) if image_hash is not None else None,
+                            orb_features=row[6] if len(row) > 6 else None,
+                            page_number=page_number)
+
+    def create_book(self, title: Optional[str] = None) -> int:
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        cursor.execute('INSERT INTO books (title) VALUES (?)', (title,))
         self.conn.commit()
+        return cursor.lastrowid
 
     def add_mapping(self, book_id: int, image_path: str, audio_path: str, 
-                    image_hash: ImageHash, orb_features: np.ndarray) -> None:
+                    image_hash: ImageHash, orb_features: np.ndarray,
+                    page_number: Optional[int] = None) -> int:
         cursor: sqlite3.Cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO image_mappings (book_id, image_path, audio_path, image_hash, orb_features)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (book_id, image_path, audio_path, str(image_hash), sqlite3.Binary(orb_features.tobytes())))
-        self.conn.commit()
+        try:
+            cursor.execute('INSERT OR IGNORE INTO books (id) VALUES (?)', (book_id,))
+            if page_number is None:
+                cursor.execute('SELECT COALESCE(MAX(page_number), 0) + 1 FROM image_mappings WHERE book_id = ?', (book_id,))
+                page_number = cursor.fetchone()[0]
+            cursor.execute('''
+                INSERT INTO image_mappings (book_id, page_number, image_path, audio_path, image_hash)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (book_id, page_number, image_path, audio_path, hash_to_db(image_hash)))
+            mapping_id: int = cursor.lastrowid
+            cursor.execute('INSERT INTO image_features (mapping_id, orb_features) VALUES (?, ?)',
+                           (mapping_id, sqlite3.Binary(orb_features.tobytes())))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.hash_index.add(mapping_id, image_hash)
+        return mapping_id
 
-    def get_book_mappings(self, book_id: int) -> List[ImageMapping]:
+    def add_mappings(self, mappings: List[ImageMapping], book_id: Optional[int] = None,
+                     title: Optional[str] = None) -> Tuple[int, List[int]]:
+        """
+        Insert a whole book of mappings in a single transaction.
+        Either every page is stored or none is.
+        
+        Args:
+            mappings (List[ImageMapping]): Pages in reading order with hashes and ORB features set
+            book_id (Optional[int]): Existing book to append to; a new book is created if None
+            title (Optional[str]): Title for a newly created book
+        
+        Returns:
+            Tuple[int, List[int]]: The book id and the assigned mapping ids in input order
+        """
+        if not mappings:
+            raise ValueError("No mappings to add")
         cursor: sqlite3.Cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM image_mappings WHERE book_id = ?', (book_id,))
-        return [ImageMapping(*row) for row in cursor.fetchall()]
+        try:
+            # Take the write lock up front so page numbers cannot be claimed by another writer
+            cursor.execute('BEGIN IMMEDIATE')
+            if book_id is None:
+                cursor.execute('INSERT INTO books (title) VALUES (?)', (title,))
+                book_id = cursor.lastrowid
+            else:
+                cursor.execute('INSERT OR IGNORE INTO books (id, title) VALUES (?, ?)', (book_id, title))
+
+            cursor.execute('SELECT COALESCE(MAX(page_number), 0) FROM image_mappings WHERE book_id = ?', (book_id,))
+            first_page: int = cursor.fetchone()[0] + 1
+            # Ids come from AUTOINCREMENT within this transaction
+            mapping_ids: List[int] = []
+            for i, mapping in enumerate(mappings):
+                cursor.execute('''
+                    INSERT INTO image_mappings (book_id, page_number, image_path, audio_path, image_hash)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (book_id, first_page + i, mapping.image_path, mapping.audio_path, hash_to_db(mapping.image_hash)))
+                mapping_ids.append(cursor.lastrowid)
+            cursor.executemany('INSERT INTO image_features (mapping_id, orb_features) VALUES (?, ?)',
+                               [(mapping_id, sqlite3.Binary(np.asarray(mapping.orb_features).tobytes()))
+                                for mapping_id, mapping in zip(mapping_ids, mappings)
+                                if mapping.orb_features is not None])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        for i, (mapping_id, mapping) in enumerate(zip(mapping_ids, mappings)):
+            mapping.id = mapping_id
+            mapping.book_id = book_id
+            mapping.page_number = first_page + i
+            self.hash_index.add(mapping_id, mapping.image_hash)
+
+        try:
+            if first_page == 1:
+                self.descriptor_store.write_book(book_id, mapping_ids, (mapping.orb_features for mapping in mappings))
+            else:
+                # Appended pages; rebuilt with the rest of the book on its next load
+                self.descriptor_store.delete_book(book_id)
+        except OSError as e:
+            print(f"Warning: Could not write descriptor file for book {book_id}: {e}")
+        return book_id, mapping_ids
+
+    def get_book_mappings(self, book_id: int, include_features: bool = True) -> List[ImageMapping]:
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        if include_features:
+            cursor.execute(f'''
+                SELECT {MAPPING_COLUMNS}, f.orb_features FROM image_mappings m
+                LEFT JOIN image_features f ON f.mapping_id = m.id
+                WHERE m.book_id = ? ORDER BY m.page_number, m.id
+            ''', (book_id,))
+        else:
+            cursor.execute(f'SELECT {MAPPING_COLUMNS} FROM image_mappings m WHERE m.book_id = ? ORDER BY m.page_number, m.id',
+                           (book_id,))
+        return [self._row_to_mapping(row) for row in cursor.fetchall()]
     
+    def get_book_descriptors(self, book_id: int) -> Tuple[List[ImageMapping], BookDescriptors]:
+        """
+        Load a book for matching: page metadata from the database and descriptors
+        memory-mapped from its descriptor file, which is rebuilt if missing or stale.
+
+        Args:
+            book_id (int): Book id
+
+        Returns:
+            Tuple[List[ImageMapping], BookDescriptors]: Pages in reading order without
+                orb_features, and their descriptors in the same order
+        """
+        mappings: List[ImageMapping] = self.get_book_mappings(book_id, include_features=False)
+        mapping_ids: List[int] = [mapping.id for mapping in mappings]
+        with self.descriptor_store.lock:
+            book: Optional[BookDescriptors] = self.descriptor_store.open_book(book_id, mapping_ids)
+            if book is None:
+                cursor: sqlite3.Cursor = self.conn.cursor()
+                cursor.execute('''
+                    SELECT f.orb_features FROM image_mappings m
+                    LEFT JOIN image_features f ON f.mapping_id = m.id
+                    WHERE m.book_id = ? ORDER BY m.page_number, m.id
+                ''', (book_id,))
+                self.descriptor_store.write_book(book_id, mapping_ids,
+                                                 (None if row[0] is None else np.frombuffer(row[0], dtype=np.uint8)
+                                                  for row in cursor))
+                book = self.descriptor_store.open_book(book_id, mapping_ids)
+        return mappings, book
+
     def get_mappings_by_hash(self, image_hash: ImageHash, threshold: int = 25) -> Optional[List[ImageMapping]]:
+        candidates: List[tuple] = self.hash_index.search(image_hash, threshold)
+        if not candidates:
+            return []
+
+        # Fetch full rows (including ORB features) only for the candidates, closest first
+        candidate_ids: List[int] = [mapping_id for mapping_id, _ in candidates]
         cursor: sqlite3.Cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM image_mappings')
-        mappings: List[tuple] = cursor.fetchall()
-        
-        matches: List[ImageMapping] = []
-        
-        for mapping in mappings:
-            stored_hash: ImageHash = hex_to_hash(mapping[4])
-            distance: int = image_hash - stored_hash
-            
-            if distance <= threshold:
-                matches.append(ImageMapping(*mapping))
-        
-        return matches
+        rows_by_id: dict = {}
+        # Stay below SQLite's bound parameter limit on very loose thresholds
+        for start in range(0, len(candidate_ids), 500):
+            chunk: List[int] = candidate_ids[start:start + 500]
+            placeholders: str = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT {MAPPING_COLUMNS}, f.orb_features FROM image_mappings m
+                LEFT JOIN image_features f ON f.mapping_id = m.id
+                WHERE m.id IN ({placeholders})
+            ''', chunk)
+            rows_by_id.update((row[0], row) for row in cursor.fetchall())
+        return [self._row_to_mapping(rows_by_id[mapping_id]) for mapping_id in candidate_ids if mapping_id in rows_by_id]
+
+    def get_visual_vocabulary(self) -> Optional[np.ndarray]:
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        cursor.execute('SELECT words FROM visual_vocabulary WHERE id = 1')
+        row: Optional[tuple] = cursor.fetchone()
+        return np.frombuffer(row[0], dtype=np.uint8).reshape(-1, 32) if row is not None else None
+
+    def save_visual_vocabulary(self, words: np.ndarray) -> None:
+        # Word counts refer to positions in the old vocabulary, so they are dropped with it
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('DELETE FROM page_word_counts')
+            cursor.execute('INSERT OR REPLACE INTO visual_vocabulary (id, words) VALUES (1, ?)',
+                           (sqlite3.Binary(np.ascontiguousarray(words, dtype=np.uint8).tobytes()),))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_page_word_counts(self, book_id: Optional[int] = None) -> List[Tuple[int, int, np.ndarray]]:
+        """(mapping id, book id, visual word counts) for every indexed page, or just one book's."""
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT m.id, m.book_id, w.word_counts FROM page_word_counts w
+            JOIN image_mappings m ON m.id = w.mapping_id
+            WHERE ? IS NULL OR m.book_id = ?
+            ORDER BY m.id
+        ''', (book_id, book_id))
+        return [(mapping_id, book_id, np.frombuffer(counts, dtype=np.uint16))
+                for mapping_id, book_id, counts in cursor.fetchall()]
+
+    def save_page_word_counts(self, rows: List[Tuple[int, np.ndarray]]) -> None:
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        try:
+            cursor.executemany('INSERT OR REPLACE INTO page_word_counts (mapping_id, word_counts) VALUES (?, ?)',
+                               [(mapping_id, sqlite3.Binary(np.minimum(counts, 65535).astype(np.uint16).tobytes()))
+                                for mapping_id, counts in rows])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_unindexed_mappings(self) -> List[ImageMapping]:
+        """Pages with ORB features but no visual word counts yet."""
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT {MAPPING_COLUMNS}, f.orb_features FROM image_mappings m
+            JOIN image_features f ON f.mapping_id = m.id
+            LEFT JOIN page_word_counts w ON w.mapping_id = m.id
+            WHERE w.mapping_id IS NULL AND m.book_id IS NOT NULL
+            ORDER BY m.id
+        ''')
+        return [self._row_to_mapping(row) for row in cursor.fetchall()]
+
+    def get_book_ids(self) -> List[int]:
+        cursor: sqlite3.Cursor = self.conn.cursor()
+        cursor.execute('SELECT id FROM books ORDER BY id')
+        return [row[0] for row in cursor.fetchall()]
 
-    def get_next_book_id(self) -> int:
+    def get_book_title(self, book_id: int) -> Optional[str]:
         cursor: sqlite3.Cursor = self.conn.cursor()
-        cursor.execute('SELECT MAX(book_id) FROM image_mappings')
-        result: Optional[tuple] = cursor.fetchone()
-        return result[0] + 1 if result[0] is not None else 1
+        cursor.execute('SELECT title FROM books WHERE id = ?', (book_id,))
+        row: Optional[tuple] = cursor.fetchone()
+        return row[0] if row is not None else None
 
     def close(self) -> None:
         self.conn.close()
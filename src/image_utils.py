@@ -5,30 +5,58 @@ import uuid
 import os
 from imagehash import phash, ImageHash
 import numpy as np
-from typing import Union, Optional
-from src.camera_manager import CameraManager
+from typing import Union, Optional, Callable, TYPE_CHECKING
+from src.camera_service import CameraService
+
+if TYPE_CHECKING:
+    from src.camera_manager import CameraManager
 
 class ImageUtils:
     """
     Handles image capture, processing, and feature extraction operations.
     Manages camera lifecycle and provides image manipulation utilities.
     """
-    def __init__(self, camera_id: int = 0):
-        self.camera_manager: Optional[CameraManager] = None
+    def __init__(self, camera_id: int = 0, continuous_capture: bool = False,
+                 on_motion: Optional[Callable[[float], None]] = None,
+                 replay_source: Optional[str] = None, replay_realtime: bool = True,
+                 record_frames_to: Optional[str] = None, camera_service: Optional[CameraService] = None):
+        self.camera_manager: Optional["CameraManager"] = None
+        # Long-lived camera to borrow instead of opening one per session
+        self.camera_service: Optional[CameraService] = camera_service
         self.camera_id = camera_id
+        self.continuous_capture = continuous_capture
+        self.on_motion = on_motion
+        self.replay_source = replay_source
+        self.replay_realtime = replay_realtime
+        self.record_frames_to = record_frames_to
 
     def init_camera(self) -> None:
         """Initialize the camera manager."""
-        if self.camera_manager is None:
-            self.camera_manager = CameraManager(self.camera_id)
+        if self.camera_manager is None and self.camera_service is not None:
+            self.camera_manager = self.camera_service.acquire(on_motion=self.on_motion)
+        elif self.camera_manager is None:
+            # picamera2 is only imported once a camera is actually opened
+            from src.camera_manager import CameraManager
+            self.camera_manager = CameraManager(self.camera_id, continuous=self.continuous_capture,
+                                                on_motion=self.on_motion,
+                                                replay_source=self.replay_source,
+                                                replay_realtime=self.replay_realtime,
+                                                record_to=self.record_frames_to)
             self.camera_manager.start()
 
     def stop_camera(self) -> None:
         """Stop the camera manager."""
-        if self.camera_manager is not None:
+        if self.camera_manager is not None and self.camera_service is not None:
+            self.camera_service.release()
+            self.camera_manager = None
+        elif self.camera_manager is not None:
             self.camera_manager.stop()
             self.camera_manager = None
 
+    def is_camera_running(self) -> bool:
+        """Whether the camera is still delivering frames (a finished replay is not)."""
+        return self.camera_manager is not None and self.camera_manager.is_running
+
     def capture_image(self) -> Image.Image:
         """
         Capture an image from the camera.
@@ -43,6 +71,20 @@ class ImageUtils:
             raise RuntimeError("Camera not initialized. Call init_camera() first")
         return self.camera_manager.get_frame()
 
+    def capture_preview_image(self) -> Image.Image:
+        """
+        Capture a low resolution grayscale preview from the camera.
+        
+        Returns:
+            Image.Image: The captured preview image
+            
+        Raises:
+            RuntimeError: If camera is not initialized or capture fails
+        """
+        if self.camera_manager is None:
+            raise RuntimeError("Camera not initialized. Call init_camera() first")
+        return self.camera_manager.get_preview_frame()
+
     @staticmethod
     def save_image(image: Image.Image, temp: bool = False) -> str:
         if temp:
@@ -71,12 +113,27 @@ class ImageUtils:
             raise ValueError("Input must be either a file path or a PIL Image object")
 
     @staticmethod
-    def extract_orb_features(image_path: str) -> np.ndarray:
-        img: np.ndarray = ImageUtils._read_grayscale_image(image_path)
+    def extract_orb_features(image: Union[str, Image.Image, np.ndarray]) -> np.ndarray:
+        img: np.ndarray = ImageUtils.to_grayscale_array(image)
         orb = cv2.ORB_create()
         keypoints, descriptors = orb.detectAndCompute(img, None)
         return descriptors
 
+    @staticmethod
+    def to_grayscale_array(image: Union[str, Image.Image, np.ndarray]) -> np.ndarray:
+        """
+        Get a grayscale uint8 array for a file path, PIL Image or RGB array
+        without touching the disk for in-memory inputs.
+        """
+        if isinstance(image, str):
+            return ImageUtils._read_grayscale_image(image)
+        elif isinstance(image, Image.Image):
+            return np.asarray(image if image.mode == "L" else image.convert("L"))
+        elif isinstance(image, np.ndarray):
+            return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        else:
+            raise ValueError("Input must be a file path, PIL Image or NumPy array")
+
     @staticmethod
     def _read_grayscale_image(image_path: str) -> np.ndarray:
         return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
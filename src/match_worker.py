@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+from src.image_mapping import ImageMapping
+from src.matcher import ImageMatcher
+from src.tracing import span, tracer
+
+
+class _MatchJob:
+    def __init__(self, image_mapping: ImageMapping):
+        self.image_mapping: ImageMapping = image_mapping
+        self.future: "Future[Optional[ImageMapping]]" = Future()
+        self.submitted_at: float = time.perf_counter()
+
+
+class MatchWorker:
+    """
+    Runs page matching on a dedicated thread so the detection loop never waits for it.
+
+    The queue holds a single job: submitting a new stable frame cancels a job that has
+    not started yet, and the result of a job that finishes after a newer frame arrived
+    is still set on its future but not passed to on_result, so stale pages are never
+    narrated. Futures are concurrent.futures.Future objects; wrap them with
+    asyncio.wrap_future to await them from an event loop.
+
+    Args:
+        matcher (ImageMatcher): Matcher used only from the worker thread
+        on_result (Callable[[ImageMapping, Optional[ImageMapping]], None], optional): Called on
+            the worker thread with the query page and its match (None if nothing matched)
+    """
+    def __init__(self, matcher: ImageMatcher,
+                 on_result: Optional[Callable[[ImageMapping, Optional[ImageMapping]], None]] = None):
+        self.matcher: ImageMatcher = matcher
+        self.on_result: Optional[Callable[[ImageMapping, Optional[ImageMapping]], None]] = on_result
+        self.condition = threading.Condition()
+        self._pending: Optional[_MatchJob] = None
+        self._thread: Optional[threading.Thread] = None
+        self.is_running: bool = False
+        self.jobs_submitted: int = 0
+        self.jobs_superseded: int = 0
+        self.results_discarded: int = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, image_mapping: ImageMapping) -> "Future[Optional[ImageMapping]]":
+        """
+        Queue a stable frame for matching, replacing any job that has not started.
+
+        Args:
+            image_mapping (ImageMapping): Frame with image and image_hash set
+
+        Returns:
+            Future[Optional[ImageMapping]]: Resolves to the matched page, or is cancelled if superseded
+        """
+        job: _MatchJob = _MatchJob(image_mapping)
+        with self.condition:
+            if not self.is_running:
+                raise RuntimeError("Match worker is not running")
+            if self._pending is not None and self._pending.future.cancel():
+                self.jobs_superseded += 1
+            self._pending = job
+            self.jobs_submitted += 1
+            self.condition.notify()
+        return job.future
+
+    def get_stats(self) -> dict:
+        with self.condition:
+            return {
+                "jobs_submitted": self.jobs_submitted,
+                "jobs_superseded": self.jobs_superseded,
+                "results_discarded": self.results_discarded,
+            }
+
+    def _run(self) -> None:
+        try:
+            self._process_jobs()
+        finally:
+            # The matcher's database connection is thread-local, so only this thread can close it
+            self.matcher.db.close()
+
+    def _process_jobs(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self._pending is not None or not self.is_running)
+                if not self.is_running:
+                    break
+                job: _MatchJob = self._pending
+                self._pending = None
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            tracer.record("match_queue_wait", (time.perf_counter() - job.submitted_at) * 1000, job.submitted_at)
+
+            try:
+                with span("match_job"):
+                    match: Optional[ImageMapping] = self.matcher.match_image(job.image_mapping.image,
+                                                                             job.image_mapping.image_hash)
+            except Exception as e:
+                job.future.set_exception(e)
+                print(f"Error matching page: {e}")
+                continue
+            job.future.set_result(match)
+
+            with self.condition:
+                # A newer frame arrived while matching; its result is the one to act on
+                stale: bool = self._pending is not None
+                if stale:
+                    self.results_discarded += 1
+            if not stale and self.on_result is not None:
+                try:
+                    self.on_result(job.image_mapping, match)
+                except Exception as e:
+                    print(f"Error handling match result: {e}")
+
+    def stop(self) -> None:
+        """Stop the worker after the job in progress, cancelling any queued job."""
+        with self.condition:
+            self.is_running = False
+            if self._pending is not None:
+                self._pending.future.cancel()
+                self._pending = None
+            self.condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
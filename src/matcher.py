@@ -1,71 +1,172 @@
-import cv2
 import numpy as np
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Union, Dict
+from PIL import Image
 from src.image_mapping import ImageMappingDB, ImageMapping
 from src.image_utils import ImageUtils
-from imagehash import ImageHash, hex_to_hash
+from imagehash import ImageHash
+from src.hash_index import pack_hashes, hamming_distances
+from src.orb_index import OrbIndex
+from src.book_index import BookIndex
+from src.tracing import span
 
 class ImageMatcher:
-    def __init__(self, db: ImageMappingDB) -> None:
+    def __init__(self, db: ImageMappingDB, book_index: Optional[BookIndex] = None, candidate_books: int = 3,
+                 sequential_min_matches: int = 60) -> None:
         self.db: ImageMappingDB = db
+        # Identifies the likely books on a cold start so only their pages are loaded
+        self.book_index: BookIndex = book_index if book_index is not None else BookIndex(db)
+        self.candidate_books: int = candidate_books
         self.current_book_id: Optional[int] = None
         self.current_book_mappings: List[ImageMapping] = []
+        self.current_book_hashes: np.ndarray = np.empty(0, dtype=np.uint64)
+        self.current_book_orb_index: Optional[OrbIndex] = None
+        # Mapping id -> position in current_book_mappings, which is in page order
+        self.current_book_positions: Dict[int, int] = {}
+        # Position of the last matched page; the pages around it are tried first
+        self.current_position: Optional[int] = None
+        # A sequential guess is accepted without a book search only above this many good matches
+        self.sequential_min_matches: int = sequential_min_matches
+        self.sequential_hits: int = 0
+        self.sequential_misses: int = 0
 
-    def _match_hash(self, image_hash: ImageHash, threshold: int = 25) -> Optional[List[ImageMapping]]:
-        matches: List[ImageMapping] = []
+    def _match_hash(self, image_hash: ImageHash, threshold: int = 25, max_candidates: int = 10) -> Optional[List[ImageMapping]]:
         # Search cached mappings first
-        if self.current_book_mappings:
-            for mapping in self.current_book_mappings:
-                if hex_to_hash(mapping.image_hash) - image_hash <= threshold:
-                    matches.append(mapping)
+        matches: List[ImageMapping] = self._match_book_hash(image_hash, threshold, max_candidates)
         # If no matches are found, search the database and clear current book mappings
         if not matches:
-            matches = self.db.get_mappings_by_hash(image_hash)
-            self.current_book_mappings = []
-            self.current_book_id = None
+            matches = self.db.get_mappings_by_hash(image_hash, threshold)
+            self._clear_current_book_context()
         return matches
 
-    def _match_orb(self, image_mappings: List[ImageMapping], orb_features: np.ndarray, min_matches: int = 80, max_distance: int = 50) -> ImageMapping:
-        # List to store tuples of (mapping, number of good matches)
-        match_counts: List[Tuple[ImageMapping, int]] = []
+    def _match_book_hash(self, image_hash: ImageHash, threshold: int = 25, max_candidates: int = 10) -> List[ImageMapping]:
+        if not self.current_book_mappings:
+            return []
+        distances: np.ndarray = hamming_distances(self.current_book_hashes, image_hash)
+        within: np.ndarray = np.flatnonzero(distances <= threshold)
+        if len(within) > max_candidates:
+            # Keep only the closest pages so ORB matching stays bounded
+            within = within[np.argpartition(distances[within], max_candidates)[:max_candidates]]
+        within = within[np.argsort(distances[within], kind="stable")]
+        return [self.current_book_mappings[i] for i in within]
 
-        for mapping in image_mappings:
-            stored_features: np.ndarray = np.frombuffer(mapping.orb_features, dtype=np.uint8).reshape(-1, 32)
-            
-            bf: cv2.BFMatcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-            feature_matches: List[cv2.DMatch] = bf.match(orb_features, stored_features)
-            
-            good_matches: List[cv2.DMatch] = [m for m in feature_matches if m.distance < max_distance]
-            print(f"Good matches: {len(good_matches)}. Min matches: {min_matches}")
-            if len(good_matches) > min_matches:
-                match_counts.append((mapping, len(good_matches)))
-
-        # Sort the matches by the number of good matches in descending order
-        match_counts.sort(key=lambda x: x[1], reverse=True)
+    def _identify_book(self, image_hash: ImageHash, orb_features: np.ndarray) -> Optional[ImageMapping]:
+        """Try the pages of the most similar books, leaving the matching book loaded as the context."""
+        for book_id in self.book_index.query(orb_features, self.candidate_books):
+            self._set_current_book_context(book_id)
+            candidates: List[ImageMapping] = self._match_book_hash(image_hash)
+            if candidates:
+                match: Optional[ImageMapping] = self._match_orb(candidates, orb_features)
+                if match:
+                    return match
+        self._clear_current_book_context()
+        return None
 
-        # Return the mapping with the most good matches over the minimum threshold
-        if match_counts:
-            return match_counts[0][0]
+    def _match_sequential(self, image_hash: ImageHash, orb_features: np.ndarray, threshold: int = 25) -> Optional[ImageMapping]:
+        """Check the expected pages one at a time and stop at the first confident match."""
+        for mapping in self.get_expected_mappings():
+            position: int = self.current_book_positions[mapping.id]
+            # The hash rules out most wrong guesses before any ORB work
+            if hamming_distances(self.current_book_hashes[position:position + 1], image_hash)[0] > threshold:
+                continue
+            result: Optional[Tuple[ImageMapping, int]] = self.current_book_orb_index.best_match(
+                orb_features, {mapping.id}, min_matches=self.sequential_min_matches,
+                confident_matches=self.sequential_min_matches)
+            if result:
+                self.sequential_hits += 1
+                return result[0]
+        self.sequential_misses += 1
         return None
 
+    def _match_orb(self, image_mappings: List[ImageMapping], orb_features: np.ndarray, min_matches: int = 40, max_distance: int = 50) -> ImageMapping:
+        candidate_ids = {mapping.id for mapping in image_mappings}
+        # Reuse the trained index for the current book, otherwise index just the candidates
+        if self.current_book_orb_index is not None and all(mapping.book_id == self.current_book_id for mapping in image_mappings):
+            orb_index: OrbIndex = self.current_book_orb_index
+        else:
+            orb_index = OrbIndex(image_mappings, max_distance=max_distance)
+
+        result: Optional[Tuple[ImageMapping, int]] = orb_index.best_match(orb_features, candidate_ids, min_matches=min_matches)
+        if result:
+            return result[0]
+        return None
 
     def _set_current_book_context(self, book_id: int) -> None:
         self.current_book_id = book_id
-        self.current_book_mappings = self.db.get_book_mappings(self.current_book_id)
+        # Descriptors stay in the book's memory-mapped file; only page metadata is read from the database
+        self.current_book_mappings, book_descriptors = self.db.get_book_descriptors(self.current_book_id)
+        self.current_book_hashes = pack_hashes(mapping.image_hash for mapping in self.current_book_mappings)
+        self.current_book_orb_index = OrbIndex.from_arrays(self.current_book_mappings, book_descriptors.descriptors,
+                                                           book_descriptors.row_offsets)
+        self.current_book_positions = {mapping.id: i for i, mapping in enumerate(self.current_book_mappings)}
+        self.current_position = None
         print(f"New book found: {self.current_book_id}")
 
-    def match_image(self, image_path: str) -> Optional[ImageMapping]:
+    def _clear_current_book_context(self) -> None:
+        self.current_book_id = None
+        self.current_book_mappings = []
+        self.current_book_hashes = np.empty(0, dtype=np.uint64)
+        self.current_book_orb_index = None
+        self.current_book_positions = {}
+        self.current_position = None
+
+    def get_next_mapping(self, mapping: ImageMapping) -> Optional[ImageMapping]:
+        """Page that follows the given one in recording order within the current book."""
+        position: Optional[int] = self.current_book_positions.get(mapping.id)
+        if position is None or position + 1 >= len(self.current_book_mappings):
+            return None
+        return self.current_book_mappings[position + 1]
+
+    def get_expected_mappings(self) -> List[ImageMapping]:
+        """Pages most likely to be shown next, in the order they are tried: next, same, previous, the one after next."""
+        if self.current_position is None:
+            return []
+        positions: List[int] = [self.current_position + 1, self.current_position,
+                                self.current_position - 1, self.current_position + 2]
+        return [self.current_book_mappings[p] for p in positions if 0 <= p < len(self.current_book_mappings)]
+
+    def match_image(self, image: Union[str, Image.Image], image_hash: Optional[ImageHash] = None) -> Optional[ImageMapping]:
         # Find the book id using hash to determine most likely book.
-        image_hash: ImageHash = ImageUtils.hash_image(image_path)
+        # Reuse the hash from change detection when the caller already has it.
+        if image_hash is None:
+            with span("phash"):
+                image_hash = ImageUtils.hash_image(image)
         best_match: Optional[ImageMapping] = None
+        orb_features: Optional[np.ndarray] = None
+
+        if not self.current_book_mappings:
+            with span("orb_extract"):
+                orb_features = ImageUtils.extract_orb_features(image)
+            with span("book_identify"):
+                best_match = self._identify_book(image_hash, orb_features)
+            if best_match:
+                self.current_position = self.current_book_positions.get(best_match.id)
+                return best_match
+            # Not in the top books (or none indexed yet); fall back to the library wide hash search
+        elif self.current_position is not None:
+            with span("orb_extract"):
+                orb_features = ImageUtils.extract_orb_features(image)
+            with span("sequential_match"):
+                best_match = self._match_sequential(image_hash, orb_features)
+            if best_match:
+                self.current_position = self.current_book_positions[best_match.id]
+                return best_match
+            # The reader jumped somewhere else; search the whole book
 
-        matches: List[ImageMapping] = self._match_hash(image_hash)
+        with span("hash_lookup"):
+            matches: List[ImageMapping] = self._match_hash(image_hash)
         if len(matches) > 0:
             # Try matching orb features to make sure it is a match
-            best_match = self._match_orb(matches, ImageUtils.extract_orb_features(image_path))
+            if orb_features is None:
+                with span("orb_extract"):
+                    orb_features = ImageUtils.extract_orb_features(image)
+            with span("orb_match"):
+                best_match = self._match_orb(matches, orb_features)
             if not best_match:
                 print("None of the hash matches met the minimum orb match threshold.")
         # If a match is found and the current book mappings are not set, set the current book mappings
         if best_match and not self.current_book_mappings:
-            self._set_current_book_context(best_match.book_id)
+            with span("book_context_load"):
+                self._set_current_book_context(best_match.book_id)
+        if best_match:
+            self.current_position = self.current_book_positions.get(best_match.id)
         return best_match
\ No newline at end of file
@@ -0,0 +1,246 @@
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+# Largest frame handed from detection to matching: full resolution RGB
+DEFAULT_FRAME_BYTES: int = 1920 * 1080 * 3
+FRAME_SLOTS: int = 3
+
+
+def _put_latest(jobs: "multiprocessing.Queue", item: Any) -> None:
+    """Put into a size one queue, dropping the queued item if a newer one arrives first."""
+    while True:
+        try:
+            jobs.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                jobs.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def _detection_process(frames_name: str, frame_bytes: int, match_jobs: "multiprocessing.Queue",
+                       matcher_ready: "multiprocessing.synchronize.Event",
+                       stop_event: "multiprocessing.synchronize.Event", context_options: Dict[str, Any]) -> None:
+    """Camera capture and page detection. Stable frames go to shared memory, their slot to the match queue."""
+    from src.image_context_controller import ImageContextController
+    from src.frame_quality import FrameQualityGate
+    from src.shared_frames import SharedFrameBuffer
+
+    frames = SharedFrameBuffer.attach(frames_name, frame_bytes, FRAME_SLOTS)
+
+    def on_stable_context(image_mapping) -> None:
+        slot, sequence = frames.write(np.asarray(image_mapping.image.convert("RGB")))
+        _put_latest(match_jobs, (slot, sequence, str(image_mapping.image_hash), time.monotonic()))
+
+    controller = ImageContextController(on_stable_context=on_stable_context, quality_gate=FrameQualityGate(),
+                                        **context_options)
+    # Pages shown while the matcher is still loading would only queue up
+    while not matcher_ready.wait(0.2):
+        if stop_event.is_set():
+            frames.close()
+            return
+    controller.run()
+    try:
+        stop_event.wait()
+    finally:
+        controller.stop()
+        frames.close()
+
+
+def _match_process(db_path: str, frames_name: str, frame_bytes: int, match_jobs: "multiprocessing.Queue",
+                   audio_commands: "multiprocessing.Queue", matcher_ready: "multiprocessing.synchronize.Event",
+                   stop_event: "multiprocessing.synchronize.Event") -> None:
+    """Page matching. Reads frames from shared memory and sends play commands to the audio process."""
+    from imagehash import hex_to_hash
+    from PIL import Image
+    from src.image_mapping import ImageMappingDB
+    from src.matcher import ImageMatcher
+    from src.shared_frames import SharedFrameBuffer
+
+    frames = SharedFrameBuffer.attach(frames_name, frame_bytes, FRAME_SLOTS)
+    db = ImageMappingDB(db_path)
+    matcher = ImageMatcher(db)
+    matcher.book_index.load()
+    matcher_ready.set()
+    current_audio: Optional[str] = None
+    try:
+        while not stop_event.is_set():
+            try:
+                slot, sequence, image_hash, submitted_at = match_jobs.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            frame: Optional[np.ndarray] = frames.read(slot, sequence)
+            if frame is None:
+                # Overwritten by a newer stable frame, which is already queued
+                continue
+            match = matcher.match_image(Image.fromarray(frame), hex_to_hash(image_hash))
+            if match is None:
+                print("No matching audio found for the current image.")
+                continue
+            preload: List[str] = [mapping.audio_path for mapping in matcher.get_expected_mappings()
+                                  if mapping.audio_path != match.audio_path]
+            play: bool = match.audio_path != current_audio
+            current_audio = match.audio_path
+            audio_commands.put((match.audio_path if play else None, preload, submitted_at))
+    finally:
+        db.close()
+        frames.close()
+
+
+def _audio_process(audio_commands: "multiprocessing.Queue", stop_event: "multiprocessing.synchronize.Event",
+                   events: Optional["multiprocessing.Queue"]) -> None:
+    """Playback. Owns the pygame mixer and its clip cache."""
+    from src.audio_utils import AudioPlayer
+
+    player = AudioPlayer()
+    player.start()
+    try:
+        while not stop_event.is_set():
+            try:
+                audio_path, preload, submitted_at = audio_commands.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if audio_path is not None:
+                try:
+                    player.play(audio_path)
+                except Exception as e:
+                    print(f"Error playing audio: {e}")
+                if events is not None:
+                    events.put(("played", audio_path, submitted_at, time.monotonic()))
+            player.preload(preload)
+    finally:
+        player.close()
+
+
+class ProcessSupervisor:
+    """
+    Starts a set of named worker processes and restarts any that crash.
+    A process that exits with a non-zero code while the supervisor is running is
+    started again with the same arguments, up to max_restarts times.
+
+    Args:
+        context: multiprocessing context used to create the processes
+        max_restarts (int): Restarts allowed per process
+        check_interval (float): Seconds between liveness checks
+    """
+    def __init__(self, context: Any, max_restarts: int = 5, check_interval: float = 1.0):
+        self.context = context
+        self.max_restarts: int = max_restarts
+        self.check_interval: float = check_interval
+        self.stop_event = context.Event()
+        self.specs: Dict[str, Tuple[Callable[..., None], tuple]] = {}
+        self.processes: Dict[str, multiprocessing.Process] = {}
+        self.restarts: Dict[str, int] = {}
+        self._monitor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def add(self, name: str, target: Callable[..., None], args: tuple) -> None:
+        """Register a process that runs target(*args)."""
+        self.specs[name] = (target, args)
+        self.restarts[name] = 0
+
+    def start(self) -> None:
+        for name in self.specs:
+            self._start_process(name)
+        self._monitor = threading.Thread(target=self._watch, daemon=True)
+        self._monitor.start()
+
+    def _start_process(self, name: str) -> None:
+        target, args = self.specs[name]
+        process = self.context.Process(target=target, args=args, name=f"spark-reader-{name}", daemon=True)
+        process.start()
+        self.processes[name] = process
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.check_interval):
+            for name, process in list(self.processes.items()):
+                if process.is_alive() or process.exitcode == 0:
+                    continue
+                if self.restarts[name] >= self.max_restarts:
+                    print(f"Process {name} crashed (exit code {process.exitcode}); restart limit reached")
+                    del self.processes[name]
+                    continue
+                self.restarts[name] += 1
+                print(f"Process {name} crashed (exit code {process.exitcode}); restarting "
+                      f"({self.restarts[name]}/{self.max_restarts})")
+                self._start_process(name)
+
+    def get_pids(self) -> Dict[str, Optional[int]]:
+        return {name: process.pid for name, process in self.processes.items()}
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Signal every process to stop, waiting up to timeout before terminating it."""
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+        self.stop_event.set()
+        for process in self.processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.processes = {}
+
+
+class MultiProcessNarrator:
+    """
+    Narrator with capture/detection, matching and audio each in their own process,
+    so the CPU bound stages do not contend for one interpreter lock.
+
+    Stable frames cross from detection to matching through shared memory; only the
+    slot number, the hash and a timestamp are pickled. The match queue holds one job
+    and a newer frame replaces an unmatched one. Processes are supervised and
+    restarted if they crash.
+
+    Args:
+        db_path (str): Image mapping database
+        context_options (Optional[Dict[str, Any]]): Extra ImageContextController arguments
+        frame_bytes (int): Largest full resolution frame, in bytes
+        events (Optional[multiprocessing.Queue]): Receives ("played", audio_path, frame_time,
+            play_time) tuples from the audio process, e.g. for latency measurements
+    """
+    def __init__(self, db_path: str = 'data/image_mappings.db', context_options: Optional[Dict[str, Any]] = None,
+                 frame_bytes: int = DEFAULT_FRAME_BYTES, events: Optional["multiprocessing.Queue"] = None):
+        self.db_path: str = db_path
+        self.context_options: Dict[str, Any] = context_options or {}
+        self.frame_bytes: int = frame_bytes
+        # Spawned processes do not inherit the camera, mixer or database handles of this one
+        self.context = multiprocessing.get_context("spawn")
+        self.events: Optional["multiprocessing.Queue"] = events
+        self.frames = None
+        self.supervisor: Optional[ProcessSupervisor] = None
+        self.matcher_ready = self.context.Event()
+
+    def narrate(self) -> None:
+        from src.shared_frames import SharedFrameBuffer
+
+        self.frames = SharedFrameBuffer.create(self.frame_bytes, FRAME_SLOTS)
+        match_jobs = self.context.Queue(maxsize=1)
+        audio_commands = self.context.Queue()
+        self.supervisor = ProcessSupervisor(self.context)
+        stop_event = self.supervisor.stop_event
+        self.supervisor.add("audio", _audio_process, (audio_commands, stop_event, self.events))
+        self.supervisor.add("match", _match_process, (self.db_path, self.frames.name, self.frame_bytes,
+                                                      match_jobs, audio_commands, self.matcher_ready, stop_event))
+        self.supervisor.add("detection", _detection_process, (self.frames.name, self.frame_bytes, match_jobs,
+                                                              self.matcher_ready, stop_event, self.context_options))
+        self.supervisor.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the match process has loaded the library and detection has started."""
+        return self.matcher_ready.wait(timeout)
+
+    def stop(self) -> None:
+        if self.supervisor is not None:
+            self.supervisor.stop()
+            self.supervisor = None
+        if self.frames is not None:
+            self.frames.close()
+            self.frames.unlink()
+            self.frames = None
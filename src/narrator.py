@@ -1,40 +1,78 @@
 from src.image_context_controller import ImageContextController
+from src.frame_quality import FrameQualityGate
 from src.matcher import ImageMatcher
-from src.audio_utils import play_audio
+from src.match_worker import MatchWorker
+from src.audio_utils import AudioPlayer
 from src.image_mapping import ImageMappingDB, ImageMapping
+from src.camera_service import CameraService
+from src.tracing import span
 import time
-from typing import Optional
+from typing import Optional, Dict, Any
 
 class Narrator:
-    def __init__(self, db_path: str = 'data/image_mappings.db'):
+    def __init__(self, db_path: str = 'data/image_mappings.db', context_options: Optional[Dict[str, Any]] = None,
+                 camera_service: Optional[CameraService] = None):
         self.db_path: str = db_path
         self.image_matcher: Optional[ImageMatcher] = None
-        self.image_context: ImageContextController = ImageContextController(on_stable_context=self._handle_stable_context)
+        self.match_worker: Optional[MatchWorker] = None
+        # Blurry or occluded frames are dropped before the expensive ORB match
+        self.quality_gate: FrameQualityGate = FrameQualityGate()
+        # Extra ImageContextController arguments, e.g. a replay_source for recorded sessions
+        self.image_context: ImageContextController = ImageContextController(on_stable_context=self._handle_stable_context,
+                                                                            quality_gate=self.quality_gate,
+                                                                            camera_service=camera_service,
+                                                                            **(context_options or {}))
         self.current_audio: Optional[str] = None
         self.db: Optional[ImageMappingDB] = None
+        self.audio_player: AudioPlayer = AudioPlayer()
 
     def narrate(self) -> None:
-        self.db = ImageMappingDB(self.db_path)
+        # The camera warms up while the library loads
+        self.image_context.prepare_camera()
+        # A new session plays the first page shown even if it was the last one narrated
+        self.current_audio = None
+        with span("db_open"):
+            self.db = ImageMappingDB(self.db_path)
         self.image_matcher = ImageMatcher(self.db)
+        # Index any newly recorded books now rather than on the first page shown
+        with span("book_index_load"):
+            self.image_matcher.book_index.load()
+        with span("audio_start"):
+            self.audio_player.start()
+        # Matching runs off the detection thread so polling keeps its cadence
+        self.match_worker = MatchWorker(self.image_matcher, on_result=self._handle_match)
+        self.match_worker.start()
         self.image_context.run()
 
     def stop(self) -> None:
         self.image_context.stop()
-        if hasattr(self, 'db'):
+        if self.match_worker:
+            self.match_worker.stop()
+            print(f"Match worker: {self.match_worker.get_stats()}")
+        stats: dict = self.quality_gate.get_stats()
+        print(f"Matches skipped on low quality frames: {stats['frames_rejected']} of {stats['frames_checked']} {stats['rejections']}")
+        self.audio_player.close()
+        if self.db:
             self.db.close()
+            self.db = None
 
     def _handle_stable_context(self, image_mapping: ImageMapping) -> None:
-        match: Optional[ImageMapping] = self.image_matcher.match_image(image_mapping.image_path)
+        self.match_worker.submit(image_mapping)
+
+    def _handle_match(self, image_mapping: ImageMapping, match: Optional[ImageMapping]) -> None:
         if match:
             audio_path: str = match.audio_path
             if audio_path != self.current_audio:
                 self.current_audio = audio_path
                 self._play_audio(audio_path)
+            # Have the clips of the pages the matcher will try first ready to play
+            self.audio_player.preload([mapping.audio_path for mapping in self.image_matcher.get_expected_mappings()
+                                       if mapping.audio_path != audio_path])
         else:
             print("No matching audio found for the current image.")
 
     def _play_audio(self, audio_path: str) -> None:
         try:
-            play_audio(audio_path)
+            self.audio_player.play(audio_path)
         except Exception as e:
             print(f"Error playing audio: {e}")
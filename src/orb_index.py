@@ -0,0 +1,174 @@
+import cv2
+import numpy as np
+from typing import Optional, List, Tuple, Iterable, Set
+from src.image_mapping import ImageMapping
+
+ORB_DESCRIPTOR_SIZE: int = 32
+
+
+def decode_orb_features(orb_features: Optional[object]) -> Optional[np.ndarray]:
+    """
+    Decode stored ORB features into an (N, 32) uint8 descriptor array.
+
+    Args:
+        orb_features: BLOB bytes from the database or an already decoded array
+
+    Returns:
+        Optional[np.ndarray]: Descriptor array, or None if no features are stored
+    """
+    if orb_features is None:
+        return None
+    if isinstance(orb_features, np.ndarray):
+        return orb_features.reshape(-1, ORB_DESCRIPTOR_SIZE)
+    return np.frombuffer(orb_features, dtype=np.uint8).reshape(-1, ORB_DESCRIPTOR_SIZE)
+
+
+class OrbIndex:
+    """
+    Descriptor index over a set of pages.
+    Descriptors are decoded once into one contiguous array with a page label per
+    row, so each query frame is matched against all pages (or just the hash
+    candidates) in one pass and the page with the most good matches wins.
+
+    A match is good when it is close and clearly closer than the second nearest
+    descriptor (Lowe's ratio test). Cross-checking is not possible across a
+    batched query, and plain nearest neighbours let unrelated pages collect
+    enough weak matches to pass.
+
+    Args:
+        mappings (Iterable[ImageMapping]): Pages to index
+        max_distance (int): Maximum Hamming distance for a match to count as good
+        ratio (float): Maximum ratio of the nearest to the second nearest distance
+        distractor_rows (int): Rows sampled across all pages as second neighbours when matching a few candidates
+    """
+    def __init__(self, mappings: Iterable[ImageMapping], max_distance: int = 50, ratio: float = 0.75,
+                 distractor_rows: int = 1024):
+        self.max_distance: int = max_distance
+        self.ratio: float = ratio
+        self.mappings: List[ImageMapping] = []
+        self.matcher: cv2.BFMatcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+        page_descriptors: List[np.ndarray] = []
+        for mapping in mappings:
+            descriptors: Optional[np.ndarray] = decode_orb_features(mapping.orb_features)
+            if descriptors is None or len(descriptors) == 0:
+                continue
+            self.mappings.append(mapping)
+            page_descriptors.append(descriptors)
+
+        self.mapping_ids: np.ndarray = np.array([mapping.id for mapping in self.mappings], dtype=np.int64)
+        # Rows of self.descriptors belong to the page at the same position in self.mappings
+        self.descriptors: np.ndarray = (np.vstack(page_descriptors) if page_descriptors
+                                        else np.empty((0, ORB_DESCRIPTOR_SIZE), dtype=np.uint8))
+        self.row_pages: np.ndarray = np.repeat(np.arange(len(page_descriptors)),
+                                               [len(d) for d in page_descriptors]).astype(np.int64)
+        # Each page's rows are contiguous: page i owns rows row_offsets[i]:row_offsets[i + 1]
+        self.row_offsets: np.ndarray = np.concatenate(([0], np.cumsum([len(d) for d in page_descriptors]))).astype(np.int64)
+        self.distractor_rows: np.ndarray = self._sample_rows(distractor_rows)
+
+    @classmethod
+    def from_arrays(cls, mappings: Iterable[ImageMapping], descriptors: np.ndarray, row_offsets: np.ndarray,
+                    max_distance: int = 50, ratio: float = 0.75, distractor_rows: int = 1024) -> "OrbIndex":
+        """
+        Index pages whose descriptors are already one contiguous array, such as a
+        memory-mapped book file, without copying the descriptors.
+
+        Args:
+            mappings (Iterable[ImageMapping]): Pages in the order of their rows
+            descriptors (np.ndarray): (rows, 32) uint8 descriptors of every page, concatenated
+            row_offsets (np.ndarray): Page i owns rows row_offsets[i]:row_offsets[i + 1]
+            max_distance (int): Maximum Hamming distance for a match to count as good
+            ratio (float): Maximum ratio of the nearest to the second nearest distance
+            distractor_rows (int): Rows sampled across all pages as second neighbours when matching a few candidates
+        """
+        index: OrbIndex = cls([], max_distance=max_distance, ratio=ratio, distractor_rows=distractor_rows)
+        row_offsets = np.asarray(row_offsets, dtype=np.int64)
+        # Pages without descriptors own no rows, so dropping them keeps the offsets contiguous
+        has_rows: np.ndarray = np.diff(row_offsets) > 0
+        index.mappings = [mapping for mapping, keep in zip(mappings, has_rows) if keep]
+        index.mapping_ids = np.array([mapping.id for mapping in index.mappings], dtype=np.int64)
+        index.descriptors = descriptors
+        index.row_offsets = np.concatenate((row_offsets[:-1][has_rows], row_offsets[-1:]))
+        index.row_pages = np.repeat(np.arange(len(index.mappings)), np.diff(index.row_offsets)).astype(np.int64)
+        index.distractor_rows = index._sample_rows(distractor_rows)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.mappings)
+
+    def _sample_rows(self, count: int) -> np.ndarray:
+        """Mask of about count rows spread evenly over every page."""
+        mask: np.ndarray = np.zeros(len(self.descriptors), dtype=bool)
+        if count > 0:
+            mask[::max(1, len(mask) // count)] = True
+        return mask
+
+    def _is_good_match(self, neighbours: List[cv2.DMatch]) -> bool:
+        if not neighbours or neighbours[0].distance >= self.max_distance:
+            return False
+        # A lone train descriptor has no second neighbour to be confused with
+        return len(neighbours) < 2 or neighbours[0].distance < self.ratio * neighbours[1].distance
+
+    def best_match(self, orb_features: Optional[np.ndarray], candidate_ids: Optional[Set[int]] = None,
+                   min_matches: int = 40, batch_size: int = 128,
+                   confident_matches: Optional[int] = None) -> Optional[Tuple[ImageMapping, int]]:
+        """
+        Find the indexed page with the most good matches for a query frame.
+
+        Query descriptors are matched in batches and matching stops early once
+        the leading page cannot be overtaken by the descriptors that remain.
+
+        Args:
+            orb_features (Optional[np.ndarray]): Query ORB descriptors
+            candidate_ids (Optional[Set[int]]): Restrict the result to these mapping ids
+            min_matches (int): Good matches required to accept a page
+            batch_size (int): Query descriptors matched per batch
+            confident_matches (Optional[int]): Stop as soon as the leading page has more good matches than this
+
+        Returns:
+            Optional[Tuple[ImageMapping, int]]: Best page and its good match count, or None
+        """
+        if orb_features is None or len(orb_features) == 0 or not self.mappings:
+            return None
+
+        train_descriptors: np.ndarray = self.descriptors
+        train_pages: np.ndarray = self.row_pages
+        allowed: Optional[np.ndarray] = None
+        if candidate_ids is not None:
+            allowed = np.isin(self.mapping_ids, list(candidate_ids))
+            if not allowed.any():
+                return None
+            if not allowed.all():
+                # Match against the candidate pages' rows plus a fixed sample of the other pages' rows.
+                # The sample only serves as second neighbours for the ratio test, which would otherwise
+                # get weaker the fewer candidates there are.
+                rows: np.ndarray = allowed[self.row_pages] | self.distractor_rows
+                train_descriptors = self.descriptors[rows]
+                train_pages = self.row_pages[rows]
+
+        counts: np.ndarray = np.zeros(len(self.mappings), dtype=np.int64)
+        total: int = len(orb_features)
+        for start in range(0, total, batch_size):
+            batch: np.ndarray = orb_features[start:start + batch_size]
+            train_rows: List[int] = [neighbours[0].trainIdx
+                                     for neighbours in self.matcher.knnMatch(batch, train_descriptors, k=2)
+                                     if self._is_good_match(neighbours)]
+            if train_rows:
+                counts += np.bincount(train_pages[train_rows], minlength=len(self.mappings))
+            if allowed is not None:
+                counts[~allowed] = 0
+
+            if confident_matches is not None and counts.max() > confident_matches:
+                break
+            remaining: int = total - start - len(batch)
+            if remaining and len(counts) > 1:
+                runner_up, leader = np.partition(counts, len(counts) - 2)[-2:]
+                if leader > min_matches and leader - runner_up > remaining:
+                    break
+
+        best_index: int = int(np.argmax(counts))
+        best_count: int = int(counts[best_index])
+        print(f"Good matches: {best_count}. Min matches: {min_matches}")
+        if best_count > min_matches:
+            return self.mappings[best_index], best_count
+        return None
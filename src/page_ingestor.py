@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src.audio_utils import AudioRecorder, clip_path, write_clip
+from src.feature_pipeline import FeatureExtractionPipeline
+from src.image_mapping import ImageMapping
+
+
+class PageIngestor:
+    """
+    Processes recorded pages while the recording is still running.
+    Page features are extracted as soon as a page is captured, and a page's audio
+    clip is cut as soon as the next page turn closes its span. Pages are only
+    staged here; the caller commits them together or discards them with abort().
+
+    Args:
+        audio_recorder (AudioRecorder): Recorder writing the session audio
+        pipeline (FeatureExtractionPipeline): Pool used for feature extraction
+        frame_timeout (float): Seconds to wait for audio covering a closed span
+    """
+    def __init__(self, audio_recorder: AudioRecorder, pipeline: FeatureExtractionPipeline,
+                 frame_timeout: float = 5.0):
+        self.audio_recorder: AudioRecorder = audio_recorder
+        self.pipeline: FeatureExtractionPipeline = pipeline
+        self.frame_timeout: float = frame_timeout
+        self.audio_file: Optional[str] = audio_recorder.file_path
+        self.staged: List[ImageMapping] = []
+        self.page_starts: List[float] = []
+        self.feature_futures: List[Future] = []
+        self.clip_futures: Dict[int, Future] = {}
+        self.clip_executor = ThreadPoolExecutor(max_workers=1)
+        self.lock = threading.Lock()
+
+    def add_page(self, image_mapping: ImageMapping, timestamp: float) -> None:
+        """
+        Stage a newly captured page and close the previous page's audio span.
+
+        Args:
+            image_mapping (ImageMapping): Page with its image saved to image_path
+            timestamp (float): Seconds since the recording started
+        """
+        with self.lock:
+            index: int = len(self.staged)
+            self.staged.append(image_mapping)
+            self.page_starts.append(timestamp)
+            self.feature_futures.append(self.pipeline.submit(image_mapping.image_path))
+            if index > 0:
+                self._close_span(index - 1, timestamp, growing=True)
+
+    def _close_span(self, index: int, end_time: Optional[float], growing: bool) -> None:
+        self.clip_futures[index] = self.clip_executor.submit(
+            self._cut_clip, index, self.page_starts[index], end_time, growing)
+
+    def _cut_clip(self, index: int, start_time: float, end_time: Optional[float], growing: bool) -> None:
+        if growing and end_time is not None:
+            # The page turn can be seen slightly before its audio reaches the file
+            end_frame: int = int(end_time * self.audio_recorder.sample_rate)
+            deadline: float = time.monotonic() + self.frame_timeout
+            while self.audio_recorder.frames_written < end_frame and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.staged[index].audio_path = write_clip(self.audio_file, start_time, end_time,
+                                                   clip_path(self.audio_file, index), growing)
+
+    def finish(self, audio_file: Optional[str] = None) -> List[ImageMapping]:
+        """
+        Close the last span once recording has stopped and wait for all staged work.
+
+        Args:
+            audio_file (Optional[str]): Final recording path, if it differs from the one being written
+
+        Returns:
+            List[ImageMapping]: Staged pages with audio clips, hashes and ORB features set
+        """
+        with self.lock:
+            if audio_file is not None:
+                self.audio_file = audio_file
+            if self.staged and len(self.staged) - 1 not in self.clip_futures:
+                self._close_span(len(self.staged) - 1, None, growing=False)
+
+        for future in self.clip_futures.values():
+            future.result()
+        for image_mapping, future in zip(self.staged, self.feature_futures):
+            image_mapping.image_hash, image_mapping.orb_features = future.result()
+        self.clip_executor.shutdown(wait=True)
+        return self.staged
+
+    def abort(self) -> None:
+        """Drop staged pages and delete the clips and page images written for them."""
+        self.clip_executor.shutdown(wait=True, cancel_futures=True)
+        for future in self.feature_futures:
+            future.cancel()
+        with self.lock:
+            for index, image_mapping in enumerate(self.staged):
+                for path in (image_mapping.image_path, clip_path(self.audio_file, index) if self.audio_file else None):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+            self.staged = []
+            self.page_starts = []
+            self.feature_futures = []
+            self.clip_futures = {}
@@ -1,41 +1,59 @@
 from src.image_context_controller import ImageContextController
 from src.image_mapping import ImageMappingDB
-from src.audio_utils import record_audio, split_audio, stop_audio_recording
+from src.audio_utils import AudioRecorder
 import time
 from src.image_utils import ImageUtils
+from src.feature_pipeline import FeatureExtractionPipeline
+from src.page_ingestor import PageIngestor
+from src.tracing import span
+from src.book_index import BookIndex
 import logging
 from contextlib import contextmanager
 
 class Recorder:
-    def __init__(self):
+    def __init__(self, camera_service=None):
         # Initialize the recorder with necessary components
         self.book_context = None  # Stores the current book's identifier
-        self.image_context = ImageContextController(on_stable_context=self.on_page_turn)  # Handles image context changes
+        self.camera_service = camera_service  # Shared long-lived camera, if any
+        self.image_context = ImageContextController(on_stable_context=self.on_page_turn,
+                                                    camera_service=camera_service)  # Handles image context changes
         self.image_mapping_db = None  # We'll initialize this when starting the recording
         self.recording_start_time = None  # Tracks when the recording started
-        self.page_timestamps = []  # Stores (timestamp, image mapping) of detected page turns
         self.current_audio_file = None  # Holds the path to the current audio recording
+        self.audio_recorder = AudioRecorder()  # Streams the microphone to current_audio_file
+        self.feature_pipeline = None  # Process pool extracting page features during the session
+        self.page_ingestor = None  # Stages each page's features and audio clip as the session runs
+        self.book_index = None  # Loaded at the start of a session so only the new pages are counted
     
     def on_page_turn(self, new_image_mapping):
         # Callback method triggered when a page turn is detected
         if self.recording_start_time is not None:
             # Calculate the timestamp of the page turn
             timestamp = time.time() - self.recording_start_time
-            # Retrieve the current image and save it
-            current_image = ImageUtils.open_image(new_image_mapping.image_path)
-            new_image_path = ImageUtils.save_image(current_image)
-            new_image_mapping.image_path = new_image_path
-            self.page_timestamps.append((timestamp, new_image_mapping))
+            # Persist the in-memory frame and release it
+            with span("temp_save"):
+                new_image_mapping.image_path = ImageUtils.save_image(new_image_mapping.image)
+            new_image_mapping.image = None
+            # Start processing this page and cut the previous page's clip right away
+            self.page_ingestor.add_page(new_image_mapping, timestamp)
             print(f"Page turn detected at {timestamp:.2f} seconds")
 
     def start_recording(self):
         # Begin the recording process
+        # Warm the camera up while the database and feature workers start
+        self.image_context.prepare_camera()
         if self.image_mapping_db is None:
             self.image_mapping_db = ImageMappingDB()  # Create a new database connection
+        self._load_book_index()
+        # Pages are ingested in the background as they are captured
+        self.feature_pipeline = FeatureExtractionPipeline(on_progress=self._report_progress)
+        self.feature_pipeline.start()
+
         self.recording_start_time = time.time()
         
         # Start audio recording in the background
-        self.current_audio_file = record_audio()
+        self.current_audio_file = self.audio_recorder.start()
+        self.page_ingestor = PageIngestor(self.audio_recorder, self.feature_pipeline)
         
         # Start monitoring for page turns
         self.image_context.run()
@@ -44,35 +62,65 @@ class Recorder:
         # End the recording process and ensure camera is released
         if self.image_context:
             self.image_context.stop()
-            # Add a small delay to ensure camera is fully released
-            time.sleep(0.5)
+            if self.camera_service is None:
+                # Add a small delay to ensure camera is fully released
+                time.sleep(0.5)
         
         # Stop the audio recording and get the final audio file path
-        self.current_audio_file = stop_audio_recording()
+        self.current_audio_file = self.audio_recorder.stop()
 
     def process_recording(self):
         try:
-            # Process the recorded audio and associate it with detected page turns
-            audio_clips = split_audio(self.current_audio_file, self.page_timestamps)
-            book_id = self.image_mapping_db.get_next_book_id()
-            for i, (audio_clip, (_, image_mapping)) in enumerate(zip(audio_clips, self.page_timestamps)):
-                image_mapping.book_id = book_id
-                image_mapping.audio_path = audio_clip
-                image_mapping.orb_features = ImageUtils.extract_orb_features(image_mapping.image_path)
-                image_mapping.image_hash = ImageUtils.hash_image(image_mapping.image_path)
+            if self.current_audio_file is None:
+                raise RuntimeError("No audio was recorded")
+            # Only the last page's clip is left to cut; everything else was processed during recording
+            image_mappings = self.page_ingestor.finish(self.current_audio_file)
+            if not image_mappings:
+                print("No pages were detected during the recording")
+                return
 
-                self.image_mapping_db.add_mapping(
-                    image_mapping.book_id,
-                    image_mapping.image_path,
-                    image_mapping.audio_path,
-                    image_mapping.image_hash,
-                    image_mapping.orb_features
-                )
+            # Store the whole book atomically in one transaction
+            book_id, _ = self.image_mapping_db.add_mappings(image_mappings)
+            print(f"Saved book {book_id} with {len(image_mappings)} pages")
+        except Exception:
+            self._discard_recording()
+            raise
         finally:
-            # Ensure image_context is fully stopped and camera is released
+            if self.feature_pipeline:
+                self.feature_pipeline.close()
+                self.feature_pipeline = None
+            self.page_ingestor = None
+            # Ensure image_context is fully stopped and camera is released; it is reused by the next recording
             if self.image_context:
                 self.image_context.stop()
-                self.image_context = None
+        # The book is stored; indexing failures must not discard it
+        self._index_book(image_mappings)
+
+    def _load_book_index(self):
+        self.book_index = None
+        try:
+            book_index = BookIndex(self.image_mapping_db)
+            book_index.load()
+            self.book_index = book_index
+        except Exception as e:
+            logging.warning(f"Could not load the book index; new pages will be indexed when narration starts: {e}")
+
+    def _index_book(self, image_mappings):
+        # Count only the new pages, while their features are in memory
+        if self.book_index is None:
+            return
+        try:
+            self.book_index.add_book(image_mappings)
+        except Exception as e:
+            logging.warning(f"Could not index the new book; it will be indexed when narration starts: {e}")
+
+    def _discard_recording(self):
+        # Drop staged pages so an aborted session leaves nothing behind
+        if self.page_ingestor:
+            self.page_ingestor.abort()
+
+    def _report_progress(self, completed, total):
+        print(f"Processed page {completed} of {total}")
 
     @contextmanager
     def _recording_session(self):
@@ -91,11 +139,15 @@ class Recorder:
             logging.info("Recording processed successfully.")
         except Exception as e:
             logging.error(f"An error occurred during recording: {e}")
-            # Implement cleanup if necessary
+            self._discard_recording()
+            if self.feature_pipeline:
+                self.feature_pipeline.close(cancel=True)
+                self.feature_pipeline = None
         finally:
             if self.image_mapping_db:
                 self.image_mapping_db.close()
                 self.image_mapping_db = None  # Set to None after closing
+                self.book_index = None
 
     def __del__(self):
         # Ensure the database connection is closed when the Recorder object is destroyed
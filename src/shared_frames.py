@@ -0,0 +1,106 @@
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+import numpy as np
+
+# Per slot header: sequence number, height, width, channels
+HEADER_FIELDS: int = 4
+HEADER_BYTES: int = HEADER_FIELDS * 8
+
+
+class SharedFrameBuffer:
+    """
+    Fixed slots of shared memory for handing frames between processes without pickling.
+
+    One process writes frames round robin and passes (slot, sequence) to readers
+    through a queue. Each slot starts with a small header holding the sequence number
+    of the frame in it; the writer clears it while copying, and readers check it before
+    and after their copy, so a frame overwritten mid-read is reported as gone rather
+    than returned torn.
+
+    Args:
+        shm (shared_memory.SharedMemory): Backing shared memory block
+        slot_bytes (int): Largest frame a slot can hold, in bytes
+        slots (int): Number of slots
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, slot_bytes: int, slots: int):
+        self.shm: shared_memory.SharedMemory = shm
+        self.slot_bytes: int = slot_bytes
+        self.slots: int = slots
+        stride: int = HEADER_BYTES + slot_bytes
+        self._headers = [np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=shm.buf, offset=i * stride)
+                         for i in range(slots)]
+        self._data = [np.ndarray(slot_bytes, dtype=np.uint8, buffer=shm.buf, offset=i * stride + HEADER_BYTES)
+                      for i in range(slots)]
+        # Continue numbering after frames left by a previous writer, e.g. before a restart
+        self.sequence: int = max(int(header[0]) for header in self._headers)
+        self.next_slot: int = 0
+
+    @classmethod
+    def create(cls, slot_bytes: int, slots: int = 3) -> "SharedFrameBuffer":
+        shm = shared_memory.SharedMemory(create=True, size=slots * (HEADER_BYTES + slot_bytes))
+        buffer = cls(shm, slot_bytes, slots)
+        for header in buffer._headers:
+            header[:] = 0
+        buffer.sequence = 0
+        return buffer
+
+    @classmethod
+    def attach(cls, name: str, slot_bytes: int, slots: int = 3) -> "SharedFrameBuffer":
+        return cls(shared_memory.SharedMemory(name=name), slot_bytes, slots)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, frame: np.ndarray) -> Tuple[int, int]:
+        """
+        Copy a uint8 frame into the next slot.
+
+        Args:
+            frame (np.ndarray): (H, W) or (H, W, C) uint8 frame
+
+        Returns:
+            Tuple[int, int]: Slot and sequence number to pass to the reader
+        """
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+        slot: int = self.next_slot
+        self.next_slot = (slot + 1) % self.slots
+        self.sequence += 1
+        header: np.ndarray = self._headers[slot]
+        header[0] = 0
+        height, width = frame.shape[:2]
+        channels: int = frame.shape[2] if frame.ndim == 3 else 1
+        self._data[slot][:frame.nbytes] = np.ascontiguousarray(frame, dtype=np.uint8).reshape(-1)
+        header[1:] = (height, width, channels)
+        header[0] = self.sequence
+        return slot, self.sequence
+
+    def read(self, slot: int, sequence: int) -> Optional[np.ndarray]:
+        """
+        Copy a frame out of its slot.
+
+        Args:
+            slot (int): Slot returned by write
+            sequence (int): Sequence number returned by write
+
+        Returns:
+            Optional[np.ndarray]: The frame, or None if it was already overwritten
+        """
+        header: np.ndarray = self._headers[slot]
+        if header[0] != sequence:
+            return None
+        height, width, channels = (int(v) for v in header[1:])
+        frame: np.ndarray = self._data[slot][:height * width * channels].copy()
+        if header[0] != sequence:
+            return None
+        return frame.reshape((height, width, channels) if channels > 1 else (height, width))
+
+    def close(self) -> None:
+        # Views must go before the mapping can be closed
+        self._headers = []
+        self._data = []
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
@@ -0,0 +1,237 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
+
+# Upper bounds in milliseconds of the histogram buckets; the last bucket is open ended
+HISTOGRAM_BOUNDS_MS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class LatencyTracer:
+    """
+    Low overhead per-stage timing for the capture to narration hot path.
+
+    Finished spans go into a fixed size ring buffer of (stage, start, duration ms)
+    tuples, and every stage keeps a cumulative histogram over HISTOGRAM_BOUNDS_MS.
+    Stages listed in profile_stages additionally run under cProfile and dump one
+    .prof file per call, which snakeviz or pstats can open.
+
+    Args:
+        capacity (int): Number of recent spans kept in the ring buffer
+    """
+    def __init__(self, capacity: int = 4096):
+        self.enabled: bool = True
+        self.spans: Deque[Tuple[str, float, float]] = deque(maxlen=capacity)
+        self.histograms: Dict[str, np.ndarray] = {}
+        self.lock = threading.Lock()
+        self.profile_stages: Set[str] = set()
+        self.profile_dir: str = "profiles"
+        self._profile_count: int = 0
+        self._reporter: Optional[threading.Thread] = None
+        self._reporter_stop = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """
+        Time the enclosed block as one span of the given stage.
+
+        Args:
+            stage (str): Stage name, e.g. "phash" or "orb_match"
+        """
+        if not self.enabled:
+            yield
+            return
+        if stage in self.profile_stages:
+            with self._profiled(stage):
+                start: float = time.perf_counter()
+                try:
+                    yield
+                finally:
+                    self.record(stage, (time.perf_counter() - start) * 1000, start)
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000, start)
+
+    def record(self, stage: str, duration_ms: float, start: Optional[float] = None) -> None:
+        """
+        Record a span measured elsewhere.
+
+        Args:
+            stage (str): Stage name
+            duration_ms (float): Span length in milliseconds
+            start (Optional[float]): perf_counter() value at the start of the span
+        """
+        if not self.enabled:
+            return
+        self.spans.append((stage, time.perf_counter() - duration_ms / 1000 if start is None else start, duration_ms))
+        bucket: int = int(np.searchsorted(HISTOGRAM_BOUNDS_MS, duration_ms))
+        with self.lock:
+            histogram: Optional[np.ndarray] = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = np.zeros(len(HISTOGRAM_BOUNDS_MS) + 1, dtype=np.int64)
+            histogram[bucket] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Percentiles of the spans in the ring buffer, per stage.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Stage -> count, mean, p50, p90, p99 and max in ms
+        """
+        durations: Dict[str, List[float]] = {}
+        for stage, _, duration_ms in list(self.spans):
+            durations.setdefault(stage, []).append(duration_ms)
+        result: Dict[str, Dict[str, float]] = {}
+        for stage, samples in sorted(durations.items()):
+            values: np.ndarray = np.asarray(samples)
+            result[stage] = {
+                "count": len(values),
+                "mean": round(float(values.mean()), 2),
+                "p50": round(float(np.percentile(values, 50)), 2),
+                "p90": round(float(np.percentile(values, 90)), 2),
+                "p99": round(float(np.percentile(values, 99)), 2),
+                "max": round(float(values.max()), 2),
+            }
+        return result
+
+    def format_timeline(self, stages: List[str], origin: float) -> str:
+        """
+        One line per span of the given stages with its start and end relative to origin,
+        in start order, e.g. to show which startup steps overlapped.
+
+        Args:
+            stages (List[str]): Stages to include
+            origin (float): perf_counter() value that offsets are measured from
+        """
+        rows: List[Tuple[str, float, float]] = sorted((span for span in list(self.spans) if span[0] in stages),
+                                                      key=lambda span: span[1])
+        return "\n".join(f"  {stage:<18} {(start - origin) * 1000:8.1f} -> {(start - origin) * 1000 + duration_ms:8.1f} ms"
+                         for stage, start, duration_ms in rows)
+
+    def histogram_snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Cumulative bucket counts per stage, keyed by each bucket's upper bound in ms."""
+        labels: List[str] = [f"<={bound:g}" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]:g}"]
+        with self.lock:
+            return {stage: dict(zip(labels, (int(c) for c in counts))) for stage, counts in sorted(self.histograms.items())}
+
+    def format_summary(self) -> str:
+        """One line summary of every stage's p50/p90 latency."""
+        parts: List[str] = [f"{stage} n={stats['count']} p50={stats['p50']}ms p90={stats['p90']}ms"
+                            for stage, stats in self.summary().items()]
+        return "Latency: " + ("; ".join(parts) if parts else "no spans recorded")
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans.clear()
+            self.histograms.clear()
+
+    def start_reporter(self, interval: float = 30.0) -> None:
+        """
+        Print the summary line periodically on a daemon thread.
+
+        Args:
+            interval (float): Seconds between log lines
+        """
+        if self._reporter is not None:
+            return
+        self._reporter_stop.clear()
+
+        def report() -> None:
+            while not self._reporter_stop.wait(interval):
+                print(self.format_summary())
+
+        self._reporter = threading.Thread(target=report, daemon=True)
+        self._reporter.start()
+
+    def serve(self, port: int = 8765, host: str = "127.0.0.1") -> None:
+        """
+        Expose the summary and histograms as JSON on a local HTTP endpoint.
+
+        Args:
+            port (int): Port to listen on
+            host (str): Interface to bind; loopback only by default
+        """
+        if self._server is not None:
+            return
+        tracer: LatencyTracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body: bytes = json.dumps({"summary": tracer.summary(),
+                                          "histograms_ms": tracer.histogram_snapshot()}, indent=2).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop the periodic reporter and the HTTP endpoint."""
+        self._reporter_stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @contextmanager
+    def _profiled(self, stage: str) -> Iterator[None]:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can be active at a time; a nested or concurrent stage is skipped
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            with self.lock:
+                self._profile_count += 1
+                count: int = self._profile_count
+            profiler.dump_stats(os.path.join(self.profile_dir, f"{stage}-{count:04d}.prof"))
+
+
+# Process wide tracer shared by every stage of the pipeline
+tracer: LatencyTracer = LatencyTracer()
+span = tracer.span
+
+
+def configure_tracing(log_interval: Optional[float] = None, http_port: Optional[int] = None,
+                      profile_stages: Optional[List[str]] = None, profile_dir: str = "profiles") -> None:
+    """
+    Turn on the optional tracing outputs.
+
+    Args:
+        log_interval (Optional[float]): Seconds between summary log lines, None to disable
+        http_port (Optional[int]): Local port for the JSON endpoint, None to disable
+        profile_stages (Optional[List[str]]): Stages to run under cProfile
+        profile_dir (str): Where cProfile output is written
+    """
+    if profile_stages:
+        tracer.profile_stages = set(profile_stages)
+        tracer.profile_dir = profile_dir
+    if log_interval:
+        tracer.start_reporter(log_interval)
+    if http_port:
+        tracer.serve(http_port)
@@ -0,0 +1,112 @@
+import os
+import wave
+import numpy as np
+import pytest
+from src.book_index import BookIndex
+from src.book_pack import HEADER, BookPackError, export_book, import_book
+from src.hash_index import hash_to_int
+from src.image_mapping import ImageMapping, ImageMappingDB
+
+
+def descriptors(seed: int, rows: int = 40) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (rows, 32), dtype=np.uint8)
+
+
+def write_clip(path: str, seed: int) -> str:
+    with wave.open(path, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(8000)
+        clip.writeframes(np.random.default_rng(seed).integers(-1000, 1000, 800, dtype=np.int16).tobytes())
+    return path
+
+
+def library_state(db: ImageMappingDB, audio_dir):
+    mapping_count = db.conn.execute('SELECT COUNT(*) FROM image_mappings').fetchone()[0]
+    return db.get_book_ids(), mapping_count, sorted(os.listdir(audio_dir)) if os.path.isdir(audio_dir) else []
+
+
+@pytest.fixture
+def pack(tmp_path):
+    """A pack of a three page book whose first two pages share a clip."""
+    clips = [write_clip(str(tmp_path / f"clip_{i}.wav"), i) for i in range(2)]
+    db = ImageMappingDB(str(tmp_path / "source.db"))
+    try:
+        pages = [ImageMapping(image_path=f"page_{i}.jpg", audio_path=clips[i // 2],
+                              image_hash=f"{0x8000000000000000 + i:016x}", orb_features=descriptors(i))
+                 for i in range(3)]
+        book_id, _ = db.add_mappings(pages, title="The Gruffalo")
+        BookIndex(db, vocabulary_size=16).load()
+        path = str(tmp_path / "book.srpack")
+        assert export_book(db, book_id, path) == 3
+    finally:
+        db.close()
+    return path, pages, clips
+
+
+@pytest.fixture
+def library(tmp_path):
+    db = ImageMappingDB(str(tmp_path / "library.db"))
+    # An existing book, so an import has something to leave alone
+    db.add_mappings([ImageMapping(image_path="own.jpg", audio_path="own.wav", image_hash="00000000000000ff",
+                                  orb_features=descriptors(99))])
+    yield db, str(tmp_path / "audio")
+    db.close()
+
+
+def test_pack_round_trip(pack, library):
+    path, pages, clips = pack
+    db, audio_dir = library
+    book_id, page_count = import_book(db, path, audio_dir)
+    assert (book_id, page_count) == (2, 3)
+    assert db.get_book_title(book_id) == "The Gruffalo"
+
+    mappings, book = db.get_book_descriptors(book_id)
+    assert [m.image_hash for m in mappings] == [hash_to_int(p.image_hash) for p in pages]
+    for position, page in enumerate(pages):
+        assert np.array_equal(book.page_descriptors(position), page.orb_features)
+
+    # Shared clips are imported once and the audio is byte for byte the same
+    assert mappings[0].audio_path == mappings[1].audio_path != mappings[2].audio_path
+    assert len(os.listdir(audio_dir)) == 2
+    for mapping, page in zip(mappings, pages):
+        with open(mapping.audio_path, "rb") as imported, open(page.audio_path, "rb") as original:
+            assert imported.read() == original.read()
+
+    # The pack's word counts are indexed without counting the pages again
+    counts = {mapping_id for mapping_id, _, _ in db.get_page_word_counts(book_id)}
+    assert counts == {m.id for m in mappings}
+
+
+def corrupt_offsets(path):
+    size = os.path.getsize(path)
+    # Every header field after the magic, then metadata, page table, descriptors and the last audio byte
+    return [4, 8, 12, 16, 20, 24, 32, 40, HEADER.size + 1, HEADER.size + 120, size // 2, size - 1]
+
+
+@pytest.mark.parametrize("position", range(12))
+def test_corrupt_pack_leaves_library_untouched(pack, library, position):
+    path, _, _ = pack
+    db, audio_dir = library
+    before = library_state(db, audio_dir)
+    offset = corrupt_offsets(path)[position]
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0x5A]))
+    with pytest.raises(BookPackError):
+        import_book(db, path, audio_dir)
+    assert library_state(db, audio_dir) == before
+
+
+@pytest.mark.parametrize("keep", [0, 20, HEADER.size, HEADER.size + 100, -2000, -1])
+def test_truncated_pack_leaves_library_untouched(pack, library, keep):
+    path, _, _ = pack
+    db, audio_dir = library
+    before = library_state(db, audio_dir)
+    with open(path, "r+b") as f:
+        f.truncate(keep if keep >= 0 else os.path.getsize(path) + keep)
+    with pytest.raises(BookPackError):
+        import_book(db, path, audio_dir)
+    assert library_state(db, audio_dir) == before
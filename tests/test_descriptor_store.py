@@ -0,0 +1,100 @@
+import os
+import numpy as np
+import pytest
+from src.descriptor_store import DescriptorStore
+from src.image_mapping import ImageMapping, ImageMappingDB
+
+
+def descriptors(seed: int, rows: int = 20) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (rows, 32), dtype=np.uint8)
+
+
+def pages(count: int, seed: int = 0):
+    return [ImageMapping(image_path=f"page_{seed}_{i}.jpg", audio_path=f"clip_{seed}_{i}.wav",
+                         image_hash=f"{seed * 100 + i + 1:016x}", orb_features=descriptors(seed * 100 + i))
+            for i in range(count)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ImageMappingDB(str(tmp_path / "library.db"))
+    yield db
+    db.close()
+
+
+def assert_book_descriptors(db, book_id, expected_pages):
+    mappings, book = db.get_book_descriptors(book_id)
+    assert book.mapping_ids.tolist() == [m.id for m in mappings]
+    assert len(book) == len(expected_pages)
+    for position, page in enumerate(expected_pages):
+        assert np.array_equal(book.page_descriptors(position), page.orb_features)
+
+
+def test_written_book_round_trips(tmp_path):
+    store = DescriptorStore(str(tmp_path / "descriptors"))
+    store.write_book(7, [3, 4, 5], [descriptors(1), None, descriptors(2, rows=5)])
+    book = store.open_book(7, [3, 4, 5])
+    assert book.mapping_ids.tolist() == [3, 4, 5]
+    assert book.row_offsets.tolist() == [0, 20, 20, 25]
+    assert np.array_equal(book.page_descriptors(0), descriptors(1))
+    assert len(book.page_descriptors(1)) == 0
+    assert np.array_equal(book.page_descriptors(2), descriptors(2, rows=5))
+
+
+def test_file_for_other_pages_is_stale(tmp_path):
+    store = DescriptorStore(str(tmp_path / "descriptors"))
+    store.write_book(1, [1, 2], [descriptors(1), descriptors(2)])
+    assert store.open_book(1, [1, 2, 3]) is None
+    assert store.open_book(1, [2, 1]) is None
+    assert store.open_book(2) is None
+
+
+@pytest.mark.parametrize("contents", [b"", b"SRDS", b"XXXX" + bytes(60)])
+def test_unreadable_file_is_ignored(tmp_path, contents):
+    store = DescriptorStore(str(tmp_path / "descriptors"))
+    with open(store.book_path(1), "wb") as f:
+        f.write(contents)
+    assert store.open_book(1) is None
+
+
+def test_truncated_descriptors_are_ignored(tmp_path):
+    store = DescriptorStore(str(tmp_path / "descriptors"))
+    path = store.write_book(1, [1, 2], [descriptors(1), descriptors(2)])
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 32)
+    assert store.open_book(1, [1, 2]) is None
+
+
+def test_missing_file_is_rebuilt_from_the_database(db):
+    book_pages = pages(3)
+    book_id, _ = db.add_mappings(book_pages)
+    os.remove(db.descriptor_store.book_path(book_id))
+    assert_book_descriptors(db, book_id, book_pages)
+    assert os.path.exists(db.descriptor_store.book_path(book_id))
+
+
+def test_stale_file_is_rebuilt_from_the_database(db):
+    book_pages = pages(3)
+    book_id, mapping_ids = db.add_mappings(book_pages)
+    # A file left behind for different pages, e.g. from before the database was replaced
+    db.descriptor_store.write_book(book_id, [mapping_id + 100 for mapping_id in mapping_ids],
+                                   [descriptors(99)] * 3)
+    assert_book_descriptors(db, book_id, book_pages)
+
+
+def test_corrupt_file_is_rebuilt_from_the_database(db):
+    book_pages = pages(2)
+    book_id, _ = db.add_mappings(book_pages)
+    with open(db.descriptor_store.book_path(book_id), "r+b") as f:
+        f.write(b"JUNK")
+    assert_book_descriptors(db, book_id, book_pages)
+
+
+def test_appending_pages_invalidates_the_file(db):
+    first_pages = pages(2)
+    book_id, _ = db.add_mappings(first_pages)
+    assert os.path.exists(db.descriptor_store.book_path(book_id))
+    more_pages = pages(2, seed=1)
+    db.add_mappings(more_pages, book_id=book_id)
+    assert not os.path.exists(db.descriptor_store.book_path(book_id))
+    assert_book_descriptors(db, book_id, first_pages + more_pages)
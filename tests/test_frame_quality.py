@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+from PIL import Image
+from benchmarks.synthetic_book import render_page
+from src.frame_quality import FrameQualityGate
+from src.image_context_controller import ContextState, ImageContextController
+from src.image_utils import ImageUtils
+
+
+def white_page(seed: int = 1) -> np.ndarray:
+    """A synthetic page on bright white paper, with most background pixels clipped."""
+    page = render_page(seed, 1)
+    page[(page == page[0, 0]).all(axis=2)] = 255
+    return page
+
+
+class FakeCamera:
+    def __init__(self, frame: Image.Image):
+        self.frame = frame
+        self.is_running = True
+
+    def get_frame(self) -> Image.Image:
+        return self.frame
+
+
+def test_white_page_passes():
+    gate = FrameQualityGate()
+    for seed in range(1, 6):
+        score = gate.evaluate(white_page(seed))
+        assert score.overexposed_fraction > gate.max_overexposed_fraction
+        assert score.passed, score
+
+
+def test_washed_out_frame_is_overexposed():
+    washed_out = np.clip(white_page().astype(np.float32) * 2 + 60, 0, 255).astype(np.uint8)
+    assert FrameQualityGate().evaluate(washed_out).rejected_reason == "overexposed"
+
+
+def test_blurry_frame_is_rejected():
+    blurred = cv2.GaussianBlur(white_page(), (31, 31), 0)
+    assert FrameQualityGate().evaluate(blurred).rejected_reason == "blurry"
+
+
+def settle(controller: ImageContextController, image: Image.Image):
+    image_hash = ImageUtils.hash_image(image)
+    controller.hash_history.append(image_hash)
+    controller.state = ContextState.STABLE_FOUND
+    return image_hash
+
+
+def test_rejected_page_is_retried_at_the_active_interval():
+    matched = []
+    page = Image.fromarray(white_page())
+    blurred = Image.fromarray(cv2.GaussianBlur(white_page(), (31, 31), 0))
+    controller = ImageContextController(on_stable_context=matched.append, quality_gate=FrameQualityGate(),
+                                        quality_retry_polls=3)
+    controller.image_utils.camera_manager = FakeCamera(page)
+
+    controller._handle_stable_found(blurred, settle(controller, blurred))
+    assert controller.state == ContextState.WAITING_PAGE_TURN
+    assert controller._is_polling_active()
+
+    # The page settles without moving far enough to count as a turn
+    page_hash = ImageUtils.hash_image(page)
+    for _ in range(3):
+        assert controller.state == ContextState.WAITING_PAGE_TURN
+        controller._handle_waiting_page_turn(page, page_hash)
+    assert controller.state == ContextState.SEARCHING_STABLE
+
+    controller._handle_stable_found(page, settle(controller, page))
+    assert len(matched) == 1
+    assert controller.state == ContextState.WAITING_PAGE_TURN
+    assert not controller._is_polling_active()
+    assert controller.quality_gate.get_stats()["frames_rejected"] == 1
+
+
+def test_page_that_keeps_failing_is_matched_anyway():
+    matched = []
+    blurred = Image.fromarray(cv2.GaussianBlur(white_page(), (31, 31), 0))
+    controller = ImageContextController(on_stable_context=matched.append, quality_gate=FrameQualityGate(),
+                                        max_quality_rejections=2, quality_retry_polls=1)
+    controller.image_utils.camera_manager = FakeCamera(blurred)
+    blurred_hash = ImageUtils.hash_image(blurred)
+
+    for _ in range(2):
+        controller._handle_stable_found(blurred, settle(controller, blurred))
+        controller._handle_waiting_page_turn(blurred, blurred_hash)
+    controller._handle_stable_found(blurred, settle(controller, blurred))
+    assert len(matched) == 1
+    assert controller.quality_gate.get_stats()["frames_checked"] == 2
@@ -0,0 +1,58 @@
+import random
+import numpy as np
+import pytest
+from imagehash import hex_to_hash
+from src.hash_index import (HashIndex, hamming_distance, hamming_distances, hash_to_db, hash_to_int,
+                            pack_hashes)
+
+
+def library_hashes(count: int, seed: int = 0):
+    """Random hashes plus near-duplicates of them, as pages of the same book produce."""
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(count // 2)]
+    for base in list(hashes):
+        flips = rng.sample(range(64), rng.randint(0, 12))
+        hashes.append(base ^ sum(1 << bit for bit in flips))
+    return hashes
+
+
+@pytest.mark.parametrize("threshold", [0, 5, 12, 25, 64])
+def test_search_matches_brute_force(threshold):
+    hashes = library_hashes(600)
+    index = HashIndex(enumerate(hashes))
+    rng = random.Random(threshold)
+    queries = [rng.getrandbits(64) for _ in range(20)] + [hashes[i] ^ (1 << rng.randrange(64)) for i in range(20)]
+    for query in queries:
+        expected = sorted((i, hamming_distance(query, h)) for i, h in enumerate(hashes)
+                          if hamming_distance(query, h) <= threshold)
+        results = index.search(query, threshold)
+        assert sorted(results) == expected
+        assert [d for _, d in results] == sorted(d for _, d in results)
+
+
+def test_identical_hashes_keep_every_id():
+    index = HashIndex([(1, 42), (2, 42), (3, 43)])
+    assert len(index) == 3
+    assert sorted(index.search(42, 0)) == [(1, 0), (2, 0)]
+    assert sorted(index.search(42, 1)) == [(1, 0), (2, 0), (3, 1)]
+
+
+def test_empty_index_finds_nothing():
+    assert HashIndex().search(0, 64) == []
+
+
+def test_hash_formats_agree():
+    image_hash = hex_to_hash("f0e1d2c3b4a59687")
+    value = hash_to_int(image_hash)
+    assert hash_to_int(str(image_hash)) == value
+    # Hashes with the top bit set are stored as negative SQLite integers and read back unchanged
+    assert hash_to_db(image_hash) < 0
+    assert hash_to_int(hash_to_db(image_hash)) == value
+
+
+def test_packed_distances_match_scalar_distances():
+    hashes = library_hashes(200, seed=3)
+    query = hashes[7] ^ 0b1011
+    distances = hamming_distances(pack_hashes(hashes), query)
+    assert distances.tolist() == [hamming_distance(query, h) for h in hashes]
+    assert np.all(hamming_distances(pack_hashes([query]), query) == 0)
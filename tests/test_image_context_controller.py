@@ -0,0 +1,33 @@
+from PIL import Image
+from benchmarks.synthetic_book import render_page
+from src.image_context_controller import ContextState, ImageContextController
+from src.image_utils import ImageUtils
+
+
+class FakeCamera:
+    def __init__(self, frame: Image.Image):
+        self.frame = frame
+        self.is_running = True
+
+    def get_frame(self) -> Image.Image:
+        return self.frame
+
+
+def test_stable_page_carries_the_full_frame_hash():
+    handed_off = []
+    full = Image.fromarray(render_page(3, 2, size=(1280, 720)))
+    # The preview shows a narrower, lower resolution view of the same page
+    preview = full.crop((200, 0, 1080, 720)).resize((320, 240)).convert("L")
+    preview_hash = ImageUtils.hash_image(preview)
+    controller = ImageContextController(on_stable_context=handed_off.append)
+    controller.image_utils.camera_manager = FakeCamera(full)
+    controller.hash_history.append(preview_hash)
+    controller.state = ContextState.STABLE_FOUND
+
+    controller._handle_stable_found(preview, preview_hash)
+
+    assert handed_off[0].image is full
+    # Stored books are hashed from full frames, so matching must use the same
+    assert handed_off[0].image_hash == ImageUtils.hash_image(full)
+    # Page turns are still detected by comparing previews
+    assert controller.last_key_image_hash == preview_hash
@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import numpy as np
+import pytest
+from src.db_migrations import SCHEMA_VERSION
+from src.hash_index import hash_to_int
+from src.image_mapping import ImageMapping, ImageMappingDB
+
+
+def descriptors(seed: int, rows: int = 20) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (rows, 32), dtype=np.uint8)
+
+
+def pages(count: int, seed: int = 0):
+    return [ImageMapping(image_path=f"page_{seed}_{i}.jpg", audio_path=f"clip_{seed}_{i}.wav",
+                         image_hash=f"{seed * 100 + i + 1:016x}", orb_features=descriptors(seed * 100 + i))
+            for i in range(count)]
+
+
+def test_legacy_database_is_migrated(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(db_path)
+    legacy.execute('''
+        CREATE TABLE image_mappings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, book_id INTEGER, image_path TEXT,
+            audio_path TEXT, image_hash TEXT, orb_features BLOB
+        )
+    ''')
+    rows = [(1, "a.jpg", "a.wav", "ff00ff00ff00ff00", descriptors(1).tobytes()),
+            (2, "c.jpg", "c.wav", "0123456789abcdef", descriptors(3).tobytes()),
+            (1, "b.jpg", "b.wav", "8000000000000001", descriptors(2).tobytes()),
+            (None, "orphan.jpg", None, None, None)]
+    legacy.executemany('INSERT INTO image_mappings (book_id, image_path, audio_path, image_hash, orb_features) '
+                       'VALUES (?, ?, ?, ?, ?)', rows)
+    legacy.commit()
+    legacy.close()
+
+    db = ImageMappingDB(db_path)
+    try:
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert db.get_book_ids() == [1, 2]
+        book = db.get_book_mappings(1)
+        assert [(m.id, m.page_number, m.image_path) for m in book] == [(1, 1, "a.jpg"), (3, 2, "b.jpg")]
+        # Hashes with the top bit set survive the signed INTEGER column
+        assert book[1].image_hash == hash_to_int("8000000000000001")
+        assert bytes(book[0].orb_features) == descriptors(1).tobytes()
+        assert [m.id for m in db.get_mappings_by_hash("8000000000000001", 0)] == [3]
+
+        # New rows continue after the migrated ids
+        book_id, mapping_ids = db.add_mappings(pages(2))
+        assert book_id == 3
+        assert mapping_ids == [4, 5]
+    finally:
+        db.close()
+
+    # Reopening an up to date database changes nothing
+    db = ImageMappingDB(db_path)
+    try:
+        assert db.get_book_ids() == [1, 2, 3]
+    finally:
+        db.close()
+
+
+def test_concurrent_writers_get_distinct_ids(tmp_path):
+    db_path = str(tmp_path / "library.db")
+    ImageMappingDB(db_path).close()
+    results = []
+    errors = []
+
+    def write_books(writer: int) -> None:
+        db = ImageMappingDB(db_path)
+        try:
+            for book in range(5):
+                results.append(db.add_mappings(pages(3, seed=writer * 10 + book)))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=write_books, args=(writer,)) for writer in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    book_ids = [book_id for book_id, _ in results]
+    mapping_ids = [mapping_id for _, ids in results for mapping_id in ids]
+    assert len(set(book_ids)) == 15
+    assert len(set(mapping_ids)) == 45
+    db = ImageMappingDB(db_path)
+    try:
+        for book_id, ids in results:
+            assert [m.id for m in db.get_book_mappings(book_id)] == ids
+    finally:
+        db.close()
+
+
+def test_failed_insert_leaves_nothing_behind(tmp_path):
+    db = ImageMappingDB(str(tmp_path / "library.db"))
+    try:
+        broken = pages(3)
+        broken[2].image_hash = None
+        with pytest.raises(Exception):
+            db.add_mappings(broken)
+        assert db.get_book_ids() == []
+        assert db.conn.execute('SELECT COUNT(*) FROM image_mappings').fetchone()[0] == 0
+        # The rolled back book did not use up an id
+        assert db.add_mappings(pages(1)) == (1, [1])
+    finally:
+        db.close()
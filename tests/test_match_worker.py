@@ -0,0 +1,33 @@
+import threading
+from PIL import Image
+from benchmarks.synthetic_book import render_page
+from src.image_mapping import ImageMapping, ImageMappingDB
+from src.image_utils import ImageUtils
+from src.match_worker import MatchWorker
+from src.matcher import ImageMatcher
+
+
+def test_worker_closes_its_connection_on_stop(tmp_path, monkeypatch):
+    db = ImageMappingDB(str(tmp_path / "library.db"))
+    closed_on = []
+    close = ImageMappingDB.close
+
+    def record_close(self):
+        closed_on.append(threading.current_thread())
+        close(self)
+
+    monkeypatch.setattr(ImageMappingDB, "close", record_close)
+    results = []
+    worker = MatchWorker(ImageMatcher(db), on_result=lambda page, match: results.append(match))
+    worker.start()
+    image = Image.fromarray(render_page(1, 1))
+    future = worker.submit(ImageMapping(image=image, image_hash=ImageUtils.hash_image(image)))
+    assert future.result(timeout=30) is None
+    worker_thread = worker._thread
+    worker.stop()
+
+    assert closed_on == [worker_thread]
+    assert results == [None]
+    # The caller's own connection is still open
+    assert db.get_book_ids() == []
+    db.close()
@@ -0,0 +1,53 @@
+import numpy as np
+from benchmarks.synthetic_book import perturb_page, render_page
+from src.image_mapping import ImageMapping
+from src.image_utils import ImageUtils
+from src.orb_index import OrbIndex
+
+
+def book(seed: int = 7, pages: int = 8):
+    mappings = []
+    for page in range(pages):
+        mapping = ImageMapping(orb_features=ImageUtils.extract_orb_features(render_page(seed, page)))
+        mapping.id = page + 1
+        mappings.append(mapping)
+    return mappings
+
+
+def view(seed: int, page: int, rng: np.random.Generator) -> np.ndarray:
+    return ImageUtils.extract_orb_features(perturb_page(render_page(seed, page), rng))
+
+
+def test_matches_the_shown_page():
+    rng = np.random.default_rng(1)
+    index = OrbIndex(book())
+    for page in (0, 3, 7):
+        match, _ = index.best_match(view(7, page, rng))
+        assert match.id == page + 1
+
+
+def test_candidates_restrict_the_result():
+    rng = np.random.default_rng(2)
+    index = OrbIndex(book())
+    assert index.best_match(view(7, 2, rng), {3, 4})[0].id == 3
+    # The shown page is not a candidate, so nothing else may stand in for it
+    assert index.best_match(view(7, 2, rng), {5}) is None
+
+
+def test_rejects_pages_of_an_unknown_book():
+    rng = np.random.default_rng(3)
+    index = OrbIndex(book())
+    for i in range(10):
+        frame = view(1000 + i, i, rng)
+        assert index.best_match(frame) is None
+        # One candidate leaves the ratio test only the sampled distractor rows to compare against
+        assert index.best_match(frame, {i % 8 + 1}) is None
+
+
+def test_from_arrays_drops_pages_without_descriptors():
+    mappings = book(pages=3)
+    descriptors = np.vstack([mappings[0].orb_features, mappings[2].orb_features])
+    offsets = np.array([0, len(mappings[0].orb_features), len(mappings[0].orb_features), len(descriptors)])
+    index = OrbIndex.from_arrays(mappings, descriptors, offsets)
+    assert [mapping.id for mapping in index.mappings] == [1, 3]
+    assert np.array_equal(index.descriptors[index.row_offsets[1]:index.row_offsets[2]], mappings[2].orb_features)
@@ -0,0 +1,28 @@
+from src.polling_scheduler import POLLING_PROFILES, PollingScheduler
+
+
+def test_active_polling_resets_backoff():
+    scheduler = PollingScheduler("balanced")
+    idle = [scheduler.next_interval(active=False) for _ in range(5)]
+    assert idle == sorted(idle)
+    assert idle[-1] == POLLING_PROFILES["balanced"].max_idle_interval
+    assert scheduler.next_interval(active=True) == POLLING_PROFILES["balanced"].active_interval
+    assert scheduler.next_interval(active=False) == POLLING_PROFILES["balanced"].idle_interval
+
+
+def test_balanced_page_turn_latency_no_worse_than_fixed_polling():
+    # A turn waits at most one idle interval to be seen, then about five polls to settle
+    profile = POLLING_PROFILES["balanced"]
+    settle_polls = 5
+    assert profile.max_idle_interval + settle_polls * profile.active_interval <= 0.3 + settle_polls * 0.3
+
+
+def test_motion_wakes_only_an_idle_loop():
+    scheduler = PollingScheduler("balanced")
+    scheduler.is_idle = False
+    scheduler.notify_motion(100.0)
+    assert not scheduler.wake_event.is_set()
+    scheduler.is_idle = True
+    scheduler.notify_motion(100.0)
+    assert scheduler.wake_event.is_set()
+    assert scheduler.motion_wakeups == 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from src.shared_frames import SharedFrameBuffer
+
+
+def make_frame(value: int, shape=(4, 6, 3)) -> np.ndarray:
+    return np.full(shape, value, dtype=np.uint8)
+
+
+@pytest.fixture
+def buffer():
+    buffer = SharedFrameBuffer.create(slot_bytes=4 * 6 * 3, slots=2)
+    yield buffer
+    buffer.close()
+    buffer.unlink()
+
+
+def test_reader_gets_the_written_frame(buffer):
+    reader = SharedFrameBuffer.attach(buffer.name, buffer.slot_bytes, buffer.slots)
+    try:
+        frame = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+        slot, sequence = buffer.write(frame)
+        assert np.array_equal(reader.read(slot, sequence), frame)
+        gray_slot, gray_sequence = buffer.write(frame[:, :, 0])
+        assert reader.read(gray_slot, gray_sequence).shape == (4, 6)
+    finally:
+        reader.close()
+
+
+def test_overwritten_slot_is_reported_gone(buffer):
+    first = buffer.write(make_frame(1))
+    buffer.write(make_frame(2))
+    third = buffer.write(make_frame(3))
+    # Two slots, so the third frame reuses the first frame's slot
+    assert third[0] == first[0]
+    assert buffer.read(*first) is None
+    assert np.array_equal(buffer.read(*third), make_frame(3))
+
+
+def test_frame_overwritten_during_the_copy_is_not_returned_torn(buffer):
+    slot, sequence = buffer.write(make_frame(1))
+    data = buffer._data[slot]
+
+    class OverwrittenWhileCopying:
+        def __getitem__(self, key):
+            # The writer laps the reader between its header checks
+            buffer._data[slot] = data
+            buffer.write(make_frame(2))
+            buffer.write(make_frame(3))
+            return data[key]
+
+    buffer._data[slot] = OverwrittenWhileCopying()
+    assert buffer.read(slot, sequence) is None
+
+
+def test_oversized_frame_is_rejected(buffer):
+    with pytest.raises(ValueError):
+        buffer.write(make_frame(0, shape=(8, 8, 3)))
+
+
+def test_reattached_writer_continues_the_sequence(buffer):
+    buffer.write(make_frame(1))
+    _, last = buffer.write(make_frame(2))
+    writer = SharedFrameBuffer.attach(buffer.name, buffer.slot_bytes, buffer.slots)
+    try:
+        slot, sequence = writer.write(make_frame(3))
+        assert sequence > last
+        assert np.array_equal(buffer.read(slot, sequence), make_frame(3))
+    finally:
+        writer.close()